@@ -0,0 +1,67 @@
+#!/usr/bin/python
+
+# Binary wire format of UAV claim advertisements
+#
+# An advertisement is a header followed by count records, all in
+# network byte order:
+#   header  version (B), count (B), reserved (H)
+#   record  uav id (H), target id (h), distance (d),
+#           sequence number (I), sender timestamp in msec (I)
+# The distance keeps its full precision: receivers compare it with
+# their own distances, and a tie must look like a tie on both sides.
+# The first record is the sender's own claim, the others are claims it
+# relays. A relayed record keeps the sequence number and timestamp its
+# owner gave it, so any copy of a claim can be ordered against others.
+
+import struct
+
+VERSION = 2
+HEADER = struct.Struct('!BBH')
+RECORD = struct.Struct('!HhdII')
+SEQMOD = 1 << 32
+MAXRECORDS = 255
+
+
+#---------------
+# Pack records of (uav id, target id, distance, seq, timestamp)
+#---------------
+def Pack(records):
+  records = records[:MAXRECORDS]
+  buf = bytearray(HEADER.size + len(records)*RECORD.size)
+  HEADER.pack_into(buf, 0, VERSION, len(records), 0)
+  offset = HEADER.size
+  for record in records:
+    RECORD.pack_into(buf, offset, *record)
+    offset += RECORD.size
+  return buf
+
+#---------------
+# Number of records in a received advertisement of nbytes
+# Returns 0 for a wrong version or a truncated datagram
+#---------------
+def RecordCount(buf, nbytes):
+  if nbytes < HEADER.size:
+    return 0
+  version, count, reserved = HEADER.unpack_from(buf, 0)
+  if version != VERSION or nbytes < HEADER.size + count*RECORD.size:
+    return 0
+  return count
+
+#---------------
+# Sender timestamp: wall clock msec, wrapping at 2^32
+#---------------
+def Stamp(now):
+  return int(now*1000) % SEQMOD
+
+#---------------
+# Next sequence number, wrapping at 2^32
+#---------------
+def NextSeq(seq):
+  return (seq + 1) % SEQMOD
+
+#---------------
+# Is seq older than last (serial number arithmetic, RFC 1982)
+# Also orders timestamps
+#---------------
+def SeqBefore(seq, last):
+  return seq != last and (last - seq) % SEQMOD < SEQMOD // 2
@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+# Distributed auction assignment of UAVs to targets
+#
+# Every UAV bids on one target per round; its bid is its distance to the
+# target and the claim it advertises is that bid. A bid beats another if
+# it is shorter, ties go to the lower node id. Each round a UAV drops a
+# target it has been outbid on and bids on the nearest target in range it
+# can still win. With every claim heard each round the globally best
+# remaining pair settles every round, so a conflict-free matching is
+# reached in at most min(UAVs, targets) + 1 rounds for any swarm size.
+
+import time
+
+import numpy as np
+
+from target_selection import Distances, NearestTargets
+
+
+#---------------
+# Best bid of any other UAV for each target
+# A peer not heard from this round (trackid 0) still holds last round's bid
+# Returns (dists, nodeids) aligned with target_ids, inf/-1 if no bid
+#---------------
+def Winners(peers, mynodeid, target_ids):
+  column = {trgtnodeid: i for i, trgtnodeid in enumerate(target_ids)}
+  windist = np.full(len(target_ids), np.inf)
+  winid = np.full(len(target_ids), -1, dtype=np.int64)
+  for node in peers:
+    if node.nodeid == mynodeid:
+      continue
+    trackid = node.trackid if node.trackid != 0 else node.oldtrackid
+    i = column.get(trackid)
+    if i is None:
+      continue
+    if node.trackdist < windist[i] or (node.trackdist == windist[i] and node.nodeid < winid[i]):
+      windist[i] = node.trackdist
+      winid[i] = node.nodeid
+  return windist, winid
+
+#---------------
+# This UAV's bid for the round
+# Keeps its current target while it still holds the best bid on it,
+# otherwise bids on the nearest target in range it would win.
+# Returns (target id, distance) or (-1, 0)
+#---------------
+def Bid(my_xy, target_xy, target_ids, track_range, mynodeid, windist, winid, current=-1):
+  if len(target_ids) == 0:
+    return -1, 0
+  dists = Distances(my_xy, target_xy)[0]
+  outbid = (windist < dists) | ((windist == dists) & (winid >= 0) & (winid < mynodeid))
+  eligible = ~outbid & (dists < track_range)
+
+  target_ids = list(target_ids)
+  if current in target_ids:
+    i = target_ids.index(current)
+    if eligible[i]:
+      return current, float(dists[i])
+
+  picks, pickdists = NearestTargets(my_xy, target_xy, target_ids, track_range, claimed=outbid[np.newaxis, :])
+  if picks[0] == -1:
+    return -1, 0
+  return int(picks[0]), float(pickdists[0])
+
+#---------------
+# Rounds-to-convergence bookkeeping for one agent
+# An auction starts when the set of potential targets changes and is
+# converged once this UAV's claim and its view of the winning bids have
+# not changed for stable_rounds rounds.
+#---------------
+class AuctionRounds():
+  def __init__(self, stable_rounds=3):
+    self.stable_rounds = stable_rounds
+    self.targets = None
+    self.view = None
+    self.rounds = 0
+    self.lastchange = 0
+    self.starttime = None
+    self.changetime = None
+    self.converged = False
+
+  # Record one round; returns True on the round convergence is detected
+  def Round(self, target_ids, claim, winners):
+    now = time.monotonic()
+    targets = frozenset(target_ids)
+    if targets != self.targets:
+      self.targets = targets
+      self.view = None
+      self.rounds = 0
+      self.lastchange = 0
+      self.starttime = now
+      self.changetime = now
+      self.converged = False
+
+    self.rounds += 1
+    view = (claim, winners)
+    if view != self.view:
+      self.view = view
+      self.lastchange = self.rounds
+      self.changetime = now
+      self.converged = False
+      return False
+
+    if not self.converged and self.rounds - self.lastchange >= self.stable_rounds:
+      self.converged = True
+      return True
+    return False
+
+  # Rounds and seconds from the start of the auction to its last change
+  def Convergence(self):
+    return self.lastchange, self.changetime - self.starttime
@@ -0,0 +1,299 @@
+# This module benchmarks how the tracking protocol scales with the number of uav and target nodes.
+# Each run starts a coresim session with its own agents, runs a generated TestCase scenario and records
+# convergence latency, advertisement message rate and per-agent CPU/RSS. Results are written as a scaling curve (CSV).
+
+
+import argparse
+import csv
+import itertools
+import os
+import random
+import socket
+import threading
+import time
+
+from core.api.grpc import client
+from core.api.grpc import core_pb2
+
+import test_uavs_grpc
+from test_uavs_grpc import TestCase
+from coresim.simulator import Simulator
+
+arrivals = ['together', 'staggered', 'shuffled']
+
+
+#---------------
+# Count advertisements sent to the multicast group during a run
+#---------------
+class AdvertCounter():
+
+    def __init__(self, group, port, interface='127.0.0.1'):
+        self.sk = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sk.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sk.bind(('', port))
+        mreq = socket.inet_aton(group) + socket.inet_aton(interface)
+        self.sk.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+        self.sk.settimeout(0.2)
+        self.packets = 0
+        self.bytes = 0
+        self.counting = False
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        buf = bytearray(65536)
+        while self.running:
+            try:
+                nbytes = self.sk.recv_into(buf)
+            except socket.timeout:
+                continue
+            if self.counting:
+                self.packets += 1
+                self.bytes += nbytes
+
+    def start(self):
+        self.packets = 0
+        self.bytes = 0
+        self.starttime = time.monotonic()
+        self.counting = True
+
+    def stop(self):
+        self.counting = False
+        return self.packets, self.bytes, time.monotonic() - self.starttime
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.sk.close()
+
+
+#---------------
+# CPU seconds and resident set size (KB) of a process from /proc
+#---------------
+def ProcessUsage(pid):
+    try:
+        with open("/proc/%d/stat" % pid) as fptr:
+            fields = fptr.read().rsplit(')', 1)[1].split()
+        with open("/proc/%d/status" % pid) as fptr:
+            rss = 0
+            for line in fptr:
+                if line.startswith("VmRSS:"):
+                    rss = int(line.split()[1])
+                    break
+    except (OSError, IndexError, ValueError):
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    # utime and stime are fields 14 and 15, counted after the ')'
+    return (int(fields[11]) + int(fields[12])) / ticks, rss
+
+
+#---------------
+# TestCase running against a coresim session of any size
+# Target i is placed next to uav i so every uav has targets in range,
+# and crashes go through the simulator instead of vcmd.
+#---------------
+class SwarmTestCase(TestCase):
+
+    def __init__(self, core, session_id, id, name, sim, protocol="udp", collector=None):
+        TestCase.__init__(self, core, session_id, id, name, protocol, collector=collector)
+        self.sim = sim
+        self.crashed = []
+
+    def moveTargetsInRange(self, targets, timer=0, xuav=200, yuav=100):
+        # Move targets within range of uavs
+        order = {target_id: i for i, target_id in enumerate(self.sim.world.target_ids)}
+        positions = {target_id: core_pb2.Position(x = xuav + (order[target_id] % 2)*200, y = yuav + order[target_id]*150)
+                     for target_id in targets}
+        self.landed = self.placeTargets(positions, timer)
+
+    def crashUavs(self, list_of_uavs):
+        print("Uavs to Crash:\t\t%s" % list_of_uavs)
+        # a hosted UAV takes the others of its process down with it
+        crashed = []
+        for uav_id in list_of_uavs:
+            crashed += self.sim.agents.Crash(uav_id)
+        if sorted(crashed) != sorted(list_of_uavs):
+            print("Uavs crashed with their host:\t%s" % sorted(set(crashed) - set(list_of_uavs)))
+        self.crashed = crashed
+
+    def resetUavs(self):
+        for uav_id in self.crashed:
+            self.sim.agents.Start(uav_id)
+        self.crashed = []
+
+
+#---------------
+# Scenarios for one swarm size: every arrival pattern and crash count
+# Returns a list of (name, pattern, targets to move, time between targets, uavs to crash)
+#---------------
+def GenerateScenarios(uav_ids, target_ids, patterns, crash_counts, stagger=0.1, rng=random):
+    scenarios = []
+    for pattern, crashes in itertools.product(patterns, crash_counts):
+        targets = list(target_ids)
+        timer = 0.0
+        if pattern == 'staggered':
+            timer = stagger
+        elif pattern == 'shuffled':
+            rng.shuffle(targets)
+        uavs_to_crash = rng.sample(list(uav_ids), min(crashes, len(uav_ids)-1))
+        name = "%d uavs %d targets - %s - crash %d" % (len(uav_ids), len(target_ids), pattern, len(uavs_to_crash))
+        scenarios.append((name, pattern, targets, timer, uavs_to_crash))
+    return scenarios
+
+
+#---------------
+# Run every scenario for one swarm size against a fresh simulator
+# Returns one result row per scenario run
+#---------------
+def RunSwarm(num_uavs, num_targets, args, rng):
+    uav_ids = list(range(1, num_uavs+1))
+    first_target = 10**len(str(num_uavs))
+    target_ids = list(range(first_target+1, first_target+num_targets+1))
+
+    sim = Simulator(uav_ids, target_ids, grpc_port=0, proxy_port=0, speed=args.speed,
+                    speedup=args.speedup, protocol=args.protocol, interval=args.interval,
+                    mcast_port=args.mcast_port, agent_args=args.agent_args)
+    counter = AdvertCounter(sim.mcast_group, sim.mcast_port)
+    sim.Start()
+    rows = []
+    try:
+        core = client.CoreGrpcClient(sim.CoreAddress())
+        core.connect()
+        session_id = int(core.get_sessions().sessions[0].id)
+        time.sleep(args.warmup)
+
+        test_uavs_grpc.color_of_targets = dict(sim.world.color_of_targets)
+        test_uavs_grpc.start_time = (time.time(), None)
+        scenarios = GenerateScenarios(uav_ids, target_ids, args.arrivals, args.crashes, args.stagger, rng)
+        for run, (name, pattern, targets, timer, uavs_to_crash) in enumerate(scenarios*args.repeat):
+            print("\n--------- %s ------------" % name)
+            test_uavs_grpc.uavs = {uav_id: -1 for uav_id in uav_ids}
+            test = SwarmTestCase(core, session_id, str(run), name, sim, args.protocol)
+
+            usage = {uav_id: ProcessUsage(pid) for uav_id, pid in sim.agents.Pids().items()}
+            counter.start()
+            test.runTest(args.expired, targets, args.poll, time_between_targets=timer, uavs_to_crash=uavs_to_crash)
+            packets, nbytes, secs = counter.stop()
+
+            cpu = []
+            rss = []
+            for uav_id, pid in sim.agents.Pids().items():
+                before, after = usage.get(uav_id), ProcessUsage(pid)
+                if before is None or after is None:
+                    continue
+                cpu.append((after[0] - before[0]) / secs)
+                rss.append(after[1])
+
+            rows.append({
+                'uavs': num_uavs,
+                'targets': num_targets,
+                'arrival': pattern,
+                'crashed': len(uavs_to_crash),
+                'latency': test.stoptime[0] - test.starttime[0],
+                'setup': max(test.landed.values()) - test.starttime[0] if test.landed else 0.0,
+                'unique': int(test.checkUnique()),
+                'adverts_per_sec': packets / secs,
+                'advert_bytes_per_sec': nbytes / secs,
+                'agent_cpu_mean': sum(cpu) / len(cpu) if cpu else 0.0,
+                'agent_cpu_max': max(cpu) if cpu else 0.0,
+                'agent_rss_kb_mean': sum(rss) / len(rss) if rss else 0,
+                'agent_rss_kb_max': max(rss) if rss else 0,
+            })
+            time.sleep(args.settle)
+    finally:
+        sim.Stop()
+        counter.close()
+    return rows
+
+
+#---------------
+# Write the scaling curve as CSV, plus a PNG if matplotlib is available
+#---------------
+def WriteScalingCurve(rows, file_name):
+    if len(rows) == 0:
+        return
+    with open(file_name, 'w', newline='') as fptr:
+        writer = csv.DictWriter(fptr, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return
+
+    fig, axes = plt.subplots(1, 3, figsize=(15, 4))
+    series = sorted(set((row['arrival'], row['crashed']) for row in rows))
+    for arrival, crashed in series:
+        points = {}
+        for row in rows:
+            if row['arrival'] == arrival and row['crashed'] == crashed:
+                points.setdefault(row['uavs'], []).append(row)
+        sizes = sorted(points)
+        label = "%s, crash %d" % (arrival, crashed)
+        for ax, key in zip(axes, ['latency', 'adverts_per_sec', 'agent_cpu_mean']):
+            ax.plot(sizes, [sum(r[key] for r in points[n]) / len(points[n]) for n in sizes], marker='o', label=label)
+    for ax, title in zip(axes, ['Convergence latency (s)', 'Advertisements / s', 'Agent CPU (fraction of a core)']):
+        ax.set_xlabel('UAVs')
+        ax.set_title(title)
+        ax.set_xscale('log', base=2)
+    axes[0].legend()
+    fig.tight_layout()
+    fig.savefig(os.path.splitext(file_name)[0] + '.png')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--uavs', dest='uavs', nargs='+', type=int, default=[8, 16, 32, 64],
+                        help='Swarm sizes (number of uavs)')
+    parser.add_argument('-m', '--targets-per-uav', dest='ratio', type=float, default=1.0,
+                        help='Number of targets per uav')
+    parser.add_argument('-a', '--arrivals', dest='arrivals', nargs='+', choices=arrivals, default=arrivals,
+                        help='Target arrival patterns')
+    parser.add_argument('-k', '--crash', dest='crashes', nargs='+', type=int, default=[0],
+                        help='Number of uavs crashed at the start of a scenario')
+    parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=1,
+                        help='Runs of every scenario')
+    parser.add_argument('-p', '--protocol', dest='protocol', type=str, default='udp',
+                        help='Comms protocol of the agents')
+    parser.add_argument('-i', '--update_interval', dest='interval', type=int, default=50,
+                        help='Agent update interval (msec)')
+    parser.add_argument('--stagger', dest='stagger', type=float, default=0.1,
+                        help='Seconds between targets for the staggered pattern')
+    parser.add_argument('--speed', dest='speed', type=float, default=50.0,
+                        help='UAV speed (units per simulated second)')
+    parser.add_argument('--speedup', dest='speedup', type=float, default=10.0,
+                        help='Simulated seconds per wall clock second')
+    parser.add_argument('--mcast-port', dest='mcast_port', type=int, default=9150,
+                        help='Advertisement port used by the benchmark agents')
+    parser.add_argument('--warmup', dest='warmup', type=float, default=5.0,
+                        help='Seconds to let agents start before the first scenario')
+    parser.add_argument('--settle', dest='settle', type=float, default=2.0,
+                        help='Seconds between scenarios')
+    parser.add_argument('--expired', dest='expired', type=int, default=2500,
+                        help='Maximum number of polls before a scenario times out')
+    parser.add_argument('--poll', dest='poll', type=float, default=0.1,
+                        help='Poll period (seconds)')
+    parser.add_argument('--seed', dest='seed', type=int, default=None,
+                        help='Random seed for shuffles and crash sets')
+    parser.add_argument('-o', '--output', dest='output', type=str, default='bench_swarm.csv',
+                        help='Scaling curve output file')
+    parser.add_argument('agent_args', nargs=argparse.REMAINDER,
+                        help='Extra agent arguments, after --')
+    args = parser.parse_args()
+    if len(args.agent_args) > 0 and args.agent_args[0] == '--':
+        args.agent_args = args.agent_args[1:]
+
+    rng = random.Random(args.seed)
+    rows = []
+    for num_uavs in args.uavs:
+        num_targets = max(1, int(round(num_uavs * args.ratio)))
+        rows += RunSwarm(num_uavs, num_targets, args, rng)
+        WriteScalingCurve(rows, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,4 @@
+# Local stand-in for the CORE gRPC server and the waypoint proxy
+# coresim.simulator.Simulator runs a whole session (needs grpc and core)
+
+from coresim.world import World, TargetColor, UavIcon, iconpath
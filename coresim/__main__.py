@@ -0,0 +1,70 @@
+#!/usr/bin/python
+
+# Run a simulated CORE session, optionally with its UAV agents
+#
+#   python -m coresim -u 1 2 3 4 6 7 8 9 -t 11 12 13 14 16 17 18 19 -p udp
+#
+# The test harness then connects to localhost:50051 as it would to CORE.
+
+import argparse
+import os
+import time
+
+from coresim.simulator import Simulator
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('-u','--uavs', dest = 'uavs', metavar='uav ids', nargs='+',
+                      type=int, default = [1, 2, 3, 4, 6, 7, 8, 9], help='UAV node IDs')
+  parser.add_argument('-t','--targets', dest = 'targets', metavar='target ids', nargs='+',
+                      type=int, default = [11, 12, 13, 14, 16, 17, 18, 19], help='Target node IDs')
+  parser.add_argument('-p','--protocol', dest = 'protocol', metavar='comms protocol',
+                      type=str, default = 'udp', help='Comms Protocol passed to the agents')
+  parser.add_argument('-i','--update_interval', dest = 'interval', metavar='update interval',
+                      type=int, default = '1', help='Agent update interval (msec)')
+  parser.add_argument('--grpc-port', dest = 'grpc_port', type=int, default = '50051',
+                      help='CORE gRPC port')
+  parser.add_argument('--proxy-port', dest = 'proxy_port', type=int, default = '8000',
+                      help='Waypoint proxy port')
+  parser.add_argument('--mcast-port', dest = 'mcast_port', type=int, default = '9100',
+                      help='Advertisement port used by the agents')
+  parser.add_argument('--speed', dest = 'speed', type=float, default = '50',
+                      help='UAV speed (units per simulated second)')
+  parser.add_argument('--speedup', dest = 'speedup', type=float, default = '1',
+                      help='Simulated seconds per wall clock second')
+  parser.add_argument('--capture-range', dest = 'capture_range', type=float, default = '0',
+                      help='Distance at which a UAV shows its target color, 0 = immediately')
+  parser.add_argument('--no-agents', dest = 'agents', action='store_false',
+                      help='Only run the simulated session; start agents yourself')
+  parser.add_argument('--host', dest = 'host', action='store_true',
+                      help='Run all UAV agents in one process (agent host mode)')
+  parser.add_argument('--logdir', dest = 'logdir', type=str, default = None,
+                      help='Directory for per-agent output (coresim_n<id>.log)')
+  parser.add_argument('agent_args', nargs=argparse.REMAINDER,
+                      help='Extra agent arguments, after --')
+  args = parser.parse_args()
+
+  agent_args = args.agent_args
+  if len(agent_args) > 0 and agent_args[0] == '--':
+    agent_args = agent_args[1:]
+  if args.logdir is not None:
+    os.makedirs(args.logdir, exist_ok=True)
+
+  sim = Simulator(args.uavs, args.targets, args.grpc_port, args.proxy_port, args.speed,
+                  args.speedup, args.capture_range, args.protocol, args.interval,
+                  mcast_port=args.mcast_port, agent_args=agent_args, logdir=args.logdir, host=args.host)
+  sim.Start(args.agents)
+  print("CORE gRPC on %s, proxy on http://localhost:%d/n<id>, control on %s" %
+        (sim.CoreAddress(), sim.proxy_port, sim.ControlUrl()))
+  try:
+    while 1:
+      time.sleep(1)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    sim.Stop()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+
+# Run track_target_grpc.py agents against a simulator
+
+import os
+import subprocess
+import sys
+
+agentpath = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "track_target_grpc.py")
+
+
+#---------------
+# One agent process per UAV, all on the loopback interface
+# StartHost() runs several UAVs in one agent process (host mode); the
+# process is then known by each of its UAV ids. Crashing one of them
+# kills the process, as pkill would on a host, so its other UAVs go
+# down with it: Crash() returns every UAV it took down.
+#---------------
+class AgentPool():
+  def __init__(self, grpc_port, proxy_port, protocol="udp", interval=1,
+               mcast_group='235.1.1.1', mcast_port=9100, extra_args=(), logdir=None):
+    self.grpc_port = grpc_port
+    self.proxy_port = proxy_port
+    self.protocol = protocol
+    self.interval = interval
+    self.mcast_group = mcast_group
+    self.mcast_port = mcast_port
+    self.extra_args = list(extra_args)
+    self.logdir = logdir
+    self.procs = {}
+
+  def Command(self, uav_ids):
+    return [sys.executable, agentpath,
+            '-my'] + [str(uav_id) for uav_id in uav_ids] + [
+            '-p', self.protocol,
+            '-i', str(self.interval),
+            '--core', "127.0.0.1:%d" % self.grpc_port,
+            '--proxy', "http://127.0.0.1:%d/n{id}" % self.proxy_port,
+            '--mcast-group', self.mcast_group,
+            '--mcast-port', str(self.mcast_port),
+            '--mcast-if', '127.0.0.1'] + self.extra_args
+
+  def Start(self, uav_id):
+    return self.Launch([uav_id], "coresim_n%d.log" % uav_id)
+
+  def StartHost(self, uav_ids):
+    return self.Launch(list(uav_ids), "coresim_host_n%d.log" % uav_ids[0])
+
+  # False if one of the UAVs already runs
+  def Launch(self, uav_ids, logname):
+    if any(uav_id in self.procs and self.procs[uav_id].poll() is None for uav_id in uav_ids):
+      return False
+    out = subprocess.DEVNULL
+    if self.logdir is not None:
+      out = open(os.path.join(self.logdir, logname), 'ab')
+    proc = subprocess.Popen(self.Command(uav_ids), stdout=out, stderr=subprocess.STDOUT)
+    if out is not subprocess.DEVNULL:
+      out.close()
+    for uav_id in uav_ids:
+      self.procs[uav_id] = proc
+    return True
+
+  # Kill an agent the way crashUavs does in CORE (pkill)
+  # Returns the UAVs of the process that went down, [] if none was running
+  def Crash(self, uav_id):
+    proc = self.procs.get(uav_id)
+    if proc is None:
+      return []
+    uav_ids = [hosted for hosted, hostproc in self.procs.items() if hostproc is proc]
+    for hosted in uav_ids:
+      del self.procs[hosted]
+    if proc.poll() is not None:
+      return []
+    proc.terminate()
+    proc.wait()
+    return uav_ids
+
+  # Agent process of each UAV; hosted UAVs share one
+  def Pids(self):
+    return {uav_id: proc.pid for uav_id, proc in self.procs.items() if proc.poll() is None}
+
+  def StopAll(self):
+    while self.procs:
+      self.Crash(next(iter(self.procs)))
@@ -0,0 +1,94 @@
+#!/usr/bin/python
+
+# The subset of the CORE gRPC API used by the agents and the test harness
+
+import queue
+from concurrent import futures
+
+import grpc
+
+from core.api.grpc import core_pb2
+from core.api.grpc import core_pb2_grpc
+
+
+#---------------
+# Node protobuf of a simulated node
+#---------------
+def NodeProto(node):
+  return core_pb2.Node(id=node.id, name=node.name, icon=node.icon,
+                       position=core_pb2.Position(x=node.x, y=node.y))
+
+
+#---------------
+# CoreApi servicer backed by a World
+# Implements GetSessions, GetSession, GetNode, EditNode and node Events
+#---------------
+class CoreApiSim(core_pb2_grpc.CoreApiServicer):
+  def __init__(self, world, session_id=1):
+    self.world = world
+    self.session_id = session_id
+
+  def CheckSession(self, request, context):
+    if request.session_id != self.session_id:
+      context.abort(grpc.StatusCode.NOT_FOUND, "session %d not found" % request.session_id)
+
+  def GetSessions(self, request, context):
+    summary = core_pb2.SessionSummary(id=self.session_id, state=core_pb2.SessionState.RUNTIME,
+                                      nodes=len(self.world.nodes))
+    return core_pb2.GetSessionsResponse(sessions=[summary])
+
+  def GetSession(self, request, context):
+    self.CheckSession(request, context)
+    with self.world.lock:
+      nodes = [NodeProto(node) for node in self.world.nodes.values()]
+    session = core_pb2.Session(id=self.session_id, state=core_pb2.SessionState.RUNTIME, nodes=nodes)
+    return core_pb2.GetSessionResponse(session=session)
+
+  def GetNode(self, request, context):
+    self.CheckSession(request, context)
+    with self.world.lock:
+      node = self.world.Node(request.node_id)
+      if node is None:
+        context.abort(grpc.StatusCode.NOT_FOUND, "node %d not found" % request.node_id)
+      return core_pb2.GetNodeResponse(node=NodeProto(node))
+
+  def EditNode(self, request, context):
+    self.CheckSession(request, context)
+    x = y = icon = None
+    if request.HasField("position"):
+      x, y = request.position.x, request.position.y
+    if request.icon:
+      icon = request.icon
+    result = self.world.Edit(request.node_id, x, y, icon)
+    return core_pb2.EditNodeResponse(result=result)
+
+  # Stream node events until the client goes away
+  def Events(self, request, context):
+    self.CheckSession(request, context)
+    if len(request.events) > 0 and core_pb2.EventType.NODE not in request.events:
+      return
+    events = queue.Queue()
+    def listener(node):
+      events.put(NodeProto(node))
+    self.world.Subscribe(listener)
+    try:
+      while context.is_active():
+        try:
+          node = events.get(timeout=0.5)
+        except queue.Empty:
+          continue
+        yield core_pb2.Event(session_id=self.session_id, node_event=core_pb2.NodeEvent(node=node))
+    finally:
+      self.world.Unsubscribe(listener)
+
+
+#---------------
+# Start a gRPC server for a World; port 0 picks a free port
+# Returns (server, port)
+#---------------
+def StartGrpcServer(world, address="localhost", port=50051, session_id=1, workers=32):
+  server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+  core_pb2_grpc.add_CoreApiServicer_to_server(CoreApiSim(world, session_id), server)
+  port = server.add_insecure_port("%s:%d" % (address, port))
+  server.start()
+  return server, port
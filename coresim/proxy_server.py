@@ -0,0 +1,74 @@
+#!/usr/bin/python
+
+# Waypoint/target XML-RPC proxy for simulated UAVs
+# Each UAV gets its own path, /n<id>; /sim is the simulator control path
+
+import socketserver
+import threading
+from xmlrpc.server import MultiPathXMLRPCServer, SimpleXMLRPCDispatcher, SimpleXMLRPCRequestHandler
+
+
+#---------------
+# The proxy methods one UAV agent calls
+#---------------
+class UavProxy():
+  def __init__(self, world, uav_id):
+    self.world = world
+    self.uav_id = uav_id
+
+  def getPotentialTargets(self, covered_zone, track_range):
+    return self.world.PotentialTargets(self.uav_id, covered_zone, track_range)
+
+  def setWypt(self, x, y):
+    return self.world.SetWypt(self.uav_id, x, y)
+
+  def getOriginalWypt(self):
+    return self.world.OriginalWypt(self.uav_id)
+
+  def setTarget(self, target_id):
+    return self.world.SetTarget(self.uav_id, target_id)
+
+
+#---------------
+# Keep-alive request handler accepting any path
+# (MultiPathXMLRPCServer routes by path itself)
+#---------------
+class ProxyRequestHandler(SimpleXMLRPCRequestHandler):
+  rpc_paths = ()
+  protocol_version = 'HTTP/1.1'
+
+  def log_message(self, format, *args):
+    pass
+
+
+#---------------
+# One thread per keep-alive connection; closing the server does not
+# wait for agents to hang up
+#---------------
+class ThreadedProxyServer(socketserver.ThreadingMixIn, MultiPathXMLRPCServer):
+  daemon_threads = True
+  block_on_close = False
+
+
+#---------------
+# Start the proxy server; port 0 picks a free port
+# control, if given, is registered on /sim
+# Returns (server, port)
+#---------------
+def StartProxyServer(world, address="localhost", port=8000, control=None):
+  server = ThreadedProxyServer((address, port), requestHandler=ProxyRequestHandler,
+                               allow_none=True, logRequests=False)
+  for uav_id in world.uav_ids:
+    dispatcher = SimpleXMLRPCDispatcher(allow_none=True, encoding=None)
+    dispatcher.register_instance(UavProxy(world, uav_id))
+    dispatcher.register_multicall_functions()
+    server.add_dispatcher("/n" + str(uav_id), dispatcher)
+  if control is not None:
+    dispatcher = SimpleXMLRPCDispatcher(allow_none=True, encoding=None)
+    dispatcher.register_instance(control)
+    dispatcher.register_multicall_functions()
+    server.add_dispatcher("/sim", dispatcher)
+
+  thread = threading.Thread(target=server.serve_forever, daemon=True)
+  thread.start()
+  return server, server.server_address[1]
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+
+# Local stand-in for a CORE session running the UAV scenario
+
+import threading
+
+from coresim.agents import AgentPool
+from coresim.grpc_server import StartGrpcServer
+from coresim.proxy_server import StartProxyServer
+from coresim.world import World
+
+
+#---------------
+# Simulator control methods, served on the proxy's /sim path
+#---------------
+class SimControl():
+  def __init__(self, sim):
+    self.sim = sim
+
+  def crashUav(self, uav_id):
+    return self.sim.agents.Crash(uav_id)
+
+  def startUav(self, uav_id):
+    return self.sim.agents.Start(uav_id)
+
+  def agentPids(self):
+    return {str(uav_id): pid for uav_id, pid in self.sim.agents.Pids().items()}
+
+  def colorOfTargets(self):
+    return self.sim.world.color_of_targets
+
+
+#---------------
+# World + CORE gRPC server + waypoint proxy + kinematics clock, and
+# optionally the UAV agents themselves.
+# Ports of 0 pick free ports so several simulators can run side by side;
+# give each its own mcast_port so their agents do not hear each other.
+#---------------
+class Simulator():
+  def __init__(self, uav_ids, target_ids, grpc_port=50051, proxy_port=8000,
+               speed=50.0, speedup=1.0, capture_range=0.0, protocol="udp", interval=1,
+               mcast_group='235.1.1.1', mcast_port=9100, agent_args=(), logdir=None, host=False):
+    self.world = World(uav_ids, target_ids, speed, speedup, capture_range)
+    self.grpc_port = grpc_port
+    self.proxy_port = proxy_port
+    self.protocol = protocol
+    self.interval = interval
+    self.mcast_group = mcast_group
+    self.mcast_port = mcast_port
+    self.agent_args = agent_args
+    self.logdir = logdir
+    self.host = host
+    self.grpcserver = None
+    self.proxyserver = None
+    self.agents = None
+    self.stop = threading.Event()
+    self.clock = None
+
+  def Start(self, agents=True):
+    self.grpcserver, self.grpc_port = StartGrpcServer(self.world, port=self.grpc_port)
+    self.proxyserver, self.proxy_port = StartProxyServer(self.world, port=self.proxy_port,
+                                                         control=SimControl(self))
+    self.clock = threading.Thread(target=self.world.Run, args=(self.stop,), daemon=True)
+    self.clock.start()
+    self.agents = AgentPool(self.grpc_port, self.proxy_port, self.protocol, self.interval,
+                            self.mcast_group, self.mcast_port, self.agent_args, self.logdir)
+    if agents and self.host:
+      self.agents.StartHost(self.world.uav_ids)
+    elif agents:
+      for uav_id in self.world.uav_ids:
+        self.agents.Start(uav_id)
+
+  def CoreAddress(self):
+    return "localhost:%d" % self.grpc_port
+
+  def ControlUrl(self):
+    return "http://localhost:%d/sim" % self.proxy_port
+
+  def Stop(self):
+    if self.agents is not None:
+      self.agents.StopAll()
+    self.stop.set()
+    if self.proxyserver is not None:
+      self.proxyserver.shutdown()
+      self.proxyserver.server_close()
+    if self.grpcserver is not None:
+      self.grpcserver.stop(0)
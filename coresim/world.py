@@ -0,0 +1,188 @@
+#!/usr/bin/python
+
+# Simulated world: UAV and target nodes with simple kinematics
+
+import math
+import threading
+import time
+
+iconpath = "/data/uas-core/icons/uav/"
+colors = ['blue', 'yellow', 'green', 'red', 'lime', 'orange', 'pink', 'purple', 'lavender', 'cyan']
+idlecolor = 'white'
+
+
+#---------------
+# Color shown by a UAV tracking the index-th target
+# The first targets use the test harness color table, the rest are
+# named after their node id
+#---------------
+def TargetColor(index, target_id):
+  if index < len(colors):
+    return colors[index]
+  return "t" + str(target_id)
+
+#---------------
+# Icon file of a UAV showing a color
+#---------------
+def UavIcon(color):
+  return iconpath + color + "_plane.png"
+
+
+#---------------
+# A simulated node
+#---------------
+class SimNode():
+  __slots__ = ('id', 'name', 'kind', 'x', 'y', 'icon', 'wypt', 'originalwypt',
+               'settarget', 'wypttarget')
+
+  def __init__(self, nodeid, kind, x, y, icon=''):
+    self.id = nodeid
+    self.name = "n" + str(nodeid)
+    self.kind = kind
+    self.x = float(x)
+    self.y = float(y)
+    self.icon = icon
+    self.wypt = (self.x, self.y)
+    self.originalwypt = (int(x), int(y))
+    self.settarget = -1
+    self.wypttarget = -1
+
+
+#---------------
+# UAVs start in a column at x = 100, targets out of range at x = 1300,
+# the same layout the test harness moves targets in and out of.
+# UAVs fly toward their waypoint at speed units per simulated second;
+# the simulated clock runs speedup times faster than the wall clock.
+# A UAV shows the color of the target set with setTarget, or of the
+# target its waypoint is on once it is within capture_range of it
+# (0 = as soon as the waypoint is set).
+#---------------
+class World():
+  def __init__(self, uav_ids, target_ids, speed=50.0, speedup=1.0, capture_range=0.0):
+    self.speed = speed
+    self.speedup = speedup
+    self.capture_range = capture_range
+    self.nodes = {}
+    self.uav_ids = list(uav_ids)
+    self.target_ids = list(target_ids)
+    self.color_of_targets = {}
+    self.listeners = []
+    self.lock = threading.RLock()
+    self.simtime = 0.0
+
+    for i, uav_id in enumerate(self.uav_ids):
+      self.nodes[uav_id] = SimNode(uav_id, 'uav', 100, 100 + i*150, UavIcon(idlecolor))
+    for i, target_id in enumerate(self.target_ids):
+      self.nodes[target_id] = SimNode(target_id, 'target', 1300 + (i % 2)*100, 100 + (i//2)*150)
+      self.color_of_targets[TargetColor(i, target_id)] = target_id
+    self.target_color = {target_id: color for color, target_id in self.color_of_targets.items()}
+
+  def Subscribe(self, listener):
+    with self.lock:
+      self.listeners.append(listener)
+
+  def Unsubscribe(self, listener):
+    with self.lock:
+      if listener in self.listeners:
+        self.listeners.remove(listener)
+
+  # Tell listeners a node changed (called with the lock held)
+  def Notify(self, node):
+    for listener in self.listeners:
+      listener(node)
+
+  def Node(self, nodeid):
+    return self.nodes.get(nodeid)
+
+  def Edit(self, nodeid, x=None, y=None, icon=None):
+    with self.lock:
+      node = self.nodes.get(nodeid)
+      if node is None:
+        return False
+      if x is not None:
+        node.x, node.y = float(x), float(y)
+        if node.kind == 'uav':
+          node.wypt = (node.x, node.y)
+      if icon is not None:
+        node.icon = icon
+      self.Notify(node)
+      return True
+
+  # Targets inside the covered zone and within track range of a UAV
+  def PotentialTargets(self, uav_id, covered_zone, track_range):
+    with self.lock:
+      uav = self.nodes[uav_id]
+      found = []
+      for target_id in self.target_ids:
+        target = self.nodes[target_id]
+        if target.x <= covered_zone and math.hypot(target.x-uav.x, target.y-uav.y) <= track_range:
+          found.append(target_id)
+      return found
+
+  def SetWypt(self, uav_id, x, y):
+    with self.lock:
+      uav = self.nodes[uav_id]
+      uav.wypt = (float(x), float(y))
+      uav.wypttarget = -1
+      for target_id in self.target_ids:
+        target = self.nodes[target_id]
+        if abs(target.x-x) <= 1.5 and abs(target.y-y) <= 1.5:
+          uav.wypttarget = target_id
+          break
+      self.UpdateIcon(uav)
+      return True
+
+  def OriginalWypt(self, uav_id):
+    return list(self.nodes[uav_id].originalwypt)
+
+  def SetTarget(self, uav_id, target_id):
+    with self.lock:
+      uav = self.nodes[uav_id]
+      uav.settarget = target_id
+      self.UpdateIcon(uav)
+      return True
+
+  # The target a UAV is currently shown tracking, or -1
+  def Tracking(self, uav):
+    if uav.settarget > 0:
+      return uav.settarget
+    if uav.wypttarget > 0:
+      if self.capture_range <= 0:
+        return uav.wypttarget
+      target = self.nodes[uav.wypttarget]
+      if math.hypot(target.x-uav.x, target.y-uav.y) <= self.capture_range:
+        return uav.wypttarget
+    return -1
+
+  def UpdateIcon(self, uav):
+    target_id = self.Tracking(uav)
+    icon = UavIcon(self.target_color.get(target_id, idlecolor))
+    if icon != uav.icon:
+      uav.icon = icon
+      self.Notify(uav)
+
+  # Advance the simulated clock by dt wall clock seconds
+  def Step(self, dt):
+    simdt = dt*self.speedup
+    with self.lock:
+      self.simtime += simdt
+      for uav_id in self.uav_ids:
+        uav = self.nodes[uav_id]
+        dx, dy = uav.wypt[0]-uav.x, uav.wypt[1]-uav.y
+        dist = math.hypot(dx, dy)
+        if dist == 0:
+          continue
+        move = min(dist, self.speed*simdt)
+        uav.x += dx*move/dist
+        uav.y += dy*move/dist
+        self.Notify(uav)
+        self.UpdateIcon(uav)
+
+  # Run the kinematics at rate steps per wall clock second until stop is set
+  def Run(self, stop, rate=20.0):
+    period = 1.0/rate
+    last = time.monotonic()
+    while not stop.wait(period):
+      now = time.monotonic()
+      self.Step(now-last)
+      last = now
@@ -0,0 +1,160 @@
+# This module collects the decision events tracking agents send with --trace-to (see decision_trace.py).
+# A DecisionCollector receives them on a UDP port while the tests run and keeps each datagram as a numpy chunk
+# of records, written to a columnar file (numpy .npz, one array per column). Breakdown() splits the convergence of a test per UAV into
+# phases: until the UAV saw a target, until its first claim, and until its decision settled.
+
+
+import argparse
+import socket
+import threading
+
+import numpy as np
+
+from decision_trace import CLAIM, EVENT, FALLBACK, HEADER, MAGIC, RECEIVED, REDEPLOY, SEEN, SENT, VERSION, YIELD, kinds
+
+columns = ['time', 'kind', 'node', 'target', 'peer', 'value']
+dtypes = ['f8', 'u1', 'u2', 'i4', 'i4', 'f4']
+# An event as sent (decision_trace.EVENT: packed, network byte order)
+record = np.dtype([(name, '>' + dtype) for name, dtype in zip(columns, dtypes)])
+assert record.itemsize == EVENT.size
+
+
+#---------------
+# Events of a datagram as a record array, None if it is not one
+#---------------
+def DecodeChunk(buf):
+    if len(buf) < HEADER.size:
+        return None
+    magic, version, count = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC or version != VERSION:
+        return None
+    count = min(count, (len(buf) - HEADER.size) // record.itemsize)
+    return np.frombuffer(buf, dtype=record, count=count, offset=HEADER.size)
+
+
+#---------------
+# Receives decision events in a thread and keeps them as record chunks
+#---------------
+class DecisionCollector():
+
+    def __init__(self, port=9300, host=''):
+        self.sk = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sk.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 22)
+        self.sk.bind((host, port))
+        self.sk.settimeout(0.2)
+        self.chunks = []
+        self.lock = threading.Lock()
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        buf = bytearray(65536)
+        while self.running:
+            try:
+                nbytes = self.sk.recv_into(buf)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            chunk = DecodeChunk(bytes(buf[:nbytes]))
+            if chunk is None or len(chunk) == 0:
+                continue
+            with self.lock:
+                self.chunks.append(chunk)
+
+    # Columns as arrays, only the events between start and stop if given
+    def arrays(self, start=None, stop=None):
+        with self.lock:
+            events = np.concatenate(self.chunks) if self.chunks else np.empty(0, dtype=record)
+        arrays = {name: events[name].astype(dtype) for name, dtype in zip(columns, dtypes)}
+        keep = np.ones(len(arrays['time']), dtype=bool)
+        if start is not None:
+            keep &= arrays['time'] >= start
+        if stop is not None:
+            keep &= arrays['time'] <= stop
+        return {name: array[keep] for name, array in arrays.items()}
+
+    def write(self, file_name, start=None, stop=None):
+        WriteColumns(file_name, self.arrays(start, stop))
+
+    def close(self):
+        self.running = False
+        self.thread.join()
+        self.sk.close()
+
+
+def WriteColumns(file_name, arrays):
+    names = np.array([kinds[kind] for kind in sorted(kinds)])
+    np.savez_compressed(file_name, kind_names=names, **arrays)
+
+
+def LoadColumns(file_name):
+    with np.load(file_name) as data:
+        return {name: data[name] for name in columns}
+
+
+#---------------
+# Per UAV phases of a test that started at start (seconds since start)
+# seen: first target in range, claim: first claim, settled: last claim,
+# yield or redeploy; with counts of yields, redeploys, fallbacks and
+# claim changes advertised and heard
+#---------------
+def Breakdown(arrays, start):
+    breakdown = {}
+    for node in sorted(set(arrays['node'].tolist())):
+        mine = arrays['node'] == node
+
+        def Times(*kindset):
+            return arrays['time'][mine & np.isin(arrays['kind'], kindset)] - start
+
+        seen = Times(SEEN)
+        claims = Times(CLAIM)
+        changes = Times(CLAIM, YIELD, REDEPLOY)
+        breakdown[node] = {
+            'seen': float(seen.min()) if len(seen) else None,
+            'claim': float(claims.min()) if len(claims) else None,
+            'settled': float(changes.max()) if len(changes) else None,
+            'yields': len(Times(YIELD)),
+            'redeploys': len(Times(REDEPLOY)),
+            'fallbacks': len(Times(FALLBACK)),
+            'sent': len(Times(SENT)),
+            'received': len(Times(RECEIVED)),
+        }
+    return breakdown
+
+
+def FormatBreakdown(breakdown):
+    def Secs(value):
+        return "%0.4f" % value if value is not None else "-"
+
+    lines = []
+    for node, row in sorted(breakdown.items()):
+        lines.append("    UAV %s:\t\tseen %s claim %s settled %s, %d yields %d redeploys %d fallbacks, "
+                     "claim changes %d sent %d received" %
+                     (node, Secs(row['seen']), Secs(row['claim']), Secs(row['settled']), row['yields'],
+                      row['redeploys'], row['fallbacks'], row['sent'], row['received']))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='+',
+                        help='Decision files (.npz) written by test_uavs_grpc.py or run_scenarios.py')
+    parser.add_argument('--start', dest='start', type=float, default=None,
+                        help='Test start (time.time()), default the first event of each file')
+    args = parser.parse_args()
+
+    for file_name in args.files:
+        arrays = LoadColumns(file_name)
+        if len(arrays['time']) == 0:
+            print("%s: no events" % file_name)
+            continue
+        start = args.start if args.start is not None else float(arrays['time'].min())
+        print("%s: %d events" % (file_name, len(arrays['time'])))
+        for line in FormatBreakdown(Breakdown(arrays, start)):
+            print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/python
+
+# Decision events of tracking agents, streamed to a collector over UDP
+#
+# Datagrams are a header followed by count events, network byte order:
+#   header  magic 'UAVD', version (B), count (H)
+#   event   time.time() (d), kind (B), UAV node id (H), target id (i),
+#           peer node id (i), value (f, a distance)
+# Events by kind (target, peer and value are -1, -1, 0 when unused):
+#   SEEN      a target came into range
+#   CLAIM     the UAV claimed a target (value: distance)
+#   KEEP      the UAV kept its target, first tick after its claim
+#   YIELD     the UAV gave its target up to peer (value: peer distance)
+#   REDEPLOY  the UAV was sent back to its original waypoint
+#   FALLBACK  the notfoundsametrgnode rule restored its claim
+#   SENT      the UAV advertised another target than in its last advert
+#   RECEIVED  peer claimed another target than in its last advert heard
+# KEEP, SENT and RECEIVED repeat every tick while nothing changes, so
+# only changes are sent: the trace grows with the decisions made, not
+# with ticks and peers. Advertisement counts are in the metrics.
+
+import socket
+import struct
+import threading
+import time
+
+MAGIC = b'UAVD'
+VERSION = 2
+HEADER = struct.Struct('!4sBH')
+EVENT = struct.Struct('!dBHiif')
+# events of one datagram, below a 1500 byte MTU
+MAXEVENTS = 60
+
+SEEN = 1
+CLAIM = 2
+KEEP = 3
+YIELD = 4
+REDEPLOY = 5
+FALLBACK = 6
+SENT = 7
+RECEIVED = 8
+kinds = {SEEN: 'seen', CLAIM: 'claim', KEEP: 'keep', YIELD: 'yield', REDEPLOY: 'redeploy',
+         FALLBACK: 'fallback', SENT: 'sent', RECEIVED: 'received'}
+# kinds sent only when their target changed, per UAV and peer
+REPEATING = (KEEP, SENT, RECEIVED)
+
+
+#---------------
+# Decision events of the agents of this process
+# Off until Enable(); then events are buffered and sent by Flush(),
+# called once per tick, or as soon as a datagram is full. Send errors
+# are ignored: the collector may not be running.
+#---------------
+class DecisionTracer():
+  def __init__(self):
+    self.sk = None
+    self.events = []
+    self.inrange = {}
+    # (node, kind, peer) -> target of the last REPEATING event sent
+    self.last = {}
+    self.lock = threading.Lock()
+    self.Emit = self.Off
+    self.Seen = self.Off
+    self.Flush = self.Off
+
+  def Off(self, *args):
+    pass
+
+  # dest is host:port of the collector
+  def Enable(self, dest):
+    host, port = dest.rsplit(':', 1)
+    self.sk = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    self.sk.connect((host, int(port)))
+    self.Emit = self.Add
+    self.Seen = self.InRange
+    self.Flush = self.Send
+
+  def Add(self, nodeid, kind, trgtnodeid=-1, peerid=-1, value=0.0):
+    with self.lock:
+      if kind in REPEATING:
+        key = (nodeid, kind, peerid)
+        if self.last.get(key) == trgtnodeid:
+          return
+        self.last[key] = trgtnodeid
+      elif kind in (CLAIM, YIELD, REDEPLOY):
+        # the next tick keeping a target is news again
+        self.last.pop((nodeid, KEEP, -1), None)
+      self.events.append(EVENT.pack(time.time(), kind, nodeid, trgtnodeid, peerid, value))
+      full = len(self.events) >= MAXEVENTS
+    if full:
+      self.Send()
+
+  # SEEN for the potential targets a UAV did not have in range last tick
+  def InRange(self, nodeid, potential_targets):
+    targets = set(potential_targets)
+    for trgtnodeid in targets - self.inrange.get(nodeid, set()):
+      self.Add(nodeid, SEEN, trgtnodeid)
+    self.inrange[nodeid] = targets
+
+  def Send(self):
+    with self.lock:
+      events = self.events
+      self.events = []
+    for i in range(0, len(events), MAXEVENTS):
+      batch = events[i:i + MAXEVENTS]
+      try:
+        self.sk.send(HEADER.pack(MAGIC, VERSION, len(batch)) + b''.join(batch))
+      except OSError:
+        pass
+
+
+#---------------
+# Events of a datagram as (time, kind, node, target, peer, value)
+#---------------
+def DecodeEvents(buf):
+  if len(buf) < HEADER.size:
+    return
+  magic, version, count = HEADER.unpack_from(buf, 0)
+  if magic != MAGIC or version != VERSION:
+    return
+  count = min(count, (len(buf) - HEADER.size)//EVENT.size)
+  for i in range(count):
+    yield EVENT.unpack_from(buf, HEADER.size + i*EVENT.size)
+
+
+decisions = DecisionTracer()
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+
+# Failure detector for UAV peers driven by advertisement arrival times
+
+import collections
+import math
+import threading
+import time
+
+
+#---------------
+# Phi accrual failure detector (Hayashibara et al.)
+# Every advertisement heard directly from a peer is a heartbeat. phi
+# grows with the time since the peer's last heartbeat, scaled by the
+# mean and deviation of its recent heartbeat intervals. A peer is
+# suspected once phi exceeds threshold, or in any case once it has
+# been silent for bound seconds. A threshold of 0 leaves only the bound
+# (a plain timeout detector): phi assumes the peer keeps its interval,
+# so senders that back off (trickle, adaptive ticks) need the bound only.
+# A newer claim of a peer relayed by another UAV also shows it is alive,
+# which keeps peers heard only through relays from staying forever.
+# Relays are not heartbeats: they add no interval, and a peer last
+# heard through a relay is suspected on the bound only.
+#---------------
+class FailureDetector():
+  def __init__(self, threshold=8.0, bound=1.0, window=32, min_std=0.05):
+    self.threshold = threshold
+    self.bound = bound
+    self.window = window
+    self.min_std = min_std
+    # nodeid -> time the peer was last known alive
+    self.last = {}
+    # nodeid -> time of last heartbeat
+    self.direct = {}
+    # nodeid -> sequence number of its last claim heard
+    self.seqs = {}
+    # nodeid -> recent heartbeat intervals
+    self.intervals = {}
+    # (nodeid, seconds silent when suspected)
+    self.detections = []
+    self.lock = threading.Lock()
+
+  def Heartbeat(self, nodeid, seq=None, now=None):
+    if now is None:
+      now = time.monotonic()
+    with self.lock:
+      last = self.direct.get(nodeid)
+      if last is not None:
+        if nodeid not in self.intervals:
+          self.intervals[nodeid] = collections.deque(maxlen=self.window)
+        self.intervals[nodeid].append(now - last)
+      self.direct[nodeid] = now
+      self.last[nodeid] = now
+      self.seqs[nodeid] = seq
+
+  # A claim of the peer relayed by another UAV
+  # Only a sequence number not heard before counts; a peer first heard
+  # through a relay is watched from then on
+  def Relayed(self, nodeid, seq, now=None):
+    if now is None:
+      now = time.monotonic()
+    with self.lock:
+      if nodeid in self.last and (seq is None or seq == self.seqs.get(nodeid)):
+        return
+      self.last[nodeid] = now
+      self.seqs[nodeid] = seq
+
+  # Suspicion level of a peer silent for elapsed seconds
+  def Phi(self, nodeid, elapsed):
+    intervals = self.intervals.get(nodeid)
+    if intervals is None or len(intervals) < 2:
+      return 0.0
+    mean = sum(intervals)/len(intervals)
+    var = sum((x - mean)**2 for x in intervals)/len(intervals)
+    std = max(math.sqrt(var), self.min_std)
+    # logistic approximation of the normal CDF; beyond 10 deviations
+    # phi is far past any threshold
+    y = min(max((elapsed - mean)/std, -10.0), 10.0)
+    e = math.exp(-y*(1.5976 + 0.070566*y*y))
+    if elapsed > mean:
+      return -math.log10(e/(1.0 + e))
+    return -math.log10(1.0 - 1.0/(1.0 + e))
+
+  # Peers suspected to have failed, as (nodeid, seconds silent)
+  # A suspected peer is forgotten until it is heard from again
+  def Suspects(self, now=None):
+    if now is None:
+      now = time.monotonic()
+    suspects = []
+    with self.lock:
+      for nodeid, last in self.last.items():
+        elapsed = now - last
+        if elapsed > self.bound:
+          suspects.append((nodeid, elapsed))
+        elif self.threshold > 0 and self.direct.get(nodeid) == last and self.Phi(nodeid, elapsed) > self.threshold:
+          suspects.append((nodeid, elapsed))
+      for nodeid, elapsed in suspects:
+        self.last.pop(nodeid)
+        self.direct.pop(nodeid, None)
+        self.seqs.pop(nodeid, None)
+        self.intervals.pop(nodeid, None)
+        self.detections.append((nodeid, elapsed))
+    return suspects
+
+  def Stats(self):
+    with self.lock:
+      silences = [elapsed for nodeid, elapsed in self.detections]
+    if len(silences) == 0:
+      return {'detections': 0}
+    return {'detections': len(silences), 'mean': sum(silences)/len(silences), 'max': max(silences)}
@@ -0,0 +1,108 @@
+#!/usr/bin/python
+
+# Geographically scoped multicast groups
+
+import ipaddress
+import math
+import socket
+import struct
+import sys
+import threading
+
+# Linux socket option (linux/in.h) Python does not define: 0 delivers
+# only the groups a socket joined, not all joined on the host for its port
+IP_MULTICAST_ALL = getattr(socket, 'IP_MULTICAST_ALL', 49 if sys.platform.startswith('linux') else None)
+
+
+MARGIN = 0.1
+
+
+#---------------
+# Cell size for UAVs contending within track_range of a target
+# Two UAVs contend when both are within the tracking range of a target,
+# up to twice that range apart. A sender may still advertise to the cell
+# it left, up to margin cell sizes away, so the size must cover both.
+#---------------
+def CellSize(track_range, margin=MARGIN):
+  return 2.0*track_range/(1.0 - margin)
+
+
+#---------------
+# Grid of cells over the covered zone, one multicast group per cell
+# A UAV listens to the cell it is in (Cell()) and the 8 around it, and
+# advertises to the group of its send cell (Locate()). The send cell
+# only changes once the UAV is more than margin (a fraction of the
+# size) past its edge, so a UAV is heard by every UAV less than
+# (1 - margin) cell sizes away: see CellSize().
+# The zone is bounded on X only: columns are clamped to it, and rows
+# wrap around every rows cells (far cells sharing a group only cost
+# some extra traffic).
+#---------------
+class CellGrid():
+  def __init__(self, base, covered_zone, size, rows=16, margin=MARGIN):
+    self.base = int(ipaddress.IPv4Address(base))
+    self.size = float(size)
+    self.cols = max(1, int(math.ceil(covered_zone/self.size)))
+    self.rows = max(3, rows)
+    self.margin = margin*self.size
+
+  def Cell(self, x, y):
+    cx = min(max(int(math.floor(x/self.size)), 0), self.cols - 1)
+    return cx, int(math.floor(y/self.size))
+
+  # Send cell of (x, y) for a UAV with send cell current (None at first)
+  def Locate(self, current, x, y):
+    if current is not None:
+      cx, cy = current
+      xlow = cx*self.size - self.margin if cx > 0 else -math.inf
+      xhigh = (cx + 1)*self.size + self.margin if cx < self.cols - 1 else math.inf
+      if xlow <= x < xhigh and cy*self.size - self.margin <= y < (cy + 1)*self.size + self.margin:
+        return current
+    return self.Cell(x, y)
+
+  def Group(self, cell):
+    cx, cy = cell
+    return str(ipaddress.IPv4Address(self.base + (cy % self.rows)*self.cols + cx))
+
+  # Groups of a cell and its neighbours
+  def Neighbourhood(self, cell):
+    cx, cy = cell
+    return {self.Group((x, y)) for x in range(max(cx - 1, 0), min(cx + 2, self.cols))
+            for y in range(cy - 1, cy + 2)}
+
+
+#---------------
+# Multicast groups joined on one receive socket
+# Agents hosted in one process share the socket; a group stays joined
+# while any of them listens to it.
+#---------------
+class Memberships():
+  def __init__(self, sk, interface=None):
+    self.sk = sk
+    self.interface = interface
+    self.count = {}
+    self.lock = threading.Lock()
+
+  def Mreq(self, group):
+    if self.interface is not None:
+      return socket.inet_aton(group) + socket.inet_aton(self.interface)
+    return socket.inet_aton(group) + struct.pack('=I', socket.INADDR_ANY)
+
+  # Listen to the groups in new instead of those in old
+  # New groups are joined before old ones are left, so nothing in both
+  # neighbourhoods is missed
+  def Move(self, old, new):
+    with self.lock:
+      for group in new:
+        if self.count.get(group, 0) == 0:
+          self.sk.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, self.Mreq(group))
+        self.count[group] = self.count.get(group, 0) + 1
+      for group in old:
+        self.count[group] -= 1
+        if self.count[group] == 0:
+          del self.count[group]
+          self.sk.setsockopt(socket.IPPROTO_IP, socket.IP_DROP_MEMBERSHIP, self.Mreq(group))
+
+  def Joined(self):
+    with self.lock:
+      return sorted(self.count)
@@ -0,0 +1,127 @@
+#!/usr/bin/python
+
+# Per-node log of the inputs a tracking agent decides on
+#
+# The log is a header followed by entries, all in network byte order:
+#   header  magic 'UAVI', version (B), node id (H), argv length (H),
+#           the agent's arguments (utf-8, NUL separated)
+#   entry   seconds since the log started (d), kind (B), length (I),
+#           payload of length bytes
+# Payloads by kind:
+#   ORIGIN  original waypoint x, y (ii)
+#   ADVERT  a received advertisement datagram as is (advert_wire)
+#   TICK    count (H), count potential target ids (i), then node
+#           id, x, y (idd) of this UAV and every potential target
+
+import struct
+import threading
+import time
+
+MAGIC = b'UAVI'
+VERSION = 2
+HEADER = struct.Struct('!4sBHH')
+ENTRY = struct.Struct('!dBI')
+ORIGIN = 1
+ADVERT = 2
+TICK = 3
+XY = struct.Struct('!ii')
+COUNT = struct.Struct('!H')
+TARGET = struct.Struct('!i')
+NODE = struct.Struct('!idd')
+
+
+#---------------
+# Writes the inputs of one agent
+# Entries are written as they happen from the receive thread and the
+# tick loop; the file is flushed once per tick.
+#---------------
+class InputRecorder():
+  def __init__(self, path, nodeid, argv):
+    self.fptr = open(path, 'wb')
+    args = '\0'.join(argv).encode('utf-8')
+    self.fptr.write(HEADER.pack(MAGIC, VERSION, nodeid, len(args)) + args)
+    self.start = time.monotonic()
+    self.lock = threading.Lock()
+
+  def Write(self, kind, payload):
+    with self.lock:
+      self.fptr.write(ENTRY.pack(time.monotonic() - self.start, kind, len(payload)))
+      self.fptr.write(payload)
+
+  def Origin(self, position):
+    self.Write(ORIGIN, XY.pack(int(position[0]), int(position[1])))
+
+  def Advert(self, buf):
+    self.Write(ADVERT, buf)
+
+  # Potential targets and the nodes (with a position) the tick saw
+  def Tick(self, potential_targets, nodes):
+    payload = bytearray(COUNT.pack(len(potential_targets)))
+    for target in potential_targets:
+      payload += TARGET.pack(target)
+    for node in nodes:
+      payload += NODE.pack(node.id, node.position.x, node.position.y)
+    self.Write(TICK, payload)
+    with self.lock:
+      self.fptr.flush()
+
+  def close(self):
+    with self.lock:
+      self.fptr.close()
+
+
+#---------------
+# Node of a replayed tick, shaped like the CORE nodes the agent reads
+#---------------
+class Position():
+  __slots__ = ('x', 'y')
+
+  def __init__(self, x, y):
+    self.x = x
+    self.y = y
+
+class LoggedNode():
+  __slots__ = ('id', 'position')
+
+  def __init__(self, nodeid, x, y):
+    self.id = nodeid
+    self.position = Position(x, y)
+
+
+#---------------
+# Read a log: returns (node id, agent arguments, entries), entries
+# being a generator of (seconds, kind, payload)
+#---------------
+def ReadLog(fptr):
+  magic, version, nodeid, argslen = HEADER.unpack(fptr.read(HEADER.size))
+  if magic != MAGIC or version != VERSION:
+    raise ValueError("not an agent input log (version %d)" % VERSION)
+  args = fptr.read(argslen).decode('utf-8')
+  argv = args.split('\0') if args else []
+  return nodeid, argv, Entries(fptr)
+
+def Entries(fptr):
+  while True:
+    buf = fptr.read(ENTRY.size)
+    if len(buf) < ENTRY.size:
+      return
+    secs, kind, length = ENTRY.unpack(buf)
+    payload = fptr.read(length)
+    if len(payload) < length:
+      # the agent was stopped while writing
+      return
+    yield secs, kind, payload
+
+#---------------
+# Potential target ids and {node id: LoggedNode} of a TICK payload
+#---------------
+def DecodeTick(payload):
+  count, = COUNT.unpack_from(payload, 0)
+  offset = COUNT.size
+  targets = [target for target, in TARGET.iter_unpack(payload[offset:offset + count*TARGET.size])]
+  offset += count*TARGET.size
+  nodes = {nodeid: LoggedNode(nodeid, x, y) for nodeid, x, y in NODE.iter_unpack(payload[offset:])}
+  return targets, nodes
+
+def DecodeOrigin(payload):
+  return XY.unpack(payload)
@@ -0,0 +1,139 @@
+#!/usr/bin/python
+
+# Predictive interception of moving targets
+
+import math
+import time
+
+
+#---------------
+# Alpha-beta filter of one target's position and velocity
+# A measurement equal to the last one within hold seconds brings no new
+# information (the position snapshot was not refreshed) and is skipped.
+# A jump faster than maxspeed (a target placed elsewhere) restarts the
+# track at the new position, at rest.
+#---------------
+class AlphaBeta():
+  __slots__ = ('x', 'y', 'vx', 'vy', 't', 'zx', 'zy', 'changed')
+
+  def __init__(self, x, y, now):
+    self.x = x
+    self.y = y
+    self.vx = 0.0
+    self.vy = 0.0
+    self.t = now
+    self.zx = x
+    self.zy = y
+    self.changed = now
+
+  def Update(self, x, y, now, alpha, beta, maxspeed, hold):
+    if (x, y) == (self.zx, self.zy) and now - self.changed < hold:
+      return
+    dt = now - self.t
+    if dt <= 0:
+      return
+    if (x, y) != (self.zx, self.zy):
+      self.zx, self.zy = x, y
+      self.changed = now
+    px = self.x + self.vx*dt
+    py = self.y + self.vy*dt
+    rx = x - px
+    ry = y - py
+    if math.hypot(x - self.x, y - self.y) > maxspeed*dt:
+      self.__init__(x, y, now)
+      return
+    self.x = px + alpha*rx
+    self.y = py + alpha*ry
+    self.vx += beta*rx/dt
+    self.vy += beta*ry/dt
+    self.t = now
+
+  # Estimated position t seconds ahead
+  def Predict(self, t):
+    return self.x + self.vx*t, self.y + self.vy*t
+
+
+#---------------
+# Time for a UAV at speed to meet a target at relative position (dx, dy)
+# moving at (vx, vy): the smallest t > 0 with |d + v t| = speed t, or
+# None if the target outruns the UAV
+#---------------
+def InterceptTime(dx, dy, vx, vy, speed):
+  a = vx*vx + vy*vy - speed*speed
+  b = 2*(dx*vx + dy*vy)
+  c = dx*dx + dy*dy
+  if abs(a) < 1e-9:
+    return -c/b if b < 0 else None
+  disc = b*b - 4*a*c
+  if disc < 0:
+    return None
+  root = math.sqrt(disc)
+  times = [t for t in ((-b - root)/(2*a), (-b + root)/(2*a)) if t >= 0]
+  return min(times) if times else None
+
+
+#---------------
+# Waypoints that lead a tracked target instead of chasing it
+# Observes the tracked target every tick and aims the UAV where it meets
+# the target, looking no more than horizon seconds ahead. A waypoint is
+# only returned when the intercept moved more than tolerance from the
+# last one sent, or a quarter of the distance left to it, whichever is
+# smaller, so the UAV still homes in on a target it is about to reach.
+#---------------
+class InterceptPlanner():
+  def __init__(self, speed, tolerance, alpha=0.5, beta=0.2, horizon=5.0, hold=0.5):
+    self.speed = speed
+    self.tolerance = tolerance
+    self.alpha = alpha
+    self.beta = beta
+    self.horizon = horizon
+    self.hold = hold
+    # Faster than any target is expected to move: a placement, not motion
+    self.maxspeed = 4*speed
+    self.tracks = {}
+    self.trackid = None
+    self.wypt = None
+    self.sent = 0
+    self.held = 0
+
+  # Measure the target's position
+  def Observe(self, trgtnodeid, x, y):
+    now = time.monotonic()
+    track = self.tracks.get(trgtnodeid)
+    if track is None:
+      # Forget targets not seen for a while
+      for nodeid in [nodeid for nodeid, old in self.tracks.items() if now - old.t > 2*self.horizon]:
+        del self.tracks[nodeid]
+      self.tracks[trgtnodeid] = AlphaBeta(x, y, now)
+      return
+    track.Update(x, y, now, self.alpha, self.beta, self.maxspeed, self.hold)
+
+  # Where the UAV at uavxy meets the target
+  def Intercept(self, trgtnodeid, uavxy):
+    track = self.tracks[trgtnodeid]
+    t = InterceptTime(track.x - uavxy[0], track.y - uavxy[1], track.vx, track.vy, self.speed)
+    if t is None or t > self.horizon:
+      t = self.horizon
+    return track.Predict(t)
+
+  # Waypoint to send for the target at targetxy, None to keep the last one
+  def Waypoint(self, trgtnodeid, uavxy, targetxy):
+    self.Observe(trgtnodeid, targetxy[0], targetxy[1])
+    x, y = self.Intercept(trgtnodeid, uavxy)
+    if self.trackid == trgtnodeid and self.wypt is not None:
+      tolerance = min(self.tolerance, 0.25*math.hypot(x - uavxy[0], y - uavxy[1]))
+      if math.hypot(x - self.wypt[0], y - self.wypt[1]) <= tolerance:
+        self.held += 1
+        return None
+    self.trackid = trgtnodeid
+    self.wypt = (x, y)
+    self.sent += 1
+    return self.wypt
+
+  # The UAV was sent elsewhere (redeployed); the next waypoint is sent
+  def Reset(self):
+    self.trackid = None
+    self.wypt = None
+
+  def Stats(self):
+    return {'sent': self.sent, 'held': self.held, 'tracks': len(self.tracks)}
@@ -0,0 +1,271 @@
+# This module keeps the structured results of test runs and turns them into a latency report.
+# Results are JSON lines, one test run per line, appended by test_uavs_grpc.py and run_scenarios.py so
+# repetitions accumulate. The report gives per scenario convergence latency percentiles, a confidence interval
+# of the mean and the rate of runs where every uav tracked a unique target, and compares them to a saved
+# baseline: the exit status is 1 when a scenario regressed beyond the threshold. A scenario is a protocol and a
+# test id, and every result is tagged with the version of the code that produced it (RunTag), so results of
+# other protocols or older code are never pooled into one row unknowingly.
+
+
+import argparse
+import csv
+import json
+import math
+import os
+import subprocess
+import sys
+
+# Two-sided 95% Student t quantiles for 1 to 30 degrees of freedom
+t95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+       2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+       2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+fields = ['protocol', 'id', 'runs', 'mean', 'ci', 'p50', 'p90', 'p99', 'max', 'pass_rate', 'pass_low', 'pass_high', 'expired']
+
+
+#---------------
+# Tag of the results of this run: the checked out commit, "-dirty" with
+# local changes (git describe), None outside a git checkout
+#---------------
+def RunTag():
+    try:
+        tag = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    except OSError:
+        return None
+    return tag or None
+
+
+# Scenario of a result or summary row
+def Key(row):
+    return row.get('protocol'), row['id']
+
+
+#---------------
+# Append test results (dicts) to a JSON lines file
+#---------------
+def AppendResults(file_name, results):
+    with open(file_name, 'a') as fptr:
+        for result in results:
+            fptr.write(json.dumps(result) + '\n')
+
+
+def LoadResults(file_names):
+    results = []
+    for file_name in file_names:
+        with open(file_name) as fptr:
+            results += [json.loads(line) for line in fptr if line.strip()]
+    return results
+
+
+#---------------
+# Percentile q (0-100) of sorted values, interpolating between ranks
+#---------------
+def Percentile(values, q):
+    if len(values) == 1:
+        return values[0]
+    rank = (len(values) - 1) * q / 100
+    low = int(math.floor(rank))
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+#---------------
+# Mean and the half width of its 95% confidence interval
+#---------------
+def MeanConfidence(values):
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return mean, float('inf')
+    std = math.sqrt(sum((value - mean)**2 for value in values) / (n - 1))
+    t = t95[n - 2] if n - 1 <= len(t95) else 1.96
+    return mean, t * std / math.sqrt(n)
+
+
+#---------------
+# 95% Wilson score interval of a pass rate
+#---------------
+def Wilson(passed, n, z=1.96):
+    rate = passed / n
+    center = (rate + z*z/(2*n)) / (1 + z*z/n)
+    width = z * math.sqrt(rate*(1 - rate)/n + z*z/(4*n*n)) / (1 + z*z/n)
+    return max(0.0, center - width), min(1.0, center + width)
+
+
+# Results with tag; every result if tag is None
+def Tagged(results, tag=None):
+    if tag is None:
+        return results
+    return [result for result in results if result.get('tag') == tag]
+
+
+# Number of results per tag, in the order tags first appear
+def Tags(results):
+    tags = {}
+    for result in results:
+        tags[result.get('tag')] = tags.get(result.get('tag'), 0) + 1
+    return tags
+
+
+#---------------
+# Per scenario (protocol, test id) statistics, in the order scenarios
+# first appear
+#---------------
+def Summarize(results):
+    order = []
+    bykey = {}
+    for result in results:
+        if Key(result) not in bykey:
+            order.append(Key(result))
+        bykey.setdefault(Key(result), []).append(result)
+
+    summary = []
+    for protocol, test_id in order:
+        runs = bykey[(protocol, test_id)]
+        latencies = sorted(run['latency'] for run in runs)
+        passed = sum(1 for run in runs if run['unique'])
+        mean, ci = MeanConfidence(latencies)
+        low, high = Wilson(passed, len(runs))
+        summary.append({
+            'protocol': protocol,
+            'id': test_id,
+            'runs': len(runs),
+            'mean': mean,
+            'ci': ci,
+            'p50': Percentile(latencies, 50),
+            'p90': Percentile(latencies, 90),
+            'p99': Percentile(latencies, 99),
+            'max': latencies[-1],
+            'pass_rate': passed / len(runs),
+            'pass_low': low,
+            'pass_high': high,
+            'expired': sum(1 for run in runs if run.get('expired')),
+        })
+    return summary
+
+
+def Increase(value, old):
+    if old == 0:
+        return "+%0.4f s" % (value - old)
+    return "+%0.0f%%" % (100 * (value / old - 1))
+
+
+#---------------
+# Scenarios of summary that regressed against baseline, as messages
+# Only scenarios with at least min_runs runs on both sides are compared.
+# Latency regresses when p50 or p90 is more than threshold (a fraction)
+# above the baseline and the 95% intervals of the mean do not overlap;
+# the pass rate when it drops by more than max_pass_drop and its
+# intervals do not overlap. One noisy run cannot fail a comparison.
+#---------------
+def Compare(summary, baseline, threshold=0.2, max_pass_drop=0.1, min_runs=5):
+    base = {Key(row): row for row in baseline}
+    regressions = []
+    for row in summary:
+        old = base.get(Key(row))
+        if old is None or min(row['runs'], old['runs']) < min_runs:
+            continue
+        slower = row['mean'] - row['ci'] > old['mean'] + old['ci']
+        for key in ('p50', 'p90'):
+            if slower and row[key] > old[key] * (1 + threshold):
+                regressions.append("Test %s %s: %s latency %0.4f s, baseline %0.4f s (%s)" %
+                                   (row.get('protocol'), row['id'], key, row[key], old[key], Increase(row[key], old[key])))
+        if row['pass_rate'] < old['pass_rate'] - max_pass_drop and row['pass_high'] < old['pass_low']:
+            regressions.append("Test %s %s: pass rate %0.2f, baseline %0.2f" %
+                               (row.get('protocol'), row['id'], row['pass_rate'], old['pass_rate']))
+    return regressions
+
+
+# Scenarios (protocol, test id) in both summary and baseline with too few
+# runs to compare
+def Uncompared(summary, baseline, min_runs=5):
+    base = {Key(row): row for row in baseline}
+    return [Key(row) for row in summary if Key(row) in base and min(row['runs'], base[Key(row)]['runs']) < min_runs]
+
+
+def PrintSummary(summary, fptr=sys.stdout):
+    fptr.write("%-8s %-5s %5s %10s %10s %10s %10s %10s %16s %8s\n" %
+               ("Protocol", "Test", "Runs", "Mean", "+/-95%", "p50", "p90", "p99", "Passed (95%)", "Expired"))
+    for row in summary:
+        fptr.write("%-8s %-5s %5d %10.4f %10.4f %10.4f %10.4f %10.4f %5.2f %4.2f-%4.2f %8d\n" %
+                   (row.get('protocol'), row['id'], row['runs'], row['mean'], row['ci'], row['p50'], row['p90'], row['p99'],
+                    row['pass_rate'], row['pass_low'], row['pass_high'], row['expired']))
+
+
+def WriteSummary(summary, file_name):
+    with open(file_name, 'w', newline='') as fptr:
+        writer = csv.DictWriter(fptr, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(summary)
+
+
+def SaveBaseline(summary, file_name):
+    with open(file_name, 'w') as fptr:
+        json.dump(summary, fptr, indent=1)
+
+
+def LoadBaseline(file_name):
+    with open(file_name) as fptr:
+        return json.load(fptr)
+
+
+#---------------
+# Print the report; returns the regressions against the baseline
+#---------------
+def Report(results, baseline=None, threshold=0.2, max_pass_drop=0.1, output=None, save_baseline=None, min_runs=5):
+    summary = Summarize(results)
+    PrintSummary(summary)
+    if output is not None:
+        WriteSummary(summary, output)
+    if save_baseline is not None:
+        SaveBaseline(summary, save_baseline)
+    regressions = []
+    if baseline is not None:
+        baseline_summary = LoadBaseline(baseline)
+        regressions = Compare(summary, baseline_summary, threshold, max_pass_drop, min_runs)
+        for protocol, test_id in Uncompared(summary, baseline_summary, min_runs):
+            print("Test %s %s: fewer than %d runs, not compared" % (protocol, test_id, min_runs))
+        for regression in regressions:
+            print("REGRESSION %s" % regression)
+        if len(regressions) == 0:
+            print("No regression against %s" % baseline)
+    return regressions
+
+
+def AddReportArguments(parser):
+    parser.add_argument('--baseline', dest='baseline', type=str, default=None,
+                        help='Baseline summary (JSON) to compare against')
+    parser.add_argument('--save-baseline', dest='save_baseline', type=str, default=None,
+                        help='Save this run\'s summary as a baseline')
+    parser.add_argument('--threshold', dest='threshold', type=float, default=0.2,
+                        help='Latency regression threshold, as a fraction of the baseline p50/p90')
+    parser.add_argument('--max-pass-drop', dest='max_pass_drop', type=float, default=0.1,
+                        help='Largest tolerated drop of the unique-target pass rate')
+    parser.add_argument('--min-runs', dest='min_runs', type=int, default=5,
+                        help='Runs a scenario needs, here and in the baseline, to be compared')
+    parser.add_argument('--summary', dest='summary', type=str, default=None,
+                        help='Write the per scenario statistics as CSV')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('results', nargs='+',
+                        help='Result files (JSON lines) written by test_uavs_grpc.py or run_scenarios.py')
+    parser.add_argument('--tag', dest='tag', type=str, default=None,
+                        help='Only the results tagged so (the code version, see RunTag), default all')
+    AddReportArguments(parser)
+    args = parser.parse_args()
+
+    results = LoadResults(args.results)
+    tags = Tags(results)
+    if args.tag is None and len(tags) > 1:
+        print("Results of %d code versions pooled (%s); pick one with --tag" %
+              (len(tags), ", ".join("%s: %d runs" % (tag, count) for tag, count in tags.items())))
+    regressions = Report(Tagged(results, args.tag), args.baseline, args.threshold, args.max_pass_drop,
+                         args.summary, args.save_baseline, args.min_runs)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
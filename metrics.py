@@ -0,0 +1,180 @@
+#!/usr/bin/python
+
+# Agent metrics (counters, latency histograms) and leveled logging
+
+import bisect
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+levels = {'debug': 10, 'info': 20, 'warn': 30, 'error': 40, 'off': 100}
+
+# Histogram bucket upper bounds (seconds): 10 us doubling up to ~10 s
+buckets = [1e-5 * 2**i for i in range(21)]
+
+clock = time.perf_counter
+
+
+#---------------
+# Leveled logger
+# Methods below the level are replaced by a no-op, so a disabled
+# log.Debug("UAV nodes: %s", uavs) costs a call and never formats.
+#---------------
+class Logger():
+  def __init__(self, level='info', stream=None):
+    self.stream = stream
+    self.SetLevel(level)
+
+  def SetLevel(self, level):
+    self.level = levels[level]
+    for name in ('debug', 'info', 'warn', 'error'):
+      if levels[name] >= self.level:
+        setattr(self, name.capitalize(), self.Emitter(name))
+      else:
+        setattr(self, name.capitalize(), self.Off)
+
+  def Enabled(self, level):
+    return levels[level] >= self.level
+
+  def Emitter(self, name):
+    def Emit(msg, *args):
+      if args:
+        msg = msg % args
+      print(msg, file=self.stream or sys.stdout)
+    return Emit
+
+  def Off(self, msg, *args):
+    pass
+
+
+#---------------
+# Cumulative histogram of seconds
+#---------------
+class Histogram():
+  __slots__ = ('counts', 'sum', 'count')
+
+  def __init__(self):
+    self.counts = [0]*(len(buckets) + 1)
+    self.sum = 0.0
+    self.count = 0
+
+  def Observe(self, value):
+    self.counts[bisect.bisect_left(buckets, value)] += 1
+    self.sum += value
+    self.count += 1
+
+  # (upper bound, cumulative count) pairs, the last bound is +Inf
+  def Cumulative(self):
+    total = 0
+    pairs = []
+    for bound, count in zip(buckets + [float('inf')], self.counts):
+      total += count
+      pairs.append((bound, total))
+    return pairs
+
+
+#---------------
+# Counters and histograms of one agent
+# Count/Observe are no-ops until the metrics are enabled.
+# Export() writes a snapshot as JSON lines (appended) or Prometheus
+# text (replacing the file) to a file, or sends it to udp://host:port.
+#---------------
+class Metrics():
+  def __init__(self, labels=None):
+    self.labels = labels or {}
+    self.counters = {}
+    self.histograms = {}
+    self.lock = threading.Lock()
+    self.dest = None
+    self.format = 'jsonl'
+    self.sk = None
+    self.Count = self.Off
+    self.Observe = self.Off
+
+  def Off(self, name, value=1):
+    pass
+
+  def Enable(self, dest, format='jsonl', interval=1.0):
+    self.dest = dest
+    self.format = format
+    if dest.startswith('udp://'):
+      host, port = dest[len('udp://'):].rsplit(':', 1)
+      self.sk = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+      self.sk.connect((host, int(port)))
+    self.Count = self.Add
+    self.Observe = self.Record
+    thread = threading.Thread(target=self.Run, args=(interval,), daemon=True)
+    thread.start()
+
+  def Add(self, name, value=1):
+    with self.lock:
+      self.counters[name] = self.counters.get(name, 0) + value
+
+  def Record(self, name, seconds):
+    with self.lock:
+      histogram = self.histograms.get(name)
+      if histogram is None:
+        histogram = self.histograms[name] = Histogram()
+      histogram.Observe(seconds)
+
+  def Run(self, interval):
+    while 1:
+      time.sleep(interval)
+      self.Export()
+
+  def Snapshot(self):
+    with self.lock:
+      counters = dict(self.counters)
+      histograms = {name: (h.Cumulative(), h.sum, h.count) for name, h in self.histograms.items()}
+    return counters, histograms
+
+  def Json(self, counters, histograms):
+    record = {'time': time.time(), 'labels': self.labels, 'counters': counters, 'histograms': {}}
+    for name, (pairs, total, count) in histograms.items():
+      record['histograms'][name] = {'count': count, 'sum': total,
+                                    'buckets': [[bound if bound != float('inf') else '+Inf', n] for bound, n in pairs]}
+    return json.dumps(record) + '\n'
+
+  def Prometheus(self, counters, histograms):
+    labels = ','.join('%s="%s"' % item for item in sorted(self.labels.items()))
+    lines = []
+    for name, value in sorted(counters.items()):
+      lines.append('# TYPE uav_%s_total counter' % name)
+      lines.append('uav_%s_total{%s} %s' % (name, labels, value))
+    sep = ',' if labels else ''
+    for name, (pairs, total, count) in sorted(histograms.items()):
+      lines.append('# TYPE uav_%s_seconds histogram' % name)
+      for bound, n in pairs:
+        le = '+Inf' if bound == float('inf') else '%g' % bound
+        lines.append('uav_%s_seconds_bucket{%s%sle="%s"} %d' % (name, labels, sep, le, n))
+      lines.append('uav_%s_seconds_sum{%s} %f' % (name, labels, total))
+      lines.append('uav_%s_seconds_count{%s} %d' % (name, labels, count))
+    return '\n'.join(lines) + '\n'
+
+  def Export(self):
+    counters, histograms = self.Snapshot()
+    if self.format == 'prometheus':
+      text = self.Prometheus(counters, histograms)
+    else:
+      text = self.Json(counters, histograms)
+    if self.sk is not None:
+      try:
+        self.sk.send(text.encode('utf-8'))
+      except OSError:
+        pass
+    elif self.format == 'prometheus':
+      # textfile collectors must never see a half written file
+      tmpname = self.dest + '.tmp'
+      with open(tmpname, 'w') as fptr:
+        fptr.write(text)
+      os.replace(tmpname, self.dest)
+    else:
+      with open(self.dest, 'a') as fptr:
+        fptr.write(text)
+
+
+log = Logger()
+metrics = Metrics()
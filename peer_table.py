@@ -0,0 +1,217 @@
+#!/usr/bin/python
+
+# Indexed table of UAV peers and the targets they claim
+
+import time
+
+from advert_wire import SeqBefore
+
+#---------------
+# Define a CORE node
+# trackid/oldtrackid are properties so every assignment keeps the
+# owning table's reverse indexes up to date
+#---------------
+class CORENode():
+  __slots__ = ('nodeid', '_trackid', '_oldtrackid', 'trackdist', 'heard', 'seq', 'stamp', 'table')
+
+  def __init__(self, nodeid, track_nodeid, track_dist):
+    self.table = None
+    self.nodeid = nodeid
+    self._trackid = track_nodeid
+    self._oldtrackid = track_nodeid
+    self.trackdist = track_dist
+    # time.monotonic() of the last claim heard from this node
+    self.heard = time.monotonic()
+    # sequence number and sender timestamp of the last claim applied
+    self.seq = None
+    self.stamp = None
+
+  @property
+  def trackid(self):
+    return self._trackid
+
+  @trackid.setter
+  def trackid(self, track_nodeid):
+    if self.table is not None and track_nodeid != self._trackid:
+      self.table.Reindex(self.table.bytrack, self.nodeid, self._trackid, track_nodeid)
+    self._trackid = track_nodeid
+
+  @property
+  def oldtrackid(self):
+    return self._oldtrackid
+
+  @oldtrackid.setter
+  def oldtrackid(self, track_nodeid):
+    if self.table is not None and track_nodeid != self._oldtrackid:
+      self.table.Reindex(self.table.byoldtrack, self.nodeid, self._oldtrackid, track_nodeid)
+    self._oldtrackid = track_nodeid
+
+  def __repr__(self):
+    return str(self.nodeid) + " " + str(self.oldtrackid) + " " + str(self.trackdist)
+
+
+#---------------
+# UAV peers keyed by node id
+# bytrack/byoldtrack map a target id to the node ids claiming it
+# (dicts used as insertion ordered sets)
+#---------------
+class PeerTable():
+  __slots__ = ('nodes', 'bytrack', 'byoldtrack', 'mine', 'changes', 'evicted')
+
+  def __init__(self):
+    self.nodes = {}
+    self.bytrack = {}
+    self.byoldtrack = {}
+    self.mine = None
+    # peer claims that differ from the peer's previous claim
+    self.changes = 0
+    # nodeid -> (seq, stamp) of the last claim of an evicted node
+    self.evicted = {}
+
+  def __len__(self):
+    return len(self.nodes)
+
+  # Nodes ever heard of, this one included: evicted nodes still count,
+  # so the swarm size does not shrink when peers fail or leave
+  def Known(self):
+    return len(self.nodes) + len(self.evicted)
+
+  def __iter__(self):
+    return iter(self.nodes.values())
+
+  def __contains__(self, nodeid):
+    return nodeid in self.nodes
+
+  def __repr__(self):
+    return repr(list(self.nodes.values()))
+
+  # Move a node id from one target's claimant set to another's
+  def Reindex(self, index, nodeid, old_trackid, new_trackid):
+    claimants = index.get(old_trackid)
+    if claimants is not None:
+      claimants.pop(nodeid, None)
+      if len(claimants) == 0:
+        del index[old_trackid]
+    index.setdefault(new_trackid, {})[nodeid] = None
+
+  def Add(self, node, mine=False):
+    node.table = self
+    self.nodes[node.nodeid] = node
+    self.bytrack.setdefault(node.trackid, {})[node.nodeid] = None
+    self.byoldtrack.setdefault(node.oldtrackid, {})[node.nodeid] = None
+    if mine:
+      self.mine = node
+    return node
+
+  def Get(self, nodeid):
+    return self.nodes.get(nodeid)
+
+  def Remove(self, nodeid):
+    node = self.nodes.pop(nodeid, None)
+    if node is None:
+      return None
+    for index, trackid in ((self.bytrack, node.trackid), (self.byoldtrack, node.oldtrackid)):
+      claimants = index.get(trackid)
+      if claimants is not None:
+        claimants.pop(nodeid, None)
+        if len(claimants) == 0:
+          del index[trackid]
+    node.table = None
+    return node
+
+  # Remove a node that failed and release its claims; claims of it
+  # that are not newer than its last one (late relays) are ignored
+  def Evict(self, nodeid):
+    node = self.Remove(nodeid)
+    if node is not None:
+      self.changes += 1
+      self.evicted[nodeid] = (node.seq, node.stamp)
+    return node
+
+  # Is a claim (seq, stamp) older than the last one (lastseq, laststamp)
+  def Stale(self, lastseq, laststamp, seq, stamp):
+    if seq is None or lastseq is None:
+      return False
+    return SeqBefore(seq, lastseq) and not SeqBefore(laststamp, stamp)
+
+  # Apply a claim heard from a peer, adding the peer if it is new
+  # A claim with an older sequence number than the last one applied
+  # arrived out of order and is dropped (returns None), unless its
+  # sender timestamp is newer: the peer restarted its sequence
+  # An evicted node is added back only by a newer claim
+  def Update(self, nodeid, track_nodeid, track_dist, seq=None, stamp=None):
+    node = self.nodes.get(nodeid)
+    if node is None:
+      if nodeid in self.evicted:
+        lastseq, laststamp = self.evicted[nodeid]
+        if seq == lastseq or self.Stale(lastseq, laststamp, seq, stamp):
+          return None
+        del self.evicted[nodeid]
+      self.changes += 1
+      node = self.Add(CORENode(nodeid, track_nodeid, track_dist))
+      node.seq = seq
+      node.stamp = stamp
+      return node
+    if self.Stale(node.seq, node.stamp, seq, stamp):
+      return None
+    node.seq = seq
+    node.stamp = stamp
+    lastclaim = node.trackid if node.trackid != 0 else node.oldtrackid
+    if track_nodeid != lastclaim:
+      self.changes += 1
+    node.trackid = track_nodeid
+    node.trackdist = track_dist
+    node.heard = time.monotonic()
+    return node
+
+  # Number of changed peer claims since the last call
+  def TakeChanges(self):
+    changes = self.changes
+    self.changes = 0
+    return changes
+
+  # Does a node other than this UAV hold a claim on a target, this
+  # round or last round
+  def Contended(self, trgtnodeid):
+    for index in (self.bytrack, self.byoldtrack):
+      for nodeid in index.get(trgtnodeid, ()):
+        if self.mine is None or nodeid != self.mine.nodeid:
+          return True
+    return False
+
+  # Nodes currently claiming a target
+  def Claimants(self, trgtnodeid):
+    return [self.nodes[nodeid] for nodeid in self.bytrack.get(trgtnodeid, ())]
+
+  # Is a target tracked by any node, either by a claim heard this tick or
+  # by last tick's claim of a node not heard from since
+  def Tracked(self, trgtnodeid):
+    if len(self.bytrack.get(trgtnodeid, ())) > 0:
+      return True
+    for nodeid in self.byoldtrack.get(trgtnodeid, ()):
+      if self.nodes[nodeid].trackid == 0:
+        return True
+    return False
+
+  # Every target Tracked() is true for
+  def TrackedTargets(self):
+    tracked = set(self.bytrack)
+    for trgtnodeid, claimants in self.byoldtrack.items():
+      if trgtnodeid not in tracked:
+        for nodeid in claimants:
+          if self.nodes[nodeid].trackid == 0:
+            tracked.add(trgtnodeid)
+            break
+    return tracked
+
+  # Start a new round: last claims become old claims and other UAVs
+  # are marked as not heard from yet (0)
+  # A UAV not heard from last round keeps its old claim while that
+  # claim is at most maxage seconds old (peers ticking slower than us)
+  def Age(self, maxage=0.0):
+    now = time.monotonic()
+    for node in self.nodes.values():
+      if node is not self.mine:
+        if node.trackid != 0 or now - node.heard > maxage:
+          node.oldtrackid = node.trackid
+        node.trackid = 0
@@ -0,0 +1,69 @@
+#!/usr/bin/python
+
+# Publish the node positions of a CORE session to a host-wide table
+#
+#   python position_daemon.py --core 172.16.0.254:50051
+#   python track_target_grpc.py -my 1 -p udp --positions shm
+#
+# One subscriber per host follows the CORE node events and writes every
+# position into the shared memory table of position_table.py. Agents on
+# the host read positions from the table, so CORE answers one stream
+# however many agents run.
+
+import argparse
+import time
+
+from core.api.grpc import client
+
+from position_snapshot import PositionSnapshot
+from position_table import PositionTable
+from metrics import log
+
+
+#---------------
+# main
+#---------------
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--core', dest = 'core', metavar='core address',
+                      type=str, default = '172.16.0.254:50051', help='CORE gRPC address')
+  parser.add_argument('--table', dest = 'table', metavar='position table',
+                      type=str, default = '/dev/shm/core_positions', help='Shared memory file of the position table')
+  parser.add_argument('--capacity', dest = 'capacity', metavar='capacity',
+                      type=int, default = '1024', help='Slots of the table; node IDs must be below it')
+  parser.add_argument('--source', dest = 'source', metavar='position source',
+                      type=str, default = 'events', choices=['poll', 'events'],
+                      help='Follow the CORE event stream, or poll the session every --resync')
+  parser.add_argument('--resync', dest = 'resync', metavar='resync interval',
+                      type=int, default = '1000', help='Full session fetch interval (msec), also the heartbeat')
+  parser.add_argument('--log-level', dest = 'log_level', metavar='log level',
+                      type=str, default = 'info', choices=['debug', 'info', 'warn', 'error', 'off'],
+                      help='Log level')
+  args = parser.parse_args()
+  log.SetLevel(args.log_level)
+
+  core = client.CoreGrpcClient(args.core)
+  core.connect()
+  response = core.get_sessions()
+  if not response.sessions:
+    raise ValueError("no current core sessions")
+  session_id = int(response.sessions[0].id)
+
+  table = PositionTable(args.table, args.capacity)
+  resync = float(args.resync)/1000
+  positions = PositionSnapshot(core, session_id, resync, args.source)
+  # Every position seen from now on goes to the table
+  positions.Watch(table.Write)
+  log.Info("Publishing positions of session %d to %s", session_id, args.table)
+  try:
+    while 1:
+      positions.BeginTick()
+      table.Beat()
+      time.sleep(resync)
+  finally:
+    positions.close()
+    table.close()
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,110 @@
+#!/usr/bin/python
+
+# Snapshot of CORE node positions shared by everything in one tick
+
+import threading
+import time
+
+from core.api.grpc import core_pb2
+
+
+#---------------
+# Node positions fetched with one bulk get_session call
+# BeginTick() refreshes the snapshot when it is older than ttl seconds;
+# Node() then answers from the snapshot without another round-trip.
+# With source "events" the snapshot is kept fresh from the CORE node
+# event stream and ttl only bounds how often a full resync is done.
+# Watch(callback) calls callback(nodeid, x, y) for every position that
+# changes or is seen for the first time.
+#---------------
+class PositionSnapshot():
+  def __init__(self, core, session_id, ttl=0.0, source="poll"):
+    self.core = core
+    self.session_id = session_id
+    self.ttl = ttl
+    self.source = source
+    self.nodes = {}
+    self.fetched = None
+    self.stream = None
+    self.watchers = []
+    self.lock = threading.Lock()
+    # agents hosted in one process tick concurrently; one refreshes
+    self.refreshing = threading.Lock()
+    if source == "events":
+      self.Refresh()
+      self.stream = core.events(session_id, self.HandleEvent, [core_pb2.EventType.NODE])
+
+  def Watch(self, callback):
+    self.watchers.append(callback)
+    with self.lock:
+      nodes = list(self.nodes.values())
+    for node in nodes:
+      callback(node.id, node.position.x, node.position.y)
+
+  def Moved(self, nodes):
+    for watcher in self.watchers:
+      for node in nodes:
+        watcher(node.id, node.position.x, node.position.y)
+
+  # Replace the snapshot with every node of the session
+  def Refresh(self):
+    session = self.core.get_session(self.session_id).session
+    nodes = {node.id: node for node in session.nodes}
+    with self.lock:
+      old = self.nodes
+      self.nodes = nodes
+      self.fetched = time.monotonic()
+    if len(self.watchers) > 0:
+      self.Moved([node for nodeid, node in nodes.items()
+                  if nodeid not in old or old[nodeid].position != node.position])
+
+  def Stale(self):
+    if self.fetched is None:
+      return True
+    if self.source == "events":
+      return self.ttl > 0 and time.monotonic() - self.fetched >= self.ttl
+    return time.monotonic() - self.fetched >= self.ttl
+
+  def BeginTick(self):
+    if self.Stale():
+      with self.refreshing:
+        if self.Stale():
+          self.Refresh()
+
+  # Apply a node event pushed by CORE
+  # Nodes handed out by Node() are never changed: a tick reading one
+  # keeps a consistent position, and the event stores a new node
+  def HandleEvent(self, event):
+    if not event.HasField("node_event"):
+      return
+    node = event.node_event.node
+    with self.lock:
+      known = self.nodes.get(node.id)
+      if known is not None:
+        updated = core_pb2.Node()
+        updated.CopyFrom(known)
+        if node.HasField("position"):
+          updated.position.CopyFrom(node.position)
+        if node.icon:
+          updated.icon = node.icon
+        node = updated
+      self.nodes[node.id] = node
+    if event.node_event.node.HasField("position"):
+      self.Moved([node])
+
+  # Node (position + icon) from the snapshot
+  # Nodes created after the last refresh are fetched on their own
+  def Node(self, nodeid):
+    with self.lock:
+      node = self.nodes.get(nodeid)
+    if node is None:
+      node = self.core.get_node(self.session_id, nodeid).node
+      with self.lock:
+        self.nodes[nodeid] = node
+      self.Moved([node])
+    return node
+
+  def close(self):
+    if self.stream is not None:
+      self.stream.cancel()
+      self.stream = None
@@ -0,0 +1,236 @@
+#!/usr/bin/python
+
+# Host-wide table of node positions in shared memory
+#
+# position_daemon.py is the one writer on a host; agents started with
+# --positions shm read it in place. The table is a memory-mapped file
+# (under /dev/shm by default), in native byte order:
+#   header  magic 'UAVP', version (H), 2 pad bytes, capacity (I),
+#           highest node id written (I), writes (Q), daemon heartbeat
+#           (d, time.time())
+#   slots   capacity slots indexed by node id: sequence (I), node id
+#           (i), x, y (dd)
+# Each slot is a seqlock: the writer makes the sequence odd, writes the
+# position and makes it even again. A reader retries while the sequence
+# is odd or changed under it, RETRIES times at most: then the node is
+# fetched from CORE. Sequence 0 is a slot never written.
+# Every field is aligned, and the writer stores through typed views of
+# the map: a word at a time, where struct.pack_into would first clear
+# the bytes it packs and let a reader see a sequence of 0.
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+from input_log import Position
+from metrics import log, metrics
+
+MAGIC = b'UAVP'
+VERSION = 1
+HEADER = struct.Struct('@4sHxxIIQd')
+SLOT = struct.Struct('@Iidd')
+SEQ = struct.Struct('@I')
+HIGHEST = struct.Struct('@I')
+HIGHEST_OFFSET = 12
+WRITES = struct.Struct('@Q')
+WRITES_OFFSET = 16
+BEAT = struct.Struct('@d')
+BEAT_OFFSET = 24
+# reads of a slot before giving up on it: a write takes microseconds,
+# a sequence odd for longer is a writer that died in the middle
+RETRIES = 1000
+
+
+#---------------
+# Node read from the table, shaped like the CORE nodes the agent reads
+#---------------
+class TableNode():
+  __slots__ = ('id', 'position')
+
+  def __init__(self, nodeid, x, y):
+    self.id = nodeid
+    self.position = Position(x, y)
+
+
+def SlotOffset(nodeid):
+  return HEADER.size + nodeid*SLOT.size
+
+
+#---------------
+# Writer side of the table (position_daemon.py)
+# Write() is called from the CORE event thread and the resync loop;
+# a lock keeps writes to the table one at a time.
+# The table is built in a new file renamed over path: agents may still
+# map the table of a previous daemon, and truncating it under them
+# would crash them (SIGBUS). They keep the old file until they reopen.
+#---------------
+class PositionTable():
+  def __init__(self, path, capacity=1024):
+    self.path = path
+    self.capacity = capacity
+    size = SlotOffset(capacity)
+    tmppath = "%s.%d" % (path, os.getpid())
+    fd = os.open(tmppath, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+      os.ftruncate(fd, size)
+      self.mm = mmap.mmap(fd, size)
+    finally:
+      os.close(fd)
+    HEADER.pack_into(self.mm, 0, MAGIC, VERSION, capacity, 0, 0, time.time())
+    os.rename(tmppath, path)
+    self.words = memoryview(self.mm).cast('I')
+    self.quads = memoryview(self.mm).cast('Q')
+    self.doubles = memoryview(self.mm).cast('d')
+    self.highest = 0
+    self.writes = 0
+    self.lock = threading.Lock()
+
+  def Write(self, nodeid, x, y):
+    if nodeid < 0 or nodeid >= self.capacity:
+      log.Warn("Node %d does not fit a table of %d slots", nodeid, self.capacity)
+      return
+    word = SlotOffset(nodeid)//4
+    with self.lock:
+      seq = self.words[word]
+      self.words[word] = seq + 1
+      self.words[word + 1] = nodeid
+      self.doubles[word//2 + 1] = x
+      self.doubles[word//2 + 2] = y
+      self.words[word] = seq + 2
+      self.highest = max(self.highest, nodeid)
+      self.writes += 1
+      self.words[HIGHEST_OFFSET//4] = self.highest
+      self.quads[WRITES_OFFSET//8] = self.writes
+
+  # Readers take an old heartbeat for a daemon that is gone
+  def Beat(self):
+    self.doubles[BEAT_OFFSET//8] = time.time()
+
+  def close(self):
+    for view in (self.words, self.quads, self.doubles):
+      view.release()
+    self.mm.close()
+
+
+#---------------
+# Reader side: stands in for PositionSnapshot in the agent
+# Node() reads the node's slot directly, so positions are as fresh as
+# the daemon's and cost no round-trip. A node missing from the table is
+# fetched from CORE, if a client is given. Watch() callbacks are called
+# from BeginTick() for the slots written since the last tick.
+# A silent table is reopened once a restarted daemon replaced it.
+#---------------
+class SharedPositions():
+  def __init__(self, path, core=None, session_id=None, maxsilence=5.0):
+    self.mm, self.inode = self.Open(path)
+    self.path = path
+    self.core = core
+    self.session_id = session_id
+    self.maxsilence = maxsilence
+    self.silent = False
+    self.watchers = []
+    self.seen = {}
+    self.writes = None
+    # agents hosted in one process tick concurrently; one reports changes
+    self.lock = threading.Lock()
+
+  def Open(self, path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+      mm = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+      inode = os.fstat(fd).st_ino
+    finally:
+      os.close(fd)
+    magic, version, capacity, highest, writes, beat = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version != VERSION:
+      mm.close()
+      raise ValueError("%s is not a position table (version %d)" % (path, VERSION))
+    return mm, inode
+
+  # Map the table at path if a new daemon replaced the one mapped
+  # The old map is left to the readers still using it
+  def Reopen(self):
+    try:
+      if os.stat(self.path).st_ino == self.inode:
+        return
+      self.mm, self.inode = self.Open(self.path)
+    except (OSError, ValueError):
+      return
+    log.Info("Reopened position table %s", self.path)
+    self.writes = None
+    self.seen.clear()
+
+  # Position of a node as (x, y), None if the table has no slot for it
+  # or the slot stays in the middle of a write
+  def Read(self, nodeid):
+    mm = self.mm
+    if nodeid < 0 or SlotOffset(nodeid + 1) > len(mm):
+      return None
+    offset = SlotOffset(nodeid)
+    for i in range(RETRIES):
+      seq, slotid, x, y = SLOT.unpack_from(mm, offset)
+      if seq == 0:
+        return None
+      if seq & 1:
+        continue
+      again, = SEQ.unpack_from(mm, offset)
+      if again == seq:
+        return x, y
+    metrics.Count('table_read_failures')
+    return None
+
+  def Watch(self, callback):
+    with self.lock:
+      self.watchers.append(callback)
+      self.writes = None
+      self.seen.clear()
+      self.Report(self.Changed())
+
+  def Report(self, nodeids):
+    for nodeid in nodeids:
+      position = self.Read(nodeid)
+      if position is not None:
+        for watcher in self.watchers:
+          watcher(nodeid, position[0], position[1])
+
+  # Slots written since the last call, by their sequence
+  def Changed(self):
+    mm = self.mm
+    writes, = WRITES.unpack_from(mm, WRITES_OFFSET)
+    if writes == self.writes:
+      return []
+    self.writes = writes
+    highest, = HIGHEST.unpack_from(mm, HIGHEST_OFFSET)
+    changed = []
+    for nodeid in range(highest + 1):
+      seq, = SEQ.unpack_from(mm, SlotOffset(nodeid))
+      if seq != 0 and seq != self.seen.get(nodeid):
+        self.seen[nodeid] = seq
+        changed.append(nodeid)
+    return changed
+
+  def BeginTick(self):
+    beat, = BEAT.unpack_from(self.mm, BEAT_OFFSET)
+    silent = time.time() - beat > self.maxsilence
+    if silent and not self.silent:
+      log.Warn("Position table %s not updated for %0.1f seconds", self.path, time.time() - beat)
+    self.silent = silent
+    with self.lock:
+      if silent:
+        self.Reopen()
+      if len(self.watchers) > 0:
+        self.Report(self.Changed())
+
+  # Node (position) from the table
+  def Node(self, nodeid):
+    position = self.Read(nodeid)
+    if position is not None:
+      return TableNode(nodeid, position[0], position[1])
+    if self.core is None:
+      raise KeyError("node %d is not in %s" % (nodeid, self.path))
+    return self.core.get_node(self.session_id, nodeid).node
+
+  def close(self):
+    self.mm.close()
@@ -0,0 +1,191 @@
+#!/usr/bin/python
+
+# Replay the input log of a tracking agent through its decision logic
+#
+#   python track_target_grpc.py -my 1 -p udp --record /tmp/inputs_n{id}.log
+#   python replay_agent.py /tmp/inputs_n1.log --trace decisions.txt
+#
+# Advertisements, potential targets and node positions are fed back in
+# the order they were recorded, at the recorded pace (--realtime) or as
+# fast as possible. Waypoints, targets and advertisements the agent
+# produces go to a sink, so no CORE session, proxy or network is needed.
+
+import argparse
+import sys
+import time
+
+import auction
+import failure_detector
+import intercept
+import peer_table
+import tick_scheduler
+import trickle
+import track_target_grpc
+from input_log import ADVERT, ORIGIN, TICK, DecodeOrigin, DecodeTick, ReadLog
+from metrics import clock, log
+from track_target_grpc import DecodeAdvertisement, RunActions, UAVAgent
+
+
+#---------------
+# Clock of a replay as fast as possible
+# Protocol timers (trickle, failure detector, claim ages) read it
+# instead of the wall clock, so they see the recorded time between
+# inputs however fast they are replayed.
+#---------------
+class VirtualClock():
+  modules = (auction, failure_detector, intercept, peer_table, tick_scheduler, trickle, track_target_grpc)
+
+  def __init__(self):
+    self.now = time.monotonic()
+    self.epoch = time.time() - self.now
+
+  def monotonic(self):
+    return self.now
+
+  def time(self):
+    return self.epoch + self.now
+
+  def perf_counter(self):
+    return time.perf_counter()
+
+  def sleep(self, secs):
+    self.now += secs
+
+  def Install(self):
+    for module in self.modules:
+      module.time = self
+
+  def Uninstall(self):
+    for module in self.modules:
+      module.time = time
+
+
+#---------------
+# Takes the place of the waypoint proxy and the advertisement socket
+#---------------
+class ReplaySink():
+  def __init__(self, origin=(0, 0)):
+    self.origin = origin
+    self.wypt = None
+    self.target = -1
+    self.wypts = 0
+    self.adverts = 0
+    self.advertbytes = 0
+
+  def getOriginalWypt(self):
+    return self.origin
+
+  def setWypt(self, x, y):
+    self.wypt = (x, y)
+    self.wypts += 1
+
+  def setTarget(self, trgtnodeid):
+    self.target = trgtnodeid
+
+  def Flush(self):
+    pass
+
+  def sendto(self, buf, dest):
+    self.adverts += 1
+    self.advertbytes += len(buf)
+
+
+#---------------
+# Replay one log; returns the decision times (seconds) of every tick
+# trace, if given, gets one line per tick: time, target tracked,
+# waypoint and advertisements sent so far
+#---------------
+def Replay(path, extra_args=(), realtime=False, trace=None):
+  with open(path, 'rb') as fptr:
+    nodeid, argv, entries = ReadLog(fptr)
+    args = track_target_grpc.ArgParser().parse_args(argv + list(extra_args))
+    track_target_grpc.mcastaddr = args.mcast_group
+    track_target_grpc.port = args.mcast_port
+
+    virtual = None
+    if not realtime:
+      virtual = VirtualClock()
+      virtual.Install()
+    try:
+      sink = ReplaySink()
+      agent = UAVAgent(nodeid, args.protocol, sink, None)
+      agent.Setup(args, sink)
+
+      ticks = []
+      start = time.monotonic()
+      for secs, kind, payload in entries:
+        if virtual is not None:
+          virtual.now = start + secs
+        else:
+          time.sleep(max(0.0, start + secs - time.monotonic()))
+
+        if kind == ORIGIN:
+          sink.origin = DecodeOrigin(payload)
+          agent.Start()
+        elif kind == ADVERT:
+          if agent.advertiser is not None:
+            agent.ApplyAdvertisement(DecodeAdvertisement(payload, len(payload)))
+        elif kind == TICK:
+          potential_targets, nodes = DecodeTick(payload)
+          mark = clock()
+          agent.DetectFailures()
+          actions = []
+          if agent.protocol == "auction":
+            agent.DecideAuction(potential_targets, args.track_range, nodes.get, actions)
+          else:
+            agent.DecideTargets(potential_targets, args.track_range, nodes.get, actions)
+          RunActions(actions)
+          ticks.append(clock() - mark)
+          if trace is not None:
+            trace.write("%0.6f %d %s %d\n" % (secs, agent.uavs.mine.trackid,
+                                              "%d,%d" % sink.wypt if sink.wypt else "-", sink.adverts))
+    finally:
+      if virtual is not None:
+        virtual.Uninstall()
+  return ticks, sink
+
+
+def main():
+  parser = argparse.ArgumentParser(epilog='Agent arguments after -- override the recorded ones')
+  parser.add_argument('logs', metavar='input log', nargs='+',
+                      help='Input logs recorded with track_target_grpc.py --record')
+  parser.add_argument('--realtime', dest = 'realtime', action='store_true',
+                      help='Replay at the recorded pace instead of as fast as possible')
+  parser.add_argument('--trace', dest = 'trace', metavar='trace file',
+                      type=str, default = None, help='Write the decision of every tick to this file ({id} is replaced by the log number)')
+  parser.add_argument('--log-level', dest = 'log_level', metavar='log level',
+                      type=str, default = 'warn', choices=['debug', 'info', 'warn', 'error', 'off'],
+                      help='Log level of the replayed agent')
+  # Agent arguments after -- override the recorded ones
+  argv = sys.argv[1:]
+  extra_args = []
+  if '--' in argv:
+    extra_args = argv[argv.index('--') + 1:]
+    argv = argv[:argv.index('--')]
+  args = parser.parse_args(argv)
+
+  for i, path in enumerate(args.logs):
+    trace = None
+    if args.trace is not None:
+      trace = open(args.trace.format(id=i), 'w')
+    try:
+      start = time.perf_counter()
+      log.SetLevel(args.log_level)
+      ticks, sink = Replay(path, extra_args, args.realtime, trace)
+      elapsed = time.perf_counter() - start
+    finally:
+      if trace is not None:
+        trace.close()
+    if len(ticks) == 0:
+      print("%s: no ticks" % path)
+      continue
+    ticks.sort()
+    print("%s: %d ticks in %0.3f s (%0.0f ticks/s), decision mean %0.1f us p50 %0.1f us p99 %0.1f us, "
+          "%d waypoints, %d adverts (%d bytes)" %
+          (path, len(ticks), elapsed, len(ticks)/elapsed, 1e6*sum(ticks)/len(ticks),
+           1e6*ticks[len(ticks)//2], 1e6*ticks[min(len(ticks) - 1, int(len(ticks)*0.99))],
+           sink.wypts, sink.adverts, sink.advertbytes))
+
+
+if __name__ == '__main__':
+  main()
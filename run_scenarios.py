@@ -0,0 +1,185 @@
+# This module runs the test_uavs_grpc.py scenarios in parallel, many times each.
+# Every scenario run gets its own coresim session and agents, and the multicast and decision ports of the pool
+# worker running it, so runs at the same time do not see each other. The results of all runs are merged into one report, grouped by scenario.
+
+
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from core.api.grpc import client
+
+import test_uavs_grpc
+from test_uavs_grpc import Scenarios
+from bench_swarm import SwarmTestCase
+from coresim.simulator import Simulator
+from latency_report import AddReportArguments, AppendResults, PrintSummary, Report, Summarize
+from decision_collector import DecisionCollector
+
+uav_ids = [1, 2, 3, 4, 6, 7, 8, 9]
+target_ids = [11, 12, 13, 14, 16, 17, 18, 19]
+
+
+# Slot of this pool worker, 0 to jobs - 1: the offset of its ports
+slot = None
+
+
+# Pool worker initializer: take a slot no other worker holds
+def TakeSlot(slots):
+    global slot
+    slot = slots.get()
+
+
+#---------------
+# Run one scenario against a fresh simulator (in a pool worker)
+# Returns the result of the run as a dict; the scenario's console
+# output and its latency.log record are returned as text. The agents'
+# decision events go to a collector of the run.
+#---------------
+def RunScenario(repeat, scenario, args):
+    test_id, name, targets, timer, uavs_to_crash, after = scenario
+    collector = DecisionCollector(args.decision_port + slot, '127.0.0.1')
+    agent_args = args.agent_args + ['--trace-to', '127.0.0.1:%d' % (args.decision_port + slot)]
+    sim = Simulator(uav_ids, target_ids, grpc_port=0, proxy_port=0, speed=args.speed,
+                    speedup=args.speedup, protocol=args.protocol, interval=args.interval,
+                    mcast_port=args.mcast_port + slot, agent_args=agent_args)
+    output = io.StringIO()
+    record = io.StringIO()
+    sim.Start()
+    try:
+        core = client.CoreGrpcClient(sim.CoreAddress())
+        core.connect()
+        session_id = int(core.get_sessions().sessions[0].id)
+        time.sleep(args.warmup)
+
+        test_uavs_grpc.color_of_targets = dict(sim.world.color_of_targets)
+        test_uavs_grpc.uavs = {uav_id: -1 for uav_id in uav_ids}
+        test_uavs_grpc.start_time = (time.time(), None)
+        test = SwarmTestCase(core, session_id, test_id, name, sim, args.protocol, collector=collector)
+        with contextlib.redirect_stdout(output):
+            print("\n--------- Test %s - %s - run %d ------------" % (test_id, name, repeat))
+            test.runTest(args.expired, targets, args.poll, time_between_targets=timer,
+                         uavs_to_crash=uavs_to_crash, time_after_stop=after)
+        test.documentTest(record, test_id, name)
+        if args.decisions is not None:
+            collector.write(os.path.join(args.decisions, "decisions_%s_%d.npz" % (test_id, repeat)),
+                            test.starttime[0], test.stopwindow)
+    finally:
+        sim.Stop()
+        collector.close()
+    result = test.result()
+    if args.tag is not None:
+        result['tag'] = args.tag
+    result['run'] = repeat
+    result['output'] = output.getvalue()
+    result['record'] = record.getvalue()
+    return result
+
+
+#---------------
+# Every run's record followed by the statistics per scenario
+#---------------
+def RecordResults(results, file_name):
+    with open(file_name, 'w') as fptr:
+        for result in results:
+            fptr.write(result['record'])
+
+        fptr.write("\n\n")
+        PrintSummary(Summarize(results), fptr)
+
+        numUnique = sum(1 for result in results if result['unique'])
+        fptr.write("\n\nNumber of times uav-target pairings had all unique targets:\t%s\n" % numUnique)
+        fptr.write("Number of times uav-target pairings had duplicate targets:\t%s\n\n\n" % (len(results) - numUnique))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('protocol', nargs='?', default='udp',
+                        help='Comms protocol of the agents')
+    parser.add_argument('-s', '--scenarios', dest='scenarios', nargs='+', default=None,
+                        help='Scenario ids to run (default all)')
+    parser.add_argument('-r', '--repeat', dest='repeat', type=int, default=1,
+                        help='Runs of every scenario')
+    parser.add_argument('-j', '--jobs', dest='jobs', type=int, default=multiprocessing.cpu_count(),
+                        help='Scenario runs at the same time')
+    parser.add_argument('-i', '--update_interval', dest='interval', type=int, default=1,
+                        help='Agent update interval (msec)')
+    parser.add_argument('--speed', dest='speed', type=float, default=50.0,
+                        help='UAV speed (units per simulated second)')
+    parser.add_argument('--speedup', dest='speedup', type=float, default=1.0,
+                        help='Simulated seconds per wall clock second')
+    parser.add_argument('--mcast-port', dest='mcast_port', type=int, default=9200,
+                        help='Advertisement port of the first worker; worker n uses this port + n')
+    parser.add_argument('--decision-port', dest='decision_port', type=int, default=9300,
+                        help='Decision collector port of the first worker; worker n uses this port + n')
+    parser.add_argument('--decisions', dest='decisions', type=str, default=None,
+                        help='Directory to write the decision events of every run to (.npz)')
+    parser.add_argument('--warmup', dest='warmup', type=float, default=3.0,
+                        help='Seconds to let agents start before a scenario')
+    parser.add_argument('--expired', dest='expired', type=int, default=2500,
+                        help='Maximum number of polls before a scenario times out')
+    parser.add_argument('--poll', dest='poll', type=float, default=0.1,
+                        help='Poll period (seconds)')
+    parser.add_argument('--seed', dest='seed', type=int, default=None,
+                        help='Random seed for shuffles and crashed uavs')
+    parser.add_argument('-o', '--output', dest='output', type=str, default='latency.log',
+                        help='Merged report file')
+    parser.add_argument('--results', dest='results', type=str, default='latency.jsonl',
+                        help='Structured results (JSON lines) the runs are appended to')
+    parser.add_argument('--tag', dest='tag', type=str, default=None,
+                        help='Tag of the results, default the code version (git describe)')
+    AddReportArguments(parser)
+    parser.add_argument('agent_args', nargs=argparse.REMAINDER,
+                        help='Extra agent arguments, after --')
+    args = parser.parse_args()
+    if len(args.agent_args) > 0 and args.agent_args[0] == '--':
+        args.agent_args = args.agent_args[1:]
+    if abs(args.decision_port - args.mcast_port) < args.jobs:
+        parser.error("the %d ports from --mcast-port %d and --decision-port %d overlap" %
+                     (args.jobs, args.mcast_port, args.decision_port))
+
+    # Every repetition draws its own shuffles and crashed uavs
+    rng = random.Random(args.seed)
+    jobs = []
+    order = []
+    for repeat in range(args.repeat):
+        for scenario in Scenarios(uav_ids, target_ids, rng):
+            if args.scenarios is not None and scenario[0] not in args.scenarios:
+                continue
+            if scenario[0] not in order:
+                order.append(scenario[0])
+            jobs.append((repeat, scenario))
+
+    # Worker processes are spawned, not forked, so none inherits gRPC state
+    results = []
+    start = time.time()
+    context = multiprocessing.get_context('spawn')
+    slots = context.Queue()
+    for worker in range(args.jobs):
+        slots.put(worker)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.jobs, mp_context=context,
+                                                initializer=TakeSlot, initargs=(slots,)) as pool:
+        futures = [pool.submit(RunScenario, repeat, scenario, args) for repeat, scenario in jobs]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            print(result['output'], end='')
+            results.append(result)
+
+    results.sort(key=lambda result: (order.index(result['id']), result['run']))
+    RecordResults(results, args.output)
+    AppendResults(args.results, [{key: value for key, value in result.items() if key not in ('output', 'record')}
+                                 for result in results])
+    print("\n%d runs in %0.1f seconds, report in %s\n" % (len(results), time.time() - start, args.output))
+    regressions = Report(results, args.baseline, args.threshold, args.max_pass_drop, args.summary, args.save_baseline,
+                         args.min_runs)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
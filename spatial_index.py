@@ -0,0 +1,188 @@
+#!/usr/bin/python
+
+# Agent-side spatial index of target positions
+
+import math
+import threading
+import time
+
+
+#---------------
+# Uniform grid of points keyed by id
+# Points are bucketed in square cells; a move within a cell only
+# updates the point. Range and nearest queries look at the cells
+# around the query point instead of every point.
+#---------------
+class SpatialGrid():
+  def __init__(self, cell):
+    self.cell = float(cell)
+    # (cx, cy) -> {id: (x, y)}
+    self.cells = {}
+    # id -> (cx, cy)
+    self.where = {}
+    self.lock = threading.Lock()
+
+  def __len__(self):
+    return len(self.where)
+
+  def __contains__(self, pointid):
+    return pointid in self.where
+
+  def Key(self, x, y):
+    return (math.floor(x/self.cell), math.floor(y/self.cell))
+
+  # Insert a point or move it to (x, y)
+  def Move(self, pointid, x, y):
+    key = self.Key(x, y)
+    with self.lock:
+      old = self.where.get(pointid)
+      if old is not None and old != key:
+        self.Drop(pointid, old)
+      self.cells.setdefault(key, {})[pointid] = (x, y)
+      self.where[pointid] = key
+
+  def Remove(self, pointid):
+    with self.lock:
+      key = self.where.pop(pointid, None)
+      if key is not None:
+        self.Drop(pointid, key)
+
+  def Drop(self, pointid, key):
+    cell = self.cells[key]
+    del cell[pointid]
+    if len(cell) == 0:
+      del self.cells[key]
+
+  def Position(self, pointid):
+    with self.lock:
+      key = self.where.get(pointid)
+      if key is None:
+        return None
+      return self.cells[key][pointid]
+
+  # Points within distance r of (x, y), as (dist, id, px, py) in no
+  # particular order
+  def Range(self, x, y, r):
+    x0, y0 = self.Key(x - r, y - r)
+    x1, y1 = self.Key(x + r, y + r)
+    found = []
+    with self.lock:
+      if (x1 - x0 + 1)*(y1 - y0 + 1) > len(self.cells):
+        # the query covers more cells than are occupied
+        cells = [(key, cell) for key, cell in self.cells.items()
+                 if x0 <= key[0] <= x1 and y0 <= key[1] <= y1]
+      else:
+        cells = [(key, self.cells[key]) for key in
+                 ((cx, cy) for cx in range(x0, x1 + 1) for cy in range(y0, y1 + 1))
+                 if key in self.cells]
+      for key, cell in cells:
+        for pointid, (px, py) in cell.items():
+          dist = math.hypot(px - x, py - y)
+          if dist <= r:
+            found.append((dist, pointid, px, py))
+    return found
+
+  # Up to k points nearest to (x, y), closer than maxdist and passing
+  # accept(id, px, py), as (dist, id) sorted by distance then id
+  # Cells are visited in rings around the query cell; a point outside
+  # ring n is at least n cells away, which ends the search
+  def Nearest(self, x, y, k=1, maxdist=math.inf, accept=None):
+    cx, cy = self.Key(x, y)
+    best = []
+    with self.lock:
+      if len(self.cells) == 0:
+        return best
+      if maxdist < math.inf:
+        reach = int(maxdist // self.cell) + 1
+      else:
+        reach = max(max(abs(key[0] - cx), abs(key[1] - cy)) for key in self.cells)
+      for ring in range(reach + 1):
+        if ring > 0:
+          bound = (ring - 1)*self.cell
+          if bound >= maxdist or (len(best) >= k and best[k-1][0] <= bound):
+            break
+        for key in self.Ring(cx, cy, ring):
+          for pointid, (px, py) in self.cells.get(key, {}).items():
+            dist = math.hypot(px - x, py - y)
+            if dist < maxdist and (accept is None or accept(pointid, px, py)):
+              best.append((dist, pointid))
+        best.sort()
+        del best[k:]
+    return best
+
+  # Cell keys at Chebyshev distance ring from (cx, cy)
+  def Ring(self, cx, cy, ring):
+    if ring == 0:
+      return [(cx, cy)]
+    keys = []
+    for d in range(-ring, ring + 1):
+      keys.append((cx + d, cy - ring))
+      keys.append((cx + d, cy + ring))
+    for d in range(-ring + 1, ring):
+      keys.append((cx - ring, cy + d))
+      keys.append((cx + ring, cy + d))
+    return keys
+
+
+#---------------
+# Target positions indexed for local potential target queries
+# Which nodes are targets comes from the waypoint proxy and is only
+# asked again once older than ttl seconds; positions come from the
+# position snapshot as they change.
+#---------------
+class TargetIndex():
+  # getPotentialTargets with these limits lists every target
+  EVERYWHERE = 2**31 - 1
+
+  def __init__(self, positions, proxy, cell, ttl=1.0):
+    self.positions = positions
+    self.proxy = proxy
+    self.ttl = ttl
+    self.grid = SpatialGrid(cell)
+    self.ids = set()
+    self.discovered = None
+    self.discovering = threading.Lock()
+    positions.Watch(self.Moved)
+
+  # Position snapshot callback
+  def Moved(self, nodeid, x, y):
+    if nodeid in self.ids:
+      self.grid.Move(nodeid, x, y)
+
+  def Stale(self):
+    return self.discovered is None or time.monotonic() - self.discovered >= self.ttl
+
+  def BeginTick(self):
+    if self.Stale():
+      with self.discovering:
+        if self.Stale():
+          self.Discover()
+
+  # Ask the proxy which nodes are targets
+  def Discover(self):
+    ids = set(self.proxy.getPotentialTargets(self.EVERYWHERE, self.EVERYWHERE))
+    for nodeid in self.ids - ids:
+      self.grid.Remove(nodeid)
+    added = ids - self.ids
+    self.ids = ids
+    for nodeid in added:
+      node = self.positions.Node(nodeid)
+      self.grid.Move(nodeid, node.position.x, node.position.y)
+    self.discovered = time.monotonic()
+
+  # Targets inside the covered zone and within track_range of xy, by id
+  # (what the proxy's getPotentialTargets answers)
+  def PotentialTargets(self, xy, covered_zone, track_range):
+    return sorted(pointid for dist, pointid, px, py in self.grid.Range(xy[0], xy[1], track_range)
+                  if px <= covered_zone)
+
+  # Nearest of potential_targets closer than track_range, not excluded
+  # Returns (target id, distance) or (-1, inf)
+  def Nearest(self, xy, potential_targets, track_range, excluded=()):
+    potential = set(potential_targets)
+    best = self.grid.Nearest(xy[0], xy[1], 1, track_range,
+                             lambda pointid, px, py: pointid in potential and pointid not in excluded)
+    if len(best) == 0:
+      return -1, math.inf
+    dist, pointid = best[0]
+    return pointid, dist
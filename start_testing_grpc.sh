@@ -6,41 +6,30 @@
 coredir=$(ls /tmp | grep pycore)
 filedir="$( cd "$( dirname "${BASH_SOURCE[0]}" )" >/dev/null 2>&1 && pwd )"
 
-# Terminate tcpdump processes
-vcmd -c /tmp/$coredir/n1 -- killall tcpdump
-vcmd -c /tmp/$coredir/n2 -- killall tcpdump
-vcmd -c /tmp/$coredir/n3 -- killall tcpdump
-vcmd -c /tmp/$coredir/n4 -- killall tcpdump
-vcmd -c /tmp/$coredir/n6 -- killall tcpdump
-vcmd -c /tmp/$coredir/n7 -- killall tcpdump
-vcmd -c /tmp/$coredir/n8 -- killall tcpdump
-vcmd -c /tmp/$coredir/n9 -- killall tcpdump
+# UAV nodes to monitor (override with UAV_NODES="1 2 3 ...")
+nodes=${UAV_NODES:-"1 2 3 4 6 7 8 9"}
+# Advertisement port (the agents' --mcast-port). Adverts are matched by
+# port, not group: with --groups cells they go to the --cell-base groups
+port=${MCAST_PORT:-9100}
 
-# Set node MAC addresses
-export MAC_N1=`vcmd -c /tmp/$coredir/n1 -- cat /sys/class/net/eth0/address`
-export MAC_N2=`vcmd -c /tmp/$coredir/n2 -- cat /sys/class/net/eth0/address`
-export MAC_N3=`vcmd -c /tmp/$coredir/n3 -- cat /sys/class/net/eth0/address`
-export MAC_N4=`vcmd -c /tmp/$coredir/n4 -- cat /sys/class/net/eth0/address`
-export MAC_N6=`vcmd -c /tmp/$coredir/n6 -- cat /sys/class/net/eth0/address`
-export MAC_N7=`vcmd -c /tmp/$coredir/n7 -- cat /sys/class/net/eth0/address`
-export MAC_N8=`vcmd -c /tmp/$coredir/n8 -- cat /sys/class/net/eth0/address`
-export MAC_N9=`vcmd -c /tmp/$coredir/n9 -- cat /sys/class/net/eth0/address`
+# Terminate tcpdump processes
+for n in $nodes; do
+  vcmd -c /tmp/$coredir/n$n -- killall tcpdump
+done
 
-# Start monitoring messages at each node using tcpdump
-vcmd -c /tmp/$coredir/n1 -- tcpdump -i eth0 ether src $MAC_N1 and udp and dst 235.1.1.1 -lnex -x > /tmp/control_n1.dat 2>/dev/null 2>&1 &
-vcmd -c /tmp/$coredir/n2 -- tcpdump -i eth0 ether src $MAC_N2 and udp and dst 235.1.1.1 -lnex -x > /tmp/control_n2.dat 2>/dev/null 2>&1 &
-vcmd -c /tmp/$coredir/n3 -- tcpdump -i eth0 ether src $MAC_N3 and udp and dst 235.1.1.1 -lnex -x > /tmp/control_n3.dat 2>/dev/null 2>&1 &
-vcmd -c /tmp/$coredir/n4 -- tcpdump -i eth0 ether src $MAC_N4 and udp and dst 235.1.1.1 -lnex -x > /tmp/control_n4.dat 2>/dev/null 2>&1 &
-vcmd -c /tmp/$coredir/n6 -- tcpdump -i eth0 ether src $MAC_N6 and udp and dst 235.1.1.1 -lnex -x > /tmp/control_n6.dat 2>/dev/null 2>&1 &
-vcmd -c /tmp/$coredir/n7 -- tcpdump -i eth0 ether src $MAC_N7 and udp and dst 235.1.1.1 -lnex -x > /tmp/control_n7.dat 2>/dev/null 2>&1 &
-vcmd -c /tmp/$coredir/n8 -- tcpdump -i eth0 ether src $MAC_N8 and udp and dst 235.1.1.1 -lnex -x > /tmp/control_n8.dat 2>/dev/null 2>&1 &
-vcmd -c /tmp/$coredir/n9 -- tcpdump -i eth0 ether src $MAC_N9 and udp and dst 235.1.1.1 -lnex -x > /tmp/control_n9.dat 2>/dev/null 2>&1 &
+# Start monitoring messages sent by each node using tcpdump
+for n in $nodes; do
+  mac=`vcmd -c /tmp/$coredir/n$n -- cat /sys/class/net/eth0/address`
+  vcmd -c /tmp/$coredir/n$n -- tcpdump -i eth0 ether src $mac and udp dst port $port -lnex -x > /tmp/control_n$n.dat 2>/dev/null 2>&1 &
+done
 
 
 # Wait 10 seconds
 #sleep 100s
 
 # Begin testing simulation
+# The per-UAV decision breakdown needs the agents started with
+# --trace-to 172.16.0.254:9300 (test_uavs_grpc.py collects on port 9300)
 #python $filedir/test_uavs_grpc.py -u 1 2 3 4 6 7 8 9 -t 11 12 13 14 16 17 18 19 -l 6 2>/dev/null 2>&1 
 core-python $filedir/test_uavs_grpc.py $1 2>/dev/null 2>&1 
 
@@ -51,38 +40,13 @@ sleep 5s
 
 #END_COMMENT
 
-# Use trptr to obtain output files to plot
+# Per node and all nodes throughput from the captures
 echo "Plotting graphs for uav nodes..."
-
-trpr input /tmp/control_n1.dat auto X output /tmp/plot_n1.dat 2>/dev/null 2>&1 
-trpr input /tmp/control_n2.dat auto X output /tmp/plot_n2.dat 2>/dev/null 2>&1 
-trpr input /tmp/control_n3.dat auto X output /tmp/plot_n3.dat 2>/dev/null 2>&1 
-trpr input /tmp/control_n4.dat auto X output /tmp/plot_n4.dat 2>/dev/null 2>&1 
-trpr input /tmp/control_n6.dat auto X output /tmp/plot_n6.dat 2>/dev/null 2>&1 
-trpr input /tmp/control_n7.dat auto X output /tmp/plot_n7.dat 2>/dev/null 2>&1 
-trpr input /tmp/control_n8.dat auto X output /tmp/plot_n8.dat 2>/dev/null 2>&1 
-trpr input /tmp/control_n9.dat auto X output /tmp/plot_n9.dat 2>/dev/null 2>&1 
-
-# Uncomment if plots of each individual node are needed
-#gnuplot -persist /tmp/plot_n1.dat 2>/dev/null 2>&1 &
-#gnuplot -persist /tmp/plot_n2.dat 2>/dev/null 2>&1 &
-#gnuplot -persist /tmp/plot_n3.dat 2>/dev/null 2>&1 &
-#gnuplot -persist /tmp/plot_n4.dat 2>/dev/null 2>&1 &
-#gnuplot -persist /tmp/plot_n6.dat 2>/dev/null 2>&1 &
-#gnuplot -persist /tmp/plot_n7.dat 2>/dev/null 2>&1 &
-#gnuplot -persist /tmp/plot_n8.dat 2>/dev/null 2>&1 &
-#gnuplot -persist /tmp/plot_n9.dat 2>/dev/null 2>&1 &
-gnuplot -e "set terminal png; set output 'plot_n1.png'; load '/tmp/plot_n1.dat'"
-gnuplot -e "set terminal png; set output 'plot_n2.png'; load '/tmp/plot_n2.dat'"
-gnuplot -e "set terminal png; set output 'plot_n3.png'; load '/tmp/plot_n3.dat'"
-gnuplot -e "set terminal png; set output 'plot_n4.png'; load '/tmp/plot_n4.dat'"
-gnuplot -e "set terminal png; set output 'plot_n6.png'; load '/tmp/plot_n6.dat'"
-gnuplot -e "set terminal png; set output 'plot_n7.png'; load '/tmp/plot_n7.dat'"
-gnuplot -e "set terminal png; set output 'plot_n8.png'; load '/tmp/plot_n8.dat'"
-gnuplot -e "set terminal png; set output 'plot_n9.png'; load '/tmp/plot_n9.dat'"
-
-# Plot all UAV node throughput on one graph
-gnuplot plot_uavs.gp 
+captures=""
+for n in $nodes; do
+  captures="$captures /tmp/control_n$n.dat"
+done
+python3 $filedir/throughput_analyzer.py $captures -o /tmp/uavs_throughput.csv -p .
 eog uavs_throughput_plot.png &
 
 # Disown script to exit out in terminal
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+
+# Vectorized distance and nearest-target selection
+# Shared by the tracking agent and the test harness (ground truth)
+
+import numpy as np
+
+
+#---------------
+# Distances between every UAV and every target
+# uav_xy is (U, 2), target_xy is (T, 2); returns (U, T)
+#---------------
+def Distances(uav_xy, target_xy):
+  uav_xy = np.asarray(uav_xy, dtype=float).reshape(-1, 2)
+  target_xy = np.asarray(target_xy, dtype=float).reshape(-1, 2)
+  diff = uav_xy[:, np.newaxis, :] - target_xy[np.newaxis, :, :]
+  return np.hypot(diff[..., 0], diff[..., 1])
+
+#---------------
+# Nearest eligible target for every UAV in one pass
+# A target is eligible if it is strictly inside track_range, not in
+# excluded (ids claimed by other UAVs, seen targets) and, when given,
+# not set in claimed, a (U, T) mask of per-UAV exclusions.
+# Ties go to the first target in target_ids order.
+# Returns (picks, dists): target id or -1, and its distance or inf
+#---------------
+def NearestTargets(uav_xy, target_xy, target_ids, track_range, excluded=(), claimed=None):
+  ids = np.asarray(target_ids, dtype=np.int64).reshape(-1)
+  dist = Distances(uav_xy, target_xy)
+  nuavs = dist.shape[0]
+  if ids.size == 0:
+    return np.full(nuavs, -1, dtype=np.int64), np.full(nuavs, np.inf)
+
+  mask = dist < track_range
+  if len(excluded) > 0:
+    mask &= ~np.isin(ids, np.fromiter(excluded, dtype=np.int64))[np.newaxis, :]
+  if claimed is not None:
+    mask &= ~np.asarray(claimed, dtype=bool)
+
+  masked = np.where(mask, dist, np.inf)
+  best = np.argmin(masked, axis=1)
+  bestdist = masked[np.arange(nuavs), best]
+  found = np.isfinite(bestdist)
+  return np.where(found, ids[best], -1), bestdist
+
+#---------------
+# Nearest eligible target for a single UAV
+# Returns (target id, distance) or (-1, inf)
+#---------------
+def NearestTarget(uav_xy, target_xy, target_ids, track_range, excluded=()):
+  picks, dists = NearestTargets(uav_xy, target_xy, target_ids, track_range, excluded)
+  return int(picks[0]), float(dists[0])
+
+#---------------
+# Conflict-free ground truth assignment
+# Pairs are taken shortest first, the same rule the agents use to
+# settle contention: the closer UAV keeps the target.
+# Returns {uav id: target id} for every UAV that gets a target
+#---------------
+def GreedyAssignment(uav_xy, uav_ids, target_xy, target_ids, track_range):
+  uav_ids = list(uav_ids)
+  target_ids = list(target_ids)
+  assignment = {}
+  if len(uav_ids) == 0 or len(target_ids) == 0:
+    return assignment
+
+  dist = Distances(uav_xy, target_xy)
+  order = np.argsort(dist, axis=None, kind='stable')
+  rows, cols = np.unravel_index(order, dist.shape)
+  inrange = dist[rows, cols] < track_range
+  rows, cols = rows[inrange], cols[inrange]
+
+  takenuav = np.zeros(len(uav_ids), dtype=bool)
+  takentrg = np.zeros(len(target_ids), dtype=bool)
+  limit = min(len(uav_ids), len(target_ids))
+  for row, col in zip(rows.tolist(), cols.tolist()):
+    if takenuav[row] or takentrg[col]:
+      continue
+    takenuav[row] = True
+    takentrg[col] = True
+    assignment[uav_ids[row]] = target_ids[col]
+    if len(assignment) == limit:
+      break
+  return assignment
@@ -0,0 +1,62 @@
+# This module checks the pairwise target decision of track_target_grpc.py against a failed peer.
+# The notfoundsametrgnode fallback keeps an uncontended claim once the 8 UAV swarm has not seen it contended for
+# a while; evicting a crashed peer from the peer table must not turn that rule off.
+#
+#   python -m unittest test_decide_targets
+
+
+import unittest
+
+from peer_table import CORENode
+from position_table import TableNode
+from track_target_grpc import UAVAgent
+from waypoint_proxy import ProxyClient
+
+
+def NodeInfo(nodeid):
+    return TableNode(nodeid, 100.0, 100.0)
+
+
+class TestDecideTargets(unittest.TestCase):
+
+    # UAV 1 in a swarm of 8 tracking target 101, which no peer claims
+    # Proxy calls are deferred to the actions list and never made
+    def agent(self):
+        agent = UAVAgent(1, "udp", ProxyClient(), None)
+        for nodeid in range(2, 9):
+            agent.uavs.Add(CORENode(nodeid, 100 + nodeid, 10.0))
+        agent.uavs.mine.trackid = 101
+        agent.uavs.mine.oldtrackid = 101
+        return agent
+
+    # Keep target 101 in range for ticks ticks, then let it leave the range
+    def runFallback(self, agent, ticks=4):
+        for i in range(ticks):
+            agent.DecideTargets([101], 500, NodeInfo, [])
+        agent.DecideTargets([102], 500, NodeInfo, [])
+        return agent.uavs.mine.trackid
+
+    def testFallbackKeepsClaim(self):
+        self.assertEqual(self.runFallback(self.agent()), 101)
+
+    def testFallbackAfterEviction(self):
+        agent = self.agent()
+        agent.uavs.Evict(4)
+        agent.uavs.Evict(7)
+        self.assertEqual(len(agent.uavs), 6)
+        self.assertEqual(agent.uavs.Known(), 8)
+        self.assertEqual(self.runFallback(agent), 101)
+
+    def testEvictedPeerHeardAgainCountsOnce(self):
+        agent = self.agent()
+        agent.uavs.Evict(4)
+        agent.uavs.Update(4, 104, 10.0)
+        self.assertEqual(agent.uavs.Known(), 8)
+        self.assertEqual(self.runFallback(agent), 101)
+
+    def testNoFallbackWithoutHistory(self):
+        self.assertEqual(self.runFallback(self.agent(), ticks=1), -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+# This module checks the failure detector against the heartbeat intervals of the advertisement policies.
+# A live UAV backing off its heartbeats (trickle, adaptive ticks) must never be suspected, a crashed one must be
+# evicted within the bound, and peers heard only through relays must be evicted once their claims stop.
+#
+#   python -m unittest test_failure_detector
+
+
+import unittest
+from unittest import mock
+
+import tick_scheduler
+import trickle
+from failure_detector import FailureDetector
+from tick_scheduler import TickScheduler
+from track_target_grpc import ArgParser
+from trickle import TrickleTimer
+
+# The agent's default intervals (-i, --trickle-max, --max-interval), in seconds
+defaults = ArgParser().parse_args([])
+interval = float(defaults.interval)/1000
+trickle_max = float(defaults.trickle_max)/1000
+max_interval = float(defaults.max_interval)/1000
+trickle_k = defaults.trickle_k
+# simulated time step, finer than a tick
+step = interval/2
+
+
+class Clock():
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+# Heartbeat times of a UAV keeping one claim, with trickle advertisements
+def TrickleHeartbeats(duration):
+    clock = Clock()
+    with mock.patch.object(trickle, 'time', clock):
+        timer = TrickleTimer(interval, trickle_max, trickle_k, maxsuppressed=1)
+        beats = []
+        while clock.now < duration:
+            if timer.Due((1, 5)):
+                beats.append(clock.now)
+            clock.now += step
+    return beats
+
+
+# Heartbeat times of a UAV advertising every tick, with adaptive ticks: claims change for the first settle
+# seconds, then stay the same
+def AdaptiveHeartbeats(duration, settle=5):
+    clock = Clock()
+    with mock.patch.object(tick_scheduler, 'time', clock):
+        scheduler = TickScheduler(interval, True, max_interval)
+        beats = []
+        while clock.now < duration:
+            clock.now += scheduler.Delay()
+            scheduler.Start()
+            beats.append(clock.now)
+            scheduler.Done(unsettled=clock.now < settle)
+    return beats
+
+
+# Suspicions of a peer sending beats, checked every step as DetectFailures does once per tick
+def Suspicions(detector, beats, until):
+    suspected = []
+    now = beats[0]
+    pending = list(beats)
+    while now < until:
+        while pending and pending[0] <= now:
+            detector.Heartbeat(7, now=pending.pop(0))
+        suspected += [(nodeid, now) for nodeid, silence in detector.Suspects(now)]
+        now += step
+    return suspected
+
+
+class TestFailureDetector(unittest.TestCase):
+
+    # Detectors as Setup creates them for each policy
+    def trickleDetector(self):
+        return FailureDetector(0, max(3*max(max_interval, 2*trickle_max), 0.5))
+
+    def adaptiveDetector(self):
+        return FailureDetector(0, max(3*max_interval, 0.5))
+
+    def testTrickleBackoffIsNotAFailure(self):
+        beats = TrickleHeartbeats(30)
+        self.assertGreater(beats[-1] - beats[-2], trickle_max/2)
+        self.assertEqual(Suspicions(self.trickleDetector(), beats, 30), [])
+
+    def testAdaptiveBackoffIsNotAFailure(self):
+        beats = AdaptiveHeartbeats(30)
+        self.assertAlmostEqual(beats[-1] - beats[-2], max_interval)
+        self.assertEqual(Suspicions(self.adaptiveDetector(), beats, 30), [])
+
+    # What Setup avoids: phi learns the fast first intervals and takes the backoff for a failure
+    def testPhiMistakesBackoffForFailure(self):
+        for beats in (TrickleHeartbeats(30), AdaptiveHeartbeats(30)):
+            self.assertNotEqual(Suspicions(FailureDetector(8.0, 100.0), beats, 30), [])
+
+    def testCrashedPeerIsEvictedWithinBound(self):
+        for detector, beats in ((self.trickleDetector(), TrickleHeartbeats(30)),
+                                (self.adaptiveDetector(), AdaptiveHeartbeats(30))):
+            beats = [beat for beat in beats if beat < 20]
+            suspected = Suspicions(detector, beats, 40)
+            self.assertEqual(len(suspected), 1)
+            nodeid, when = suspected[0]
+            self.assertLessEqual(when - beats[-1], detector.bound + 2*step)
+
+    def testFixedIntervalUsesPhi(self):
+        detector = FailureDetector(8.0, 1.0)
+        beats = [i*interval for i in range(50)]
+        suspected = Suspicions(detector, beats, 10)
+        self.assertEqual(len(suspected), 1)
+        self.assertLess(suspected[0][1] - beats[-1], detector.bound)
+
+    def testRelayedPeerIsEvictedOnceClaimsStop(self):
+        detector = FailureDetector(8.0, 1.0)
+        for seq in range(10):
+            detector.Relayed(9, seq, now=0.5*seq)
+            # the same claim relayed again is no sign of life
+            detector.Relayed(9, seq, now=0.5*seq + 0.4)
+            self.assertEqual(detector.Suspects(0.5*seq + 0.45), [])
+        self.assertEqual(detector.Suspects(5.4), [])
+        self.assertEqual([nodeid for nodeid, silence in detector.Suspects(5.6)], [9])
+
+    # A relay newer than the last heartbeat leaves the peer to the bound alone
+    def testRelayAfterHeartbeatSkipsPhi(self):
+        detector = FailureDetector(8.0, 1.0)
+        for i in range(20):
+            detector.Heartbeat(7, seq=i, now=i*interval)
+        detector.Relayed(7, 20, now=2.0)
+        self.assertEqual(detector.Suspects(2.9), [])
+        self.assertEqual([nodeid for nodeid, silence in detector.Suspects(3.1)], [7])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,29 +11,51 @@ import subprocess
 import argparse
 import os
 import random
+import threading
+import concurrent.futures
 
 from core.api.grpc import client
 from core.api.grpc import core_pb2
 
+from latency_report import AppendResults, RunTag
+from decision_collector import Breakdown, DecisionCollector, FormatBreakdown
+
 color_of_targets = dict()
 uavs = dict()
 filepath = '/tmp/'
 iconpath = "/data/uas-core/icons/uav/"
 curpath = os.path.dirname(os.path.abspath(__file__)) 
 start_time = (0,0)
+# Agents send decision events here with --trace-to <harness address>:decisionport
+decisionport = 9300
+# Version of the code the results come from (latency_report.py --tag)
+run_tag = RunTag()
+# Sends the position edits of targets moved all at once
+movepool = concurrent.futures.ThreadPoolExecutor(max_workers=32)
 class TestCase():
 
-    def __init__(self, core, session_id, id, name, protocol="none"):
+    def __init__(self, core, session_id, id, name, protocol="none", events=True, collector=None):
         self.core = core
         self.session_id = session_id
         self.id = id
         self.name = name
         self.protocol = protocol
+        self.events = events
         self.starttime = None
         self.stoptime = None
         self.uav_target_pairs = dict()
+        self.assignment_times = dict()
         self.targets_to_move = []
         self.num_of_uavs = 0
+        self.num_of_targets = 0
+        self.icons = dict()
+        self.lock = threading.Lock()
+        self.matched = threading.Event()
+        self.landed = dict()
+        self.expired = False
+        self.collector = collector
+        self.decisions = None
+        self.stopwindow = None
 
     def setUavTargetPair(self, uav_id, target_id):
         if uav_id not in self.uav_target_pairs:
@@ -43,32 +65,61 @@ class TestCase():
             targets = self.uav_target_pairs[uav_id]
             self.uav_target_pairs[uav_id].append(target_id)
     
-    def updateUavTargetPairs(self, num_of_uavs, num_of_targets):
+    def updateUavTarget(self, uav_id, icon_file_path, ts):
+        # Get color from iconpath
+        start_index = len(iconpath)
+        stop_index = len("_plane.png")
+        color = icon_file_path[start_index:]
+        color = color[:-stop_index]
+
+        target_id = uavs[uav_id]
+        if color in color_of_targets:
+            new_target_id = color_of_targets[color]
+            if target_id != new_target_id: 
+                uavs[uav_id] = new_target_id
+                self.setUavTargetPair(uav_id, new_target_id)
+                self.assignment_times.setdefault(uav_id, []).append((ts, new_target_id))
+        else:
+            uavs[uav_id] = -1
+
+    def isMatched(self, num_of_uavs, num_of_targets):
         count = 0
         for uav_id,target_id in uavs.items(): 
-
-            response = self.core.get_node(self.session_id, uav_id)
-            node = response.node
-
-            # Get color from iconpath
-            icon_file_path = node.icon
-            start_index = len(iconpath)
-            stop_index = len("_plane.png")
-            color = icon_file_path[start_index:]
-            color = color[:-stop_index]
-
-            if color in color_of_targets:
-                new_target_id = color_of_targets[color]
-                if target_id != new_target_id: 
-                    uavs[uav_id] = new_target_id
-                    self.setUavTargetPair(uav_id, new_target_id)
-            else:
-                uavs[uav_id] = -1
-            
-            if uavs[uav_id] != -1: 
+            if target_id != -1: 
                 count += 1
         return count == num_of_uavs if num_of_uavs <= num_of_targets else count >= num_of_targets
 
+    def updateUavTargetPairs(self, num_of_uavs, num_of_targets):
+        for uav_id in list(uavs.keys()): 
+            response = self.core.get_node(self.session_id, uav_id)
+            self.updateUavTarget(uav_id, response.node.icon, time.time())
+        return self.isMatched(num_of_uavs, num_of_targets)
+
+    def handleNodeEvent(self, event):
+        # Timestamp uav icon changes pushed by CORE as they happen and
+        # stop the timer on the event that completes the matching
+        ts = time.time()
+        if not event.HasField("node_event"):
+            return
+        node = event.node_event.node
+        if node.id not in uavs or not node.icon:
+            return
+        with self.lock:
+            if self.matched.is_set() or self.icons.get(node.id) == node.icon:
+                return
+            self.icons[node.id] = node.icon
+            self.updateUavTarget(node.id, node.icon, ts)
+            if self.isMatched(self.num_of_uavs, self.num_of_targets):
+                self.stopTimer(ts)
+                self.matched.set()
+
+    def subscribeEvents(self):
+        try:
+            return self.core.events(self.session_id, self.handleNodeEvent, [core_pb2.EventType.NODE])
+        except Exception as error:
+            print("Node events unavailable (%s), polling instead" % error)
+            return None
+
     def startTimer(self): 
         ts = time.time()
         st = datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S.%f')
@@ -76,35 +127,52 @@ class TestCase():
         if self.id=="1a":
             start_time = self.starttime
 
-    def stopTimer(self):
-        ts = time.time()
+    def stopTimer(self, ts=None):
+        if ts is None:
+            ts = time.time()
         st = datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S.%f')
         self.stoptime = (ts,st)  
     
     def moveTargetsInRange(self, targets, timer=0, xuav=200, yuav=100):
         # Move targets within range of uavs	
-        i = 1
-        for target_id in targets:
-            response = self.core.get_node(self.session_id, target_id)
+        positions = dict()
+        for i, target_id in enumerate(targets, 1):
             if (i % 2) == 0:
-                pos = core_pb2.Position(x = xuav+200, y = yuav+(i/2-1)*150)
+                positions[target_id] = core_pb2.Position(x = xuav+200, y = yuav+(i/2-1)*150)
             else:
-                pos = core_pb2.Position(x = xuav, y = yuav+((i-1)/2)*150)
-            response = self.core.edit_node(self.session_id, target_id, position=pos)
-            i += 1
-            time.sleep(timer)
+                positions[target_id] = core_pb2.Position(x = xuav, y = yuav+((i-1)/2)*150)
+        self.landed = self.placeTargets(positions, timer)
     
     def moveTargetsOutRange(self, xuav=1300, yuav=100):
         # Move targets out of range of uavs
-        i = 1
-        for color, target_id in color_of_targets.items():
-            response = self.core.get_node(self.session_id, target_id)
+        positions = dict()
+        for i, target_id in enumerate(color_of_targets.values(), 1):
             if (i % 2) == 0:
-                pos = core_pb2.Position(x = xuav+100, y = yuav+(i/2-1)*150)
+                positions[target_id] = core_pb2.Position(x = xuav+100, y = yuav+(i/2-1)*150)
             else:
-                pos = core_pb2.Position(x = xuav, y = yuav+((i-1)/2)*150)
-            response = self.core.edit_node(self.session_id, target_id, position=pos)
-            i += 1
+                positions[target_id] = core_pb2.Position(x = xuav, y = yuav+((i-1)/2)*150)
+        self.placeTargets(positions)
+
+    def placeTargets(self, positions, timer=0):
+        # Edit target positions, one every timer seconds or all at once.
+        # All at once the edits are sent concurrently, so setup takes one
+        # round trip whatever the number of targets.
+        # Returns when each edit landed, by target id
+        landed = dict()
+        if timer > 0:
+            for target_id, pos in positions.items():
+                landed[target_id] = self.editPosition(target_id, pos)
+                time.sleep(timer)
+            return landed
+        futures = {target_id: movepool.submit(self.editPosition, target_id, pos)
+                   for target_id, pos in positions.items()}
+        for target_id, future in futures.items():
+            landed[target_id] = future.result()
+        return landed
+
+    def editPosition(self, target_id, pos):
+        self.core.edit_node(self.session_id, target_id, position=pos)
+        return time.time()
 
     def runTest(self, 
                 expired_time: int, 
@@ -123,24 +191,43 @@ class TestCase():
         """
         num_of_uavs = len(uavs)-len(uavs_to_crash)
         self.num_of_uavs = num_of_uavs
+        self.num_of_targets = len(targets_to_move)
         self.targets_to_move = targets_to_move
+        stream = self.subscribeEvents() if self.events else None
         self.startTimer()
         if len(uavs_to_crash) > 0: 
             self.crashUavs(uavs_to_crash)
         self.moveTargetsInRange(targets_to_move, time_between_targets)
 
-        while expired_time > 0: 
-            time.sleep(duration)
-            result = self.updateUavTargetPairs(num_of_uavs, len(targets_to_move))
-            if result: 
-                break
-            expired_time-= 1
-
-        if expired_time < 1: 
-            print("Time expired")
-
-        self.stopTimer()
+        if stream is not None:
+            # Uavs that changed before the stream caught up are picked up by one poll
+            with self.lock:
+                if not self.matched.is_set() and self.updateUavTargetPairs(num_of_uavs, len(targets_to_move)):
+                    self.stopTimer()
+                    self.matched.set()
+            if not self.matched.wait(expired_time * duration):
+                print("Time expired")
+                self.expired = True
+                self.stopTimer()
+            stream.cancel()
+        else:
+            while expired_time > 0: 
+                time.sleep(duration)
+                result = self.updateUavTargetPairs(num_of_uavs, len(targets_to_move))
+                if result: 
+                    break
+                expired_time-= 1
+
+            if expired_time < 1: 
+                print("Time expired")
+                self.expired = True
+
+            self.stopTimer()
         time.sleep(time_after_stop)
+        if self.collector is not None:
+            # Decisions of this test, before the targets are moved away
+            self.stopwindow = time.time()
+            self.decisions = Breakdown(self.collector.arrays(self.starttime[0], self.stopwindow), self.starttime[0])
         self.moveTargetsOutRange()
         self.formatTest()        
         if len(uavs_to_crash) > 0: 
@@ -183,41 +270,58 @@ class TestCase():
             return False
 
     
-    def formatTest(self):
+    def result(self):
+        # Outcome of the test as a dict of plain values (latency_report)
+        return {
+            'id': self.id,
+            'name': self.name,
+            'protocol': self.protocol,
+            'tag': run_tag,
+            'start': self.starttime[0],
+            'latency': self.stoptime[0] - self.starttime[0],
+            'expired': self.expired,
+            'unique': self.checkUnique(),
+            'uavs': self.num_of_uavs,
+            'targets': self.num_of_targets,
+            'landed': max(self.landed.values()) - self.starttime[0] if self.landed else None,
+            'pairs': {str(uav_id): targets for uav_id, targets in self.uav_target_pairs.items()},
+            'decisions': {str(uav_id): row for uav_id, row in self.decisions.items()} if self.decisions else None,
+        }
+
+    def reportLines(self):
+        lines = []
         check_unique = self.checkUnique()
         time_diff = self.stoptime[0] - self.starttime[0]
-        print("Latency:\t\t%0.4f seconds" % time_diff)
-        #print("    Start Time:\t%s" % self.starttime[1])
+        lines.append("Latency:\t\t%0.4f seconds" % time_diff)
         start_diff = self.starttime[0]-start_time[0]
-        print("    Start Time:\t\t%0.4f seconds" % start_diff)
-        #print("    Stop Time:\t%s" % self.stoptime[1])
+        lines.append("    Start Time:\t\t%0.4f seconds" % start_diff)
         stop_diff = self.stoptime[0]-start_time[0]
-        print("    Stop Time:\t\t%0.4f seconds" % stop_diff)
-        print("Uav-Target Pairs:\t%s" %  self.uav_target_pairs)
+        lines.append("    Stop Time:\t\t%0.4f seconds" % stop_diff)
+        if len(self.landed) > 0:
+            lines.append("    Targets Landed:\t%0.4f - %0.4f seconds" % (min(self.landed.values())-self.starttime[0],
+                                                                     max(self.landed.values())-self.starttime[0]))
+        lines.append("Uav-Target Pairs:\t%s" %  self.uav_target_pairs)
+        assigned = {uav_id: round(times[-1][0]-self.starttime[0], 4) for uav_id, times in self.assignment_times.items()}
+        lines.append("    Assigned At:\t%s" % assigned)
+        if self.decisions:
+            lines.append("Decisions:")
+            lines += FormatBreakdown(self.decisions)
         if check_unique: 
-            print("Result:\t\t\tTest Case PASSED. All uavs are tracking different targets.")
+            lines.append("Result:\t\t\tTest Case PASSED. All uavs are tracking different targets.")
         else: 
-            print("Result:\t\t\tTest Case FAILED. Some uavs are tracking the same targets.")
+            lines.append("Result:\t\t\tTest Case FAILED. Some uavs are tracking the same targets.")
+        return lines
+
+    def formatTest(self):
+        for line in self.reportLines():
+            print(line)
 
     def documentTest(self, fptr, test_id, test_name):
         fptr.write("\n---------Test %s - %s ---------\n" % (test_id, test_name))
-        check_unique = self.checkUnique()
-        time_diff = self.stoptime[0] - self.starttime[0]
-        fptr.write("Latency:\t\t%0.4f seconds\n" % time_diff)
-        #fptr.write("    Start Time:\t%s\n" % self.starttime[1])
-        #fptr.write("    Stop Time:\t%s\n" % self.stoptime[1])
-        start_diff = self.starttime[0]-start_time[0]
-        fptr.write("    Start Time:\t\t%0.4f seconds\n" % start_diff)
-        stop_diff = self.stoptime[0]-start_time[0]
-        fptr.write("    Stop Time:\t\t%0.4f seconds\n" % stop_diff)
-        fptr.write("Uav-Target Pairs:\t%s\n" %  self.uav_target_pairs)
-        if check_unique: 
-            fptr.write("Result:\t\t\tTest Case PASSED. All uavs are tracking different targets.\n\n")
-        else: 
-            fptr.write("Result:\t\t\tTest Case FAILED. Some uavs are tracking the same targets.\n\n")
-        return (1 if check_unique else 0)
+        fptr.write("\n".join(self.reportLines()) + "\n\n")
+        return (1 if self.checkUnique() else 0)
 
-def RecordTests(test_cases, file_name="latency.log"):
+def RecordTests(test_cases, file_name="latency.log", results_name="latency.jsonl"):
 
     numUnique = 0
 
@@ -233,6 +337,38 @@ def RecordTests(test_cases, file_name="latency.log"):
     fptr.write("\n\nNumber of times uav-target pairings had all unique targets:\t%s\n" % numUnique)
     fptr.write("Number of times uav-target pairings had duplicate targets:\t%s\n\n\n" % numDuplicate)
 
+    # Structured results, appended so runs accumulate for latency_report.py
+    AppendResults(curpath + '/' + results_name, [test.result() for test in test_cases])
+
+
+#---------------
+# The test scenarios as (id, name, targets to move, time between targets,
+# uavs to crash, time after stop). Shuffles and crashed uavs are drawn from rng.
+#---------------
+def Scenarios(uav_ids, target_ids, rng=random):
+    uav_ids = list(uav_ids)
+    target_ids = list(target_ids)
+    half = (len(uav_ids)-1)//2
+
+    def shuffled():
+        targets = list(target_ids)
+        rng.shuffle(targets)
+        return targets
+
+    return [
+        ("1a", "Move all targets within range - 2 second interval between", list(target_ids), 2, [], 0),
+        ("1b", "Move all targets within range - 2 second interval between - Out of Order", shuffled(), 2, [], 0),
+        ("2a", "Move 6 out of 8 targets within range - 2 second interval between", target_ids[:6], 2, [], 0),
+        ("2b", "Move 6 out of 8 targets within range - 2 second interval between - Out of Order", shuffled()[:6], 2, [], 0),
+        ("3a", "Move all targets within range", list(target_ids), 0, [], 2),
+        ("3b", "Move all targets within range - Out of Order", shuffled(), 0, [], 2),
+        ("4", "Crash 1 UAV and move all targets within range", shuffled(), 0, [rng.choice(uav_ids)], 5),
+        ("5", "Crash 2 UAV and move all targets within range", shuffled(), 0,
+         [uav_ids[rng.randint(0, half)], uav_ids[rng.randint(half+1, len(uav_ids)-1)]], 5),
+        ("6a", "Move 6 out of 8 targets within range", target_ids[:6], 0, [], 5),
+        ("6b", "Move 6 out of 8 targets within range - Out of Order", shuffled()[:6], 0, [], 5),
+    ]
+
 
 def main():
 
@@ -271,130 +407,27 @@ def main():
     ts = time.time()
     st = datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S.%f')
     start_time = (ts,st)
-# Test 1a - Move all targets within range - 2 second interval between
-    print("\n--------- Test 1a - Move all targets within range - 2 second interval between ------------")
-    # initialize variables 
-    uavs = {1:-1, 2:-1, 3:-1, 4:-1, 6:-1, 7:-1, 8:-1, 9:-1}    
-    # run test 
-    test1 = TestCase(core, session_id, "1a", "Move all targets within range - 2 second interval between", protocol) 
-    test1.runTest(time_expired, [11,12,13,14,16,17,18,19], duration, time_between_targets=2)
-    tests.append(test1)
-    time.sleep(5)
-
-# Test 1b - Move all targets within range - 2 second interval between - Out of Order
-    print("\n--------- Test 1b - Move all targets within range - 2 second interval between - Out of Order ------------")
-    # initialize variables 
-    uavs = {1:-1, 2:-1, 3:-1, 4:-1, 6:-1, 7:-1, 8:-1, 9:-1}  
-    shuffle_targets = [11,12,13,14,16,17,18,19]
-    random.shuffle(shuffle_targets)
-    # run test   
-    test1 = TestCase(core, session_id, "1b", "Move all targets within range - 2 second interval between - Out of Order", protocol) 
-    test1.runTest(time_expired, shuffle_targets, duration, time_between_targets=2)
-    tests.append(test1)
-    time.sleep(5)
-
-# Test 2a - Move 6 out of 8 targets within range - 2 second interval between
-    print("\n--------- Test 2a - Move 6 out of 8 targets within range - 2 second interval between ------------")
-    # initialize variables 
-    uavs = {1:-1, 2:-1, 3:-1, 4:-1, 6:-1, 7:-1, 8:-1, 9:-1} 
-    # run test      
-    test2 = TestCase(core, session_id, "2a", "Move 6 out of 8 targets within range - 2 second interval between", protocol)
-    test2.runTest(time_expired, [11,12,13,14,16,17], duration, time_between_targets=2)
-    tests.append(test2)
-    time.sleep(5)
-
-# Test 2b - Move 6 out of 8 targets within range - 2 second interval between
-    print("\n--------- Test 2b - Move 6 out of 8 targets within range - 2 second interval between - Out of Order ------------")
-    # initialize variables
-    uavs = {1:-1, 2:-1, 3:-1, 4:-1, 6:-1, 7:-1, 8:-1, 9:-1}    
-    shuffle_targets = [11,12,13,14,16,17,18,19]
-    random.shuffle(shuffle_targets)
-    # run test
-    test2 = TestCase(core, session_id, "2b", "Move 6 out of 8 targets within range - 2 second interval between - Out of Order", protocol)
-    test2.runTest(time_expired, shuffle_targets[:6], duration, time_between_targets=2)
-    tests.append(test2)
-    time.sleep(5)
-
-# Test 3a - Move all targets within range 
-    print("\n--------- Test 3a - Move all targets within range  ------------")
-    # initialize variables
-    uavs = {1:-1, 2:-1, 3:-1, 4:-1, 6:-1, 7:-1, 8:-1, 9:-1}    
-    # run test
-    test3 = TestCase(core, session_id, "3a" , "Move all targets within range", protocol)
-    test3.runTest(time_expired, [11,12,13,14,16,17,18,19], duration, time_after_stop=2)
-    tests.append(test3)
-    time.sleep(5)
-
-# Test 3b - Move all targets within range - Out of Order
-    print("\n--------- Test 3b - Move all targets within range - Out of Order ------------")
-    # initialize variables
-    uavs = {1:-1, 2:-1, 3:-1, 4:-1, 6:-1, 7:-1, 8:-1, 9:-1}  
-    shuffle_targets = [11,12,13,14,16,17,18,19]
-    random.shuffle(shuffle_targets)  
-    # run test
-    test3 = TestCase(core, session_id, "3b" , "Move all targets within range - Out of Order", protocol)
-    test3.runTest(time_expired, shuffle_targets, duration, time_after_stop=2)
-    tests.append(test3)
-    time.sleep(5)
-
-# Test 4 - Crash 1 UAV and move all targets within range 
-    print("\n--------- Test 4 - Crash 1 UAV and move all targets within range  ------------")
-    # initialize variables
-    uavs = {1:-1, 2:-1, 3:-1, 4:-1, 6:-1, 7:-1, 8:-1, 9:-1}    
-    list_of_uavs = list(uavs.keys())
-    index = random.randint(0,len(list_of_uavs)-1)
-    uavs_to_crash = []
-    uavs_to_crash.append(list_of_uavs[index])
-    shuffle_targets = [11,12,13,14,16,17,18,19]
-    random.shuffle(shuffle_targets)  
-    # run test
-    test4 = TestCase(core, session_id, "4", "Crash 1 UAV and move all targets within range", protocol)
-    test4.runTest(time_expired, shuffle_targets, duration, uavs_to_crash=uavs_to_crash, time_after_stop=5)
-    tests.append(test4)
-    time.sleep(5)
-
-# Test 5 - Crash 2 UAV and move all targets within range
-    print("\n--------- Test 5 - Crash 2 UAV and move all targets within range ------------")
-    # initialize variables
-    uavs = {1:-1, 2:-1, 3:-1, 4:-1, 6:-1, 7:-1, 8:-1, 9:-1}    
-    uavs_to_crash = []
-    list_of_uavs = list(uavs.keys())
-    index = random.randint(0,(len(list_of_uavs)-1)//2)
-    uavs_to_crash.append(list_of_uavs[index])
-    index = random.randint(((len(list_of_uavs)-1)//2)+1, len(list_of_uavs)-1)
-    uavs_to_crash.append(list_of_uavs[index])
-    shuffle_targets = [11,12,13,14,16,17,18,19]
-    random.shuffle(shuffle_targets) 
-    # run test 
-    test5 = TestCase(core, session_id, "5" , "Crash 2 UAV and move all targets within range", protocol)
-    test5.runTest(time_expired, shuffle_targets, duration, uavs_to_crash=uavs_to_crash, time_after_stop=5)
-    tests.append(test5)
-    time.sleep(5)
-
-# Test 6a - Move 6 out of 8 targets within range 
-    print("\n--------- Test 6a - Move 6 out of 8 targets within range  ------------")
-    # initialize variables
-    uavs = {1:-1, 2:-1, 3:-1, 4:-1, 6:-1, 7:-1, 8:-1, 9:-1}    
-    # run test
-    test6 = TestCase(core, session_id, "6a" , "Move 6 out of 8 targets within range", protocol)
-    test6.runTest(time_expired, [11,12,13,14,16,17], duration, time_after_stop=5)
-    tests.append(test6)
-    time.sleep(5)
-
-# Test 6b - Move 6 out of 8 targets within range - Out of Order
-    print("\n--------- Test 6b - Move 6 out of 8 targets within range - Out of Order ------------")
-    # initialize variables
-    uavs = {1:-1, 2:-1, 3:-1, 4:-1, 6:-1, 7:-1, 8:-1, 9:-1}  
-    shuffle_targets = [11,12,13,14,16,17,18,19]
-    random.shuffle(shuffle_targets)  
-    # run test
-    test6 = TestCase(core, session_id, "6b" , "Move 6 out of 8 targets within range - Out of Order", protocol)
-    test6.runTest(time_expired, shuffle_targets[:6], duration, time_after_stop=5)
-    tests.append(test6)
-    time.sleep(5)
+    uav_ids = list(uavs.keys())
+    target_ids = list(color_of_targets.values())
+    collector = DecisionCollector(decisionport)
+    for test_id, name, targets, timer, uavs_to_crash, after in Scenarios(uav_ids, target_ids):
+        print("\n--------- Test %s - %s ------------" % (test_id, name))
+        # initialize variables
+        uavs = {uav_id: -1 for uav_id in uav_ids}
+        # run test
+        test = TestCase(core, session_id, test_id, name, protocol, collector=collector)
+        test.runTest(time_expired, targets, duration, time_between_targets=timer,
+                     uavs_to_crash=uavs_to_crash, time_after_stop=after)
+        tests.append(test)
+        time.sleep(5)
 
 # Write test to file
     RecordTests(tests)
+    # Every decision event of the run, as columns
+    if len(collector.arrays()['time']) == 0:
+        print("No decision events: start the agents with --trace-to <this host>:%d" % decisionport)
+    collector.write(curpath + '/decisions.npz')
+    collector.close()
 
 
 if __name__ == '__main__':
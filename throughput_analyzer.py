@@ -0,0 +1,241 @@
+# This module computes advertisement throughput from the per-node packet captures taken by start_testing_grpc.sh.
+# Captures are "tcpdump -lnex -x" text dumps (/tmp/control_n*.dat) or pcap files. They are found automatically, read
+# as streams and merged by time, so per-node and aggregate throughput and packet rate come out of one pass
+# with memory bounded by the number of nodes, whatever the length of the captures.
+
+
+import argparse
+import csv
+import glob
+import heapq
+import os
+import re
+import struct
+import sys
+
+header_re = re.compile(r'^(\d+):(\d+):(\d+(?:\.\d+)?)\s|^(\d+\.\d+)\s')
+length_re = re.compile(r'length (\d+)')
+node_re = re.compile(r'control_(\w+)\.dat$')
+
+
+#---------------
+# Packets of a tcpdump text dump as (seconds, frame length)
+# Hex dump lines are skipped. With -e the first "length" on a header
+# line is the frame length. Time of day stamps that wrap at midnight
+# keep increasing.
+#---------------
+def TcpdumpPackets(lines):
+    day = 0.0
+    last = None
+    for line in lines:
+        if line[:1].isspace():
+            continue
+        match = header_re.match(line)
+        if match is None:
+            continue
+        length = length_re.search(line, match.end())
+        if length is None:
+            continue
+        if match.group(4) is not None:
+            secs = float(match.group(4))
+        else:
+            secs = int(match.group(1))*3600 + int(match.group(2))*60 + float(match.group(3)) + day
+            if last is not None and secs < last - 43200:
+                day += 86400
+                secs += 86400
+        last = secs
+        yield secs, int(length.group(1))
+
+
+#---------------
+# Packets of a pcap file as (seconds, original length)
+#---------------
+def PcapPackets(fptr):
+    header = fptr.read(24)
+    if len(header) < 24:
+        return
+    for order in ('<', '>'):
+        magic = struct.unpack(order + 'I', header[:4])[0]
+        if magic in (0xa1b2c3d4, 0xa1b23c4d):
+            break
+    else:
+        raise ValueError("not a pcap file (pcapng is not supported)")
+    scale = 1e-6 if magic == 0xa1b2c3d4 else 1e-9
+    record = struct.Struct(order + 'IIII')
+    while True:
+        buf = fptr.read(record.size)
+        if len(buf) < record.size:
+            return
+        tssec, tsfrac, inclen, origlen = record.unpack(buf)
+        fptr.seek(inclen, os.SEEK_CUR)
+        yield tssec + tsfrac*scale, origlen
+
+
+#---------------
+# Capture files in paths (files or directories) as {node name: path}
+#---------------
+def DiscoverCaptures(paths):
+    captures = {}
+    for path in paths:
+        if os.path.isdir(path):
+            files = glob.glob(os.path.join(path, 'control_*.dat')) + glob.glob(os.path.join(path, '*.pcap'))
+        else:
+            files = [path]
+        for file_name in files:
+            match = node_re.search(os.path.basename(file_name))
+            name = match.group(1) if match else os.path.splitext(os.path.basename(file_name))[0]
+            captures[name] = file_name
+    return captures
+
+
+#---------------
+# Packets of one capture file, tagged with the node name
+#---------------
+def NodePackets(name, file_name):
+    if file_name.endswith('.pcap'):
+        with open(file_name, 'rb') as fptr:
+            for secs, length in PcapPackets(fptr):
+                yield secs, name, length
+    else:
+        with open(file_name, errors='replace') as fptr:
+            for secs, length in TcpdumpPackets(fptr):
+                yield secs, name, length
+
+
+#---------------
+# Throughput time series of every node and of all nodes together
+# Yields (window start relative to the first packet, node, kbps,
+# packets/s) per window, nodes first then 'all', windows in order.
+# Windows without packets are reported as zero.
+#---------------
+def Throughput(captures, window=1.0):
+    names = sorted(captures)
+    stream = heapq.merge(*[NodePackets(name, captures[name]) for name in names])
+    start = None
+    current = None
+    counts = {}
+    for secs, name, length in stream:
+        if start is None:
+            start = secs
+            current = 0
+        index = int((secs - start) // window)
+        while index > current:
+            yield from WindowRows(current*window, names, counts, window)
+            counts = {}
+            current += 1
+        nbytes, npackets = counts.get(name, (0, 0))
+        counts[name] = (nbytes + length, npackets + 1)
+    if current is not None:
+        yield from WindowRows(current*window, names, counts, window)
+
+
+def WindowRows(time, names, counts, window):
+    totalbytes = 0
+    totalpackets = 0
+    for name in names:
+        nbytes, npackets = counts.get(name, (0, 0))
+        totalbytes += nbytes
+        totalpackets += npackets
+        yield time, name, nbytes*8/1000/window, npackets/window
+    yield time, 'all', totalbytes*8/1000/window, totalpackets/window
+
+
+#---------------
+# Series kept for plotting, at most maxpoints points
+# When full, neighbouring points are averaged in pairs and later points
+# are averaged over twice as many windows.
+#---------------
+class Decimator():
+
+    def __init__(self, maxpoints=2000):
+        self.maxpoints = maxpoints
+        self.points = []
+        self.stride = 1
+        self.pending = []
+
+    def add(self, point):
+        self.pending.append(point)
+        if len(self.pending) < self.stride:
+            return
+        self.points.append(tuple(sum(values)/len(values) for values in zip(*self.pending)))
+        self.pending = []
+        if len(self.points) >= self.maxpoints:
+            self.points = [tuple((a + b)/2 for a, b in zip(p, q))
+                           for p, q in zip(self.points[0::2], self.points[1::2])]
+            self.stride *= 2
+
+
+#---------------
+# Per-node plots (plot_<node>.png) and all nodes on one plot
+#---------------
+def PlotSeries(series, output_dir, all_plot):
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("matplotlib is not available, no plots", file=sys.stderr)
+        return
+
+    fig, ax = plt.subplots(figsize=(10, 5))
+    for name, decimator in sorted(series.items()):
+        if len(decimator.points) == 0:
+            continue
+        times, kbps, pps = zip(*decimator.points)
+        if name != 'all':
+            ax.plot(times, kbps, label=name)
+            nodefig, nodeax = plt.subplots(figsize=(10, 5))
+            nodeax.plot(times, kbps)
+            nodeax.set_xlabel('Time (sec)')
+            nodeax.set_ylabel('Rate (kbps)')
+            nodeax.set_title('Throughput %s' % name)
+            nodefig.savefig(os.path.join(output_dir, 'plot_%s.png' % name))
+            plt.close(nodefig)
+    ax.set_xlabel('Time (sec)')
+    ax.set_ylabel('Rate (kbps)')
+    ax.set_title('UAV advertisement throughput')
+    ax.legend()
+    fig.savefig(os.path.join(output_dir, all_plot))
+    plt.close(fig)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('captures', nargs='*', default=['/tmp'],
+                        help='Capture files, or directories with control_*.dat / *.pcap files')
+    parser.add_argument('-w', '--window', dest='window', type=float, default=1.0,
+                        help='Averaging window (seconds)')
+    parser.add_argument('-o', '--output', dest='output', type=str, default='-',
+                        help='CSV time series output file, - for stdout')
+    parser.add_argument('-p', '--plot', dest='plot', type=str, default=None,
+                        help='Directory to write plot_<node>.png and the all nodes plot to')
+    parser.add_argument('--all-plot', dest='all_plot', type=str, default='uavs_throughput_plot.png',
+                        help='File name of the all nodes plot')
+    parser.add_argument('--max-points', dest='max_points', type=int, default=2000,
+                        help='Most points per plotted series')
+    args = parser.parse_args()
+
+    captures = DiscoverCaptures(args.captures)
+    if len(captures) == 0:
+        print("No captures found in %s" % ' '.join(args.captures), file=sys.stderr)
+        sys.exit(1)
+
+    fptr = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    writer = csv.writer(fptr)
+    writer.writerow(['time', 'node', 'kbps', 'pps'])
+    series = {}
+    for time, name, kbps, pps in Throughput(captures, args.window):
+        writer.writerow([time, name, '%.3f' % kbps, '%.3f' % pps])
+        if args.plot is not None:
+            if name not in series:
+                series[name] = Decimator(args.max_points)
+            series[name].add((time, kbps, pps))
+    if fptr is not sys.stdout:
+        fptr.close()
+
+    if args.plot is not None:
+        PlotSeries(series, args.plot, args.all_plot)
+
+
+if __name__ == '__main__':
+    main()
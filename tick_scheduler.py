@@ -0,0 +1,99 @@
+#!/usr/bin/python
+
+# Deadline-based tick scheduler for the tracking loop
+
+import threading
+import time
+
+from metrics import log, metrics
+
+
+#---------------
+# Ticks are scheduled against deadlines (previous deadline + period),
+# so the time a tick takes does not add to the period and it does not
+# drift. A tick that ends past the next deadline counts as a missed
+# deadline and the next tick starts right away.
+#
+# In adaptive mode the period is the minimum interval while the
+# assignment is unsettled and grows by backoff after every
+# stable_ticks settled ticks, up to max_interval. Poke() (a contended
+# claim arrived) drops back to the minimum interval and wakes the loop.
+# Poke() runs on the receive thread, the rest on the tick loop; a lock
+# keeps the period and deadline consistent between them.
+#---------------
+class TickScheduler():
+  def __init__(self, interval, adaptive=False, max_interval=None, backoff=2.0, stable_ticks=3):
+    self.min_interval = interval
+    self.max_interval = max(max_interval or interval, interval)
+    self.adaptive = adaptive
+    self.backoff = backoff
+    self.stable_ticks = stable_ticks
+    self.period = interval
+    self.deadline = time.monotonic() + interval
+    self.lasttick = None
+    self.actual = interval
+    self.ticks = 0
+    self.missed = 0
+    self.stable = 0
+    self.wakeup = threading.Event()
+    self.lock = threading.RLock()
+
+  # Seconds left until the next tick is due
+  def Delay(self):
+    with self.lock:
+      return max(0.0, self.deadline - time.monotonic())
+
+  # Block until the next tick is due or Poke() is called
+  def Wait(self):
+    if self.wakeup.wait(self.Delay()):
+      self.wakeup.clear()
+    self.Start()
+
+  # A tick starts; measure the actual period (moving average)
+  def Start(self):
+    with self.lock:
+      now = time.monotonic()
+      if now < self.deadline:
+        # woken early, the schedule continues from now
+        self.deadline = now
+      if self.lasttick is not None:
+        self.actual += 0.2*((now - self.lasttick) - self.actual)
+      self.lasttick = now
+      self.ticks += 1
+
+  # Go back to the minimum interval
+  def Fast(self):
+    with self.lock:
+      self.stable = 0
+      if self.period != self.min_interval:
+        self.period = self.min_interval
+        self.deadline = min(self.deadline, time.monotonic() + self.period)
+
+  def Poke(self):
+    if self.adaptive:
+      self.Fast()
+      self.wakeup.set()
+
+  # A tick finished; unsettled says claims changed or a conflict is open
+  def Done(self, unsettled=True):
+    with self.lock:
+      if self.adaptive:
+        if unsettled:
+          self.Fast()
+        else:
+          self.stable += 1
+          if self.stable >= self.stable_ticks and self.period < self.max_interval:
+            self.stable = 0
+            self.period = min(self.period*self.backoff, self.max_interval)
+            log.Info("Tick period %0.4f s (actual %0.4f s, %d missed deadlines)", self.period, self.actual, self.missed)
+
+      self.deadline += self.period
+      now = time.monotonic()
+      if self.deadline < now:
+        self.missed += 1
+        metrics.Count('missed_deadlines')
+        self.deadline = now
+
+  def Stats(self):
+    with self.lock:
+      return {'period': self.period, 'actual': self.actual, 'ticks': self.ticks, 'missed': self.missed}
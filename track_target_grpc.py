@@ -12,95 +12,158 @@ import glob
 import subprocess
 import threading
 import datetime
+import asyncio
 
 from core.api.grpc import client
 from core.api.grpc import core_pb2
-import xmlrpc.client
 
-uavs = []
-seentargets = []
-mynodeseq = 0
-nodecnt = 0
-protocol = 'none'
+from peer_table import CORENode, PeerTable
+from position_snapshot import PositionSnapshot
+from position_table import SharedPositions
+from target_selection import NearestTarget
+from spatial_index import TargetIndex
+from auction import AuctionRounds, Bid, Winners
+from waypoint_proxy import ProxyClient
+from tick_scheduler import TickScheduler
+from trickle import TrickleTimer
+from failure_detector import FailureDetector
+from advert_wire import HEADER, RECORD, NextSeq, Pack, RecordCount, Stamp
+from metrics import clock, log, metrics
+from input_log import InputRecorder
+from intercept import InterceptPlanner
+from geo_cells import IP_MULTICAST_ALL, CellGrid, CellSize, Memberships
+from decision_trace import CLAIM, FALLBACK, KEEP, RECEIVED, REDEPLOY, SENT, YIELD, decisions
+
+commsprotocols = ('udp', 'auction')
 mcastaddr = '235.1.1.1'
 port = 9100
 ttl = 64
-core = None
-session_id = None 
-notfoundsametrgnode = 0
 filepath = '/tmp'
 nodepath = ''
 
-thrdlock = threading.Lock()
-xmlproxy = xmlrpc.client.ServerProxy("http://localhost:8000", allow_none=True)
 
-
-#---------------
-# Define a CORE node
-#---------------
-class CORENode():
-  def __init__(self, nodeid, track_nodeid, track_dist):
-    self.nodeid = nodeid
-    self.trackid = track_nodeid
-    self.oldtrackid = track_nodeid
-    self.trackdist = track_dist
-
-  def __repr__(self):
-    return str(self.nodeid) + " " + str(self.oldtrackid) + " " + str(self.trackdist)
-    
-    
 #---------------
 # Thread that receives UDP Advertisements
 #---------------
-class ReceiveUDPThread(threading.Thread):    
-  def __init__(self):
+class ReceiveUDPThread(threading.Thread):
+  def __init__(self, agent, sk):
     threading.Thread.__init__(self)
-    
+    self.agent = agent
+    self.sk = sk
+
   def run(self):
-    ReceiveUDP()
-      
+    ReceiveUDP(self.agent, self.sk)
+
 
 #---------------
 # Calculate the distance between two modes (on a map)
 #---------------
 def Distance(node1, node2):
-  return math.sqrt(math.pow(node2.position.y-node1.position.y, 2) + math.pow(node2.position.x-node1.position.x, 2))
+  return math.hypot(node2.position.x-node1.position.x, node2.position.y-node1.position.y)
 
 #---------------
-# Redeploy a UAV back to its original position
+# Run a proxy/comms action now, or queue it when the caller
+# wants the blocking calls made somewhere else (asyncio engine)
 #---------------
-def RedeployUAV(uavnode):
-  print("Redeploy UAV")
-  position = xmlproxy.getOriginalWypt()
-  xmlproxy.setWypt(position[0], position[1])
+def Defer(actions, func, *args):
+  if actions is None:
+    func(*args)
+  else:
+    actions.append((func, args))
 
 #---------------
-# Record target tracked to the proxy 
-# Update UAV color depending if it is tracking a target
+# Run queued actions in order
 #---------------
-def RecordTarget(uavnode):
-  print("RecordTarget")
-  xmlproxy.setTarget(uavnode.trackid)
+def RunActions(actions):
+  for func, args in actions:
+    func(*args)
 
 
 #---------------
-# Advertise the target being tracked over UDP
+# Long-lived multicast advertiser
+# Owns one configured socket for the lifetime of the agent and
+# piggybacks the freshest claims heard from other UAVs onto every
+# advertisement so claims spread across the swarm in fewer rounds.
+# Advertisements use the advert_wire binary format; the first record
+# is always the sender's own claim.
+# With a TrickleTimer only changed claims and heartbeats are sent.
+# Agents hosted in one process pass the send socket they share (sk).
 #---------------
-def AdvertiseUDP(uavnodeid, trgtnodeid, trgnodedist):
-  print("AdvertiseUDP")
-  addrinfo = socket.getaddrinfo(mcastaddr, None)[0]
+class UDPAdvertiser():
+  def __init__(self, group, port, ttl, maxclaims=8, maxage=1.0, interface=None, trickle=None, sk=None):
+    addrinfo = socket.getaddrinfo(group, None)[0]
+    self.dest = (addrinfo[4][0], port)
+    self.owned = sk is None
+    if sk is None:
+      sk = OpenSendSocket(group, ttl, interface)
+    self.sk = sk
+    self.maxclaims = maxclaims
+    self.maxage = maxage
+    self.trickle = trickle
+    # Peers tell a restarted agent's new sequence by its newer timestamps
+    self.seq = 0
+    # nodeid -> (trackid, trackdist, seq, stamp, time heard)
+    self.heard = {}
+    self.lock = threading.Lock()
+
+  # Remember a claim heard directly from its owner
+  # Only direct claims are relayed so a stale relayed claim cannot
+  # keep circulating after its owner has moved on
+  def Hear(self, uavnodeid, trgtnodeid, trgnodedist, seq, stamp):
+    with self.lock:
+      self.heard[uavnodeid] = (trgtnodeid, trgnodedist, seq, stamp, time.monotonic())
+
+  # Stop relaying the claim of a failed UAV
+  def Forget(self, uavnodeid):
+    with self.lock:
+      self.heard.pop(uavnodeid, None)
+
+  # Build the piggybacked records, freshest first
+  def Relayed(self, uavnodeid):
+    now = time.monotonic()
+    with self.lock:
+      claims = [(heardtime, (nodeid, trackid, trackdist, seq, stamp))
+                for nodeid, (trackid, trackdist, seq, stamp, heardtime) in self.heard.items()
+                if nodeid != uavnodeid and now - heardtime <= self.maxage]
+    claims.sort(reverse=True)
+    return [record for heardtime, record in claims[:self.maxclaims]]
+
+  def Advertise(self, uavnodeid, trgtnodeid, trgnodedist):
+    self.seq = NextSeq(self.seq)
+    records = [(uavnodeid, trgtnodeid, trgnodedist, self.seq, Stamp(time.time()))]
+    records += self.Relayed(uavnodeid)
+    self.sk.sendto(Pack(records), self.dest)
+
+  def close(self):
+    if self.owned:
+      self.sk.close()
+
+#---------------
+# Open a socket advertisements to group are sent from
+#---------------
+def OpenSendSocket(group, ttl, interface=None):
+  addrinfo = socket.getaddrinfo(group, None)[0]
   sk = socket.socket(addrinfo[0], socket.SOCK_DGRAM)
   ttl_bin = struct.pack('@i', ttl)
   sk.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl_bin)
-  buf = str(uavnodeid) + ' ' + str(trgtnodeid) + ' ' + str(trgnodedist)
-  sk.sendto(buf.encode(encoding='utf-8',errors='strict'), (addrinfo[4][0], port))
+  if interface is not None:
+    sk.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+  return sk
 
 #---------------
-# Receive and parse UDP advertisments
+# Open the multicast socket advertisements are received on
+# With group None no group is joined yet (cells: Memberships joins them)
 #---------------
-def ReceiveUDP():
-  #print("Receive UDP")
-  addrinfo = socket.getaddrinfo(mcastaddr, None)[0]
+def OpenReceiveSocket(group, port, interface=None):
+  if group is None:
+    sk = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sk.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if IP_MULTICAST_ALL is not None:
+      sk.setsockopt(socket.IPPROTO_IP, IP_MULTICAST_ALL, 0)
+    sk.bind(('', port))
+    return sk
+
+  addrinfo = socket.getaddrinfo(group, None)[0]
   sk = socket.socket(addrinfo[0], socket.SOCK_DGRAM)
   sk.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
@@ -109,200 +172,646 @@ def ReceiveUDP():
 
   # Join group
   group_bin = socket.inet_pton(addrinfo[0], addrinfo[4][0])
-  mreq = group_bin + struct.pack('=I', socket.INADDR_ANY)
+  if interface is not None:
+    mreq = group_bin + socket.inet_aton(interface)
+  else:
+    mreq = group_bin + struct.pack('=I', socket.INADDR_ANY)
   sk.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+  return sk
 
-  while 1:
-    buf, sender = sk.recvfrom(1500)
-    buf_str = buf.decode('utf-8')
-    uavidstr, trgtidstr, trgdistfloat = buf_str.split(" ")
-    uavnodeid, trgtnodeid, trgnodedist = int(uavidstr), int(trgtidstr), float(trgdistfloat)
-    # Update tracking info for other UAVs
-    uavnode = uavs[mynodeseq]
-
-    if uavnode.nodeid != uavnodeid:
-      UpdateTracking(uavnodeid, trgtnodeid, trgnodedist)
-  
 #---------------
-# Update tracking info based on a received advertisement
+# Records of the first nbytes of an advertisement datagram as
+# (index, uav, target, dist, seq, stamp); index 0 is the sender's claim
 #---------------
-def UpdateTracking(uavnodeid, trgtnodeid, track_dist):
-
-  if protocol == "udp":
-    thrdlock.acquire()
-    
-  # Update corresponding UAV node structure with tracking info
-  # if UAV node is in the UAV list
-  in_uavs = False
-  for uavnode in uavs:
-    if uavnode.nodeid == uavnodeid:
-      uavnode.trackid = trgtnodeid
-      uavnode.trackdist = track_dist
-      in_uavs = True
-
-  # Otherwise add UAV node to UAV list
-  if not in_uavs:
-    node = CORENode(uavnodeid, trgtnodeid, track_dist)
-    uavs.append(node)   
-      
-  if protocol == "udp":
-    thrdlock.release()
+def DecodeAdvertisement(buf, nbytes):
+  count = RecordCount(buf, nbytes)
+  metrics.Count('datagrams_received')
+  if count == 0:
+    metrics.Count('datagrams_dropped')
+  offset = HEADER.size
+  for i in range(count):
+    yield (i,) + RECORD.unpack_from(buf, offset)
+    offset += RECORD.size
 
 #---------------
-# Update waypoints for targets tracked, or track new targets
+# Receive and parse UDP advertisments
 #---------------
-def TrackTargets(covered_zone, track_range):
-  #print("Track Targets")
-  global notfoundsametrgnode
-  uavnode = uavs[mynodeseq]
-  uavnode.trackid = -1
-  updatewypt = 0
+def ReceiveUDP(agent, sk):
+  #print("Receive UDP")
+  buf = bytearray(65536)
 
-  commsflag = 0
-  if protocol == "udp":
-    commsflag = 1
+  while 1:
+    nbytes, sender = sk.recvfrom_into(buf)
+    if agent.recorder is not None:
+      agent.recorder.Advert(memoryview(buf)[:nbytes])
+    if agent.ApplyAdvertisement(DecodeAdvertisement(buf, nbytes)):
+      agent.scheduler.Poke()
+
+#---------------
+# asyncio datagram endpoint for UDP advertisements
+# One endpoint serves every agent of the process: a datagram is
+# decoded once and its claims applied to each agent as soon as it
+# arrives; a contended claim wakes that agent's tick loop instead of
+# waiting a full tick
+#---------------
+class AdvertProtocol(asyncio.DatagramProtocol):
+  def __init__(self, agents):
+    self.agents = agents
 
-  potential_targets = xmlproxy.getPotentialTargets(covered_zone, track_range)
+  def datagram_received(self, buf, sender):
+    records = list(DecodeAdvertisement(buf, len(buf)))
+    for agent in self.agents:
+      if agent.recorder is not None:
+        agent.recorder.Advert(buf)
+      if agent.ApplyAdvertisement(records):
+        agent.wakeup.set()
 
-  print("UAV nodes: ", uavs)
-  print("Potential Targets: ", potential_targets)
 
-  if len(potential_targets) == 0:
-    seentargets.clear()
-    uavnode.oldtrackid = -1
+#---------------
+# State of one UAV agent
+# A process runs one agent, or many in host mode; they share the core
+# client, position snapshot, target index and sockets, and each keeps
+# only its peer table, proxy client and timers.
+#---------------
+class UAVAgent():
+  __slots__ = ('uavs', 'seentargets', 'notfoundsametrgnode', 'protocol', 'xmlproxy', 'positions',
+               'targetindex', 'advertiser', 'auctionrounds', 'scheduler', 'claimage', 'detector',
+               'thrdlock', 'wakeup', 'recorder', 'interceptor', 'cells', 'cell', 'listening', 'memberships')
+
+  def __init__(self, uav_id, protocol, xmlproxy, positions, targetindex=None):
+    self.uavs = PeerTable()
+    self.seentargets = []
+    self.notfoundsametrgnode = 0
+    self.protocol = protocol
+    self.xmlproxy = xmlproxy
+    self.positions = positions
+    self.targetindex = targetindex
+    self.advertiser = None
+    self.auctionrounds = AuctionRounds()
+    self.scheduler = None
+    self.claimage = 0.0
+    self.detector = None
+    self.thrdlock = threading.Lock()
+    self.wakeup = None
+    # InputRecorder of the inputs decisions are made on
+    self.recorder = None
+    # InterceptPlanner leading moving targets, None to chase them
+    self.interceptor = None
+    # CellGrid of geographically scoped groups, the cell this UAV sends
+    # to, the cell it is in and the Memberships of its receive socket
+    self.cells = None
+    self.cell = None
+    self.listening = None
+    self.memberships = None
+    self.uavs.Add(CORENode(uav_id, -1, 0), mine=True)
+
+  #---------------
+  # Create the tick scheduler, advertiser and failure detector
+  # sendsk is the send socket shared by the agents of a host
+  #---------------
+  def Setup(self, args, sendsk=None):
+    msecinterval = float(args.interval)
+    secinterval = msecinterval/1000
+    self.scheduler = TickScheduler(secinterval, args.schedule == "adaptive", float(args.max_interval)/1000)
+    if args.schedule == "adaptive":
+      # Peers may back off to max_interval; keep their claims across it
+      self.claimage = 2*self.scheduler.max_interval
+
+    if args.intercept == "predict":
+      self.interceptor = InterceptPlanner(args.uav_speed, args.wypt_tolerance, args.alpha, args.beta)
+
+    if self.protocol in commsprotocols:
+      # Create the advertiser once; it keeps its socket for the whole run
+      # Relayed claims older than a few ticks are considered stale
+      trickle = None
+      relayage = max(3*secinterval, 0.5)
+      # Longest time between two advertisements of a live UAV
+      advertgap = self.scheduler.max_interval
+      if args.advertise == "trickle":
+        # With failure detection on, never suppress two heartbeats in a row
+        trickle = TrickleTimer(secinterval, float(args.trickle_max)/1000, args.trickle_k,
+                               maxsuppressed = None if args.fd_bound < 0 else 1)
+        # Claims are only refreshed by heartbeats; keep and relay them
+        # for two heartbeat intervals
+        self.claimage = max(self.claimage, 2*trickle.imax)
+        relayage = max(relayage, 2*trickle.imax)
+        advertgap = max(advertgap, 2*trickle.imax)
+      if args.fd_bound >= 0:
+        bound = float(args.fd_bound)/1000
+        if bound == 0:
+          bound = max(3*advertgap, 0.5)
+        # phi learns a fixed advertisement interval; a sender backing
+        # off would look failed, so only the bound applies then
+        phi = args.phi if trickle is None and args.schedule == "fixed" else 0
+        self.detector = FailureDetector(phi, bound)
+      self.advertiser = UDPAdvertiser(mcastaddr, port, ttl, args.gossip, relayage, args.mcast_if, trickle, sendsk)
+      if args.groups == "cells":
+        cellsize = args.cell_size if args.cell_size > 0 else CellSize(args.track_range)
+        self.cells = CellGrid(args.cell_base, args.covered_zone, cellsize)
+
+  #---------------
+  # Send the UAV back to its original waypoint, tracking nothing
+  #---------------
+  def Start(self):
+    node = self.uavs.mine
+    if self.recorder is not None:
+      self.recorder.Origin(self.xmlproxy.getOriginalWypt())
+    self.RedeployUAV(node)
+    self.RecordTarget(node.trackid)
+    self.xmlproxy.Flush()
+
+  #---------------
+  # Take the lock shared with the receive thread, timing the wait
+  #---------------
+  def AcquireLock(self):
+    start = clock()
+    self.thrdlock.acquire()
+    metrics.Observe('lock_wait', clock() - start)
+
+  #---------------
+  # Redeploy a UAV back to its original position
+  #---------------
+  def RedeployUAV(self, uavnode):
+    log.Debug("Redeploy UAV")
+    decisions.Emit(uavnode.nodeid, REDEPLOY)
+    position = self.xmlproxy.getOriginalWypt()
+    self.xmlproxy.setWypt(position[0], position[1])
+    if self.interceptor is not None:
+      self.interceptor.Reset()
+
+  #---------------
+  # Follow the UAV into another cell: listen to the neighbourhood of the
+  # cell it is in, and advertise to the new send cell's group
+  #---------------
+  def MoveCell(self, curnode):
+    x, y = curnode.position.x, curnode.position.y
+    here = self.cells.Cell(x, y)
+    if here != self.listening:
+      if self.memberships is not None:
+        old = self.cells.Neighbourhood(self.listening) if self.listening is not None else set()
+        self.memberships.Move(old, self.cells.Neighbourhood(here))
+      self.listening = here
+    cell = self.cells.Locate(self.cell, x, y)
+    if cell == self.cell:
+      return
+    self.advertiser.dest = (self.cells.Group(cell), port)
+    log.Info("UAV %d in cell %s, group %s", self.uavs.mine.nodeid, cell, self.advertiser.dest[0])
+    metrics.Count('cell_changes')
+    self.cell = cell
+
+  #---------------
+  # Send the UAV after a target: to its current position, or with an
+  # interceptor to where it meets the target, only when that moved
+  #---------------
+  def SetWaypoint(self, trgtnodeid, nodeinfo, actions=None):
+    node = nodeinfo(trgtnodeid)
+    x, y = node.position.x, node.position.y
+    if self.interceptor is not None:
+      curnode = nodeinfo(self.uavs.mine.nodeid)
+      wypt = self.interceptor.Waypoint(trgtnodeid, (curnode.position.x, curnode.position.y), (x, y))
+      if wypt is None:
+        metrics.Count('waypoints_held')
+        return
+      x, y = wypt
+    Defer(actions, self.xmlproxy.setWypt, int(x), int(y))
+
+  #---------------
+  # Record target tracked to the proxy
+  # Update UAV color depending if it is tracking a target
+  #---------------
+  def RecordTarget(self, trgtnodeid):
+    log.Debug("RecordTarget")
+    self.xmlproxy.setTarget(trgtnodeid)
+
+  #---------------
+  # Look up a node (position + icon) in this tick's position snapshot
+  #---------------
+  def NodeInfo(self, nodeid):
+    return self.positions.Node(nodeid)
+
+  #---------------
+  # Advertise the target being tracked over UDP
+  #---------------
+  def AdvertiseUDP(self, uavnodeid, trgtnodeid, trgnodedist):
+    advertiser = self.advertiser
+    if advertiser.trickle is not None and not advertiser.trickle.Due(trgtnodeid):
+      return
+    log.Debug("AdvertiseUDP")
+    start = clock()
+    advertiser.Advertise(uavnodeid, trgtnodeid, trgnodedist)
+    metrics.Observe('advertise', clock() - start)
+    metrics.Count('datagrams_sent')
+    decisions.Emit(uavnodeid, SENT, trgtnodeid, -1, trgnodedist)
+
+  #---------------
+  # Apply the decoded records of an advertisement; out of order claims
+  # are dropped
+  # Returns True if a claim contends with the target this UAV tracks
+  #---------------
+  def ApplyAdvertisement(self, records):
+    uavs = self.uavs
+    uavnode = uavs.mine
+    advertiser = self.advertiser
+    trickle = advertiser.trickle
+    contended = False
+    for i, uavnodeid, trgtnodeid, trgnodedist, seq, stamp in records:
+      # Update tracking info for other UAVs
+      if uavnode.nodeid != uavnodeid:
+        # a UAV we did not know yet should hear our claim soon
+        if trickle is not None and uavnodeid not in uavs:
+          trickle.Inconsistent()
+        if self.UpdateTracking(uavnodeid, trgtnodeid, trgnodedist, seq, stamp) is None:
+          metrics.Count('records_dropped')
+          continue
+        # first record is the sender's own claim
+        if i == 0:
+          advertiser.Hear(uavnodeid, trgtnodeid, trgnodedist, seq, stamp)
+          decisions.Emit(uavnode.nodeid, RECEIVED, trgtnodeid, uavnodeid, trgnodedist)
+          if self.detector is not None:
+            self.detector.Heartbeat(uavnodeid, seq)
+        elif self.detector is not None:
+          self.detector.Relayed(uavnodeid, seq)
+        if trgtnodeid > 0 and trgtnodeid == uavnode.oldtrackid:
+          contended = True
+      elif trickle is not None and trgtnodeid == uavnode.trackid:
+        # a peer relays our current claim: our heartbeat can be suppressed
+        trickle.Heard()
+    if contended and trickle is not None:
+      trickle.Inconsistent()
+    return contended
+
+  #---------------
+  # Update tracking info based on a received advertisement
+  # Returns the updated node, None if the claim arrived out of order
+  #---------------
+  def UpdateTracking(self, uavnodeid, trgtnodeid, track_dist, seq=None, stamp=None):
+
+    if self.protocol in commsprotocols:
+      self.AcquireLock()
+
+    # Update corresponding UAV node structure with tracking info
+    # or add UAV node to UAV table
+    node = self.uavs.Update(uavnodeid, trgtnodeid, track_dist, seq, stamp)
+
+    if self.protocol in commsprotocols:
+      self.thrdlock.release()
+
+    return node
+
+  #---------------
+  # Evict UAVs the failure detector suspects, releasing their targets
+  #---------------
+  def DetectFailures(self):
+    if self.detector is None:
+      return
+    for uavnodeid, silence in self.detector.Suspects():
+      if self.uavs.Evict(uavnodeid) is not None:
+        self.advertiser.Forget(uavnodeid)
+        metrics.Count('evictions')
+        metrics.Observe('detection', silence)
+        log.Info("Evicted UAV %d, silent for %0.3f s", uavnodeid, silence)
+
+  #---------------
+  # Is the assignment still settling after a tick? Peer claims changed,
+  # this UAV's claim changed, or another UAV claims the same target
+  #---------------
+  def Unsettled(self, lastclaim):
+    uavnode = self.uavs.mine
+    if self.uavs.TakeChanges() > 0 or uavnode.trackid != lastclaim:
+      return True
+    return uavnode.trackid > 0 and self.uavs.Contended(uavnode.trackid)
+
+  #---------------
+  # Targets inside the covered zone and in range of this UAV, from the
+  # proxy or answered locally by the target index
+  #---------------
+  def PotentialTargets(self, covered_zone, track_range):
+    if self.targetindex is None:
+      return self.xmlproxy.getPotentialTargets(covered_zone, track_range)
+    self.targetindex.BeginTick()
+    curnode = self.NodeInfo(self.uavs.mine.nodeid)
+    return self.targetindex.PotentialTargets((curnode.position.x, curnode.position.y), covered_zone, track_range)
+
+  #---------------
+  # Update waypoints for targets tracked, or track new targets
+  # Phases are timed: grpc (positions), xmlrpc (potential targets and
+  # the proxy writes), decision, and actions (advertise, redeploy)
+  #---------------
+  def TrackTargets(self, covered_zone, track_range):
+    #print("Track Targets")
+    start = clock()
+    self.positions.BeginTick()
+    mark = clock()
+    metrics.Observe('grpc', mark - start)
+    potential_targets = self.PotentialTargets(covered_zone, track_range)
+    xmlrpc = clock() - mark
+    if self.cells is not None:
+      self.MoveCell(self.NodeInfo(self.uavs.mine.nodeid))
+    if self.recorder is not None:
+      nodeids = [self.uavs.mine.nodeid] + list(potential_targets)
+      self.recorder.Tick(potential_targets, [self.NodeInfo(nodeid) for nodeid in nodeids])
+    self.DetectFailures()
+    mark = clock()
+    actions = []
+    if self.protocol == "auction":
+      self.DecideAuction(potential_targets, track_range, self.NodeInfo, actions)
+    else:
+      self.DecideTargets(potential_targets, track_range, self.NodeInfo, actions)
+    now = clock()
+    metrics.Observe('decision', now - mark)
+    mark = now
+    RunActions(actions)
+    now = clock()
+    metrics.Observe('actions', now - mark)
+    mark = now
+    # Send this tick's proxy writes in one batch
+    self.xmlproxy.Flush()
+    decisions.Flush()
+    now = clock()
+    metrics.Observe('xmlrpc', xmlrpc + now - mark)
+    metrics.Observe('tick', now - start)
+
+  #---------------
+  # Decide which target to track given the potential targets
+  # nodeinfo(nodeid) returns a node with a position
+  # Proxy and comms calls are made immediately, or queued on actions
+  #---------------
+  def DecideTargets(self, potential_targets, track_range, nodeinfo, actions=None):
+    uavs = self.uavs
+    seentargets = self.seentargets
+    uavnode = uavs.mine
     uavnode.trackid = -1
-    RecordTarget(uavnode)
-    notfoundsametrgnode = 0
-
-  # If the other UAVs have same target, compare distance
-  # If less, continue tracking and reset the other UAV to track new
-  if uavnode.oldtrackid > 0:
-    for uavnodetmp in uavs:
-      if uavnodetmp.nodeid != uavnode.nodeid:
-        if uavnodetmp.trackid == uavnode.oldtrackid:
-          notfoundsametrgnode = 0
-          seentargets.append(uavnode.oldtrackid)
-          # if the other node shorter than current node dist
-          if uavnodetmp.trackdist < uavnode.trackdist:
-            print("Same target detected node %d target %d" % (uavnodetmp.nodeid, uavnodetmp.trackid))
-            # current nod should track a new node
-            uavnode.trackid = -1
-            uavnode.oldtrackid = uavnode.trackid
-            RecordTarget(uavnode)
-            RedeployUAV(uavnode)
-            # Advertise this UAV searching new node
-            # if protocol == "udp":
-            #   AdvertiseUDP(uavnode.nodeid, uavnode.trackid, uavnode.trackdist)
-            break
-          else:
-            # the other uav need to reset
-            uavnodetmp.trackid = -1
+    updatewypt = 0
+
+    commsflag = 0
+    if self.protocol == "udp":
+      commsflag = 1
+
+    log.Debug("UAV nodes: %s", uavs)
+    log.Debug("Potential Targets: %s", potential_targets)
+    decisions.Seen(uavnode.nodeid, potential_targets)
+
+    if len(potential_targets) == 0:
+      seentargets.clear()
+      uavnode.oldtrackid = -1
+      uavnode.trackid = -1
+      Defer(actions, self.RecordTarget, uavnode.trackid)
+      self.notfoundsametrgnode = 0
+
+    # If the other UAVs have same target, compare distance
+    # If less, continue tracking and reset the other UAV to track new
+    # Swarm size as if no peer was evicted, as the rule below expects
+    swarmsize = uavs.Known()
+    if uavnode.oldtrackid > 0:
+      claimants = [uavnodetmp for uavnodetmp in uavs.Claimants(uavnode.oldtrackid)
+                   if uavnodetmp.nodeid != uavnode.nodeid]
+      if len(claimants) == 0:
+        self.notfoundsametrgnode += swarmsize - 1
+      for uavnodetmp in claimants:
+        self.notfoundsametrgnode = 0
+        seentargets.append(uavnode.oldtrackid)
+        # if the other node shorter than current node dist
+        if uavnodetmp.trackdist < uavnode.trackdist:
+          log.Info("Same target detected node %d target %d", uavnodetmp.nodeid, uavnodetmp.trackid)
+          decisions.Emit(uavnode.nodeid, YIELD, uavnode.oldtrackid, uavnodetmp.nodeid, uavnodetmp.trackdist)
+          # current nod should track a new node
+          uavnode.trackid = -1
+          uavnode.oldtrackid = uavnode.trackid
+          Defer(actions, self.RecordTarget, uavnode.trackid)
+          Defer(actions, self.RedeployUAV, uavnode)
+          # Advertise this UAV searching new node
+          # if protocol == "udp":
+          #   AdvertiseUDP(uavnode.nodeid, uavnode.trackid, uavnode.trackdist)
+          break
         else:
-          notfoundsametrgnode += 1
+          # the other uav need to reset
+          uavnodetmp.trackid = -1
 
 
-  # if target being tracked by only this node, update
-  if len(uavs) == 8 and notfoundsametrgnode > 25:
-    uavnode.trackid = uavnode.oldtrackid
-    RecordTarget(uavnode)
+    # if target being tracked by only this node, update
+    if swarmsize == 8 and self.notfoundsametrgnode > 25:
+      uavnode.trackid = uavnode.oldtrackid
+      decisions.Emit(uavnode.nodeid, FALLBACK, uavnode.trackid)
+      Defer(actions, self.RecordTarget, uavnode.trackid)
 
-  #closedistfromtrg = sys.maxsize
-  closedistfromtrg = track_range
-  for trgtnode_id in potential_targets:
     # If this UAV was tracking this target before and it's still
     # in range then it should keep it.
     # Update waypoint to the new position of the target
-    if uavnode.oldtrackid == trgtnode_id:
-         # Keep the current tracking; no need to change
-        # unless the track goes out of range
-        print('Keep the current tracking; no need to change ', trgtnode_id)
+    if uavnode.oldtrackid in potential_targets:
+      # Keep the current tracking; no need to change
+      # unless the track goes out of range
+      log.Debug("Keep the current tracking; no need to change %s", uavnode.oldtrackid)
+      uavnode.trackid = uavnode.oldtrackid
+      decisions.Emit(uavnode.nodeid, KEEP, uavnode.trackid, -1, uavnode.trackdist)
+      updatewypt = 1
+
+    # If this UAV was not tracking any target, track the closest one in
+    # range that was not seen contended and is not tracked by other nodes
+    if uavnode.oldtrackid == -1 and len(potential_targets) > 0:
+      excluded = set(seentargets)
+      if commsflag == 1: # udp
+        excluded |= uavs.TrackedTargets()
+      curnode = nodeinfo(uavnode.nodeid)
+      if self.targetindex is not None:
+        trgtnode_id, dist = self.targetindex.Nearest((curnode.position.x, curnode.position.y),
+                                                     potential_targets, track_range, excluded)
+      else:
+        target_xy = [(trgnode.position.x, trgnode.position.y)
+                     for trgnode in map(nodeinfo, potential_targets)]
+        trgtnode_id, dist = NearestTarget((curnode.position.x, curnode.position.y), target_xy,
+                                          potential_targets, track_range, excluded)
+      if trgtnode_id != -1:
+        log.Info("UAV node should track this target %s", trgtnode_id)
         uavnode.trackid = trgtnode_id
-        updatewypt = 1     
+        uavnode.trackdist = dist
+        decisions.Emit(uavnode.nodeid, CLAIM, trgtnode_id, -1, dist)
+        updatewypt = 1 # update way point
+
+    if updatewypt == 1:
+      # Update waypoint for UAV node
+      log.Debug("Update waypoint")
+      updatewypt = 0
+      self.SetWaypoint(uavnode.trackid, nodeinfo, actions)
+      # RecordTarget(uavnode)
+
+    # Advertise target being tracked if using comms
+    if self.protocol == "udp":
+      Defer(actions, self.AdvertiseUDP, uavnode.nodeid, uavnode.trackid, uavnode.trackdist)
+
+    # Reset current tracking info (0) for other UAVs if we're using comms
+    # which means allow commons (udp)
+    if commsflag == 1:
+      uavs.Age(self.claimage)
+
+    # Record the target tracked for displaying proper colors
+    # Re-deploy UAV if it's not track anything
+    if uavnode.trackid != uavnode.oldtrackid:
+      uavnode.oldtrackid = uavnode.trackid
+      # record new target if changed
+      # RecordTarget(uavnode)
+      if uavnode.trackid == -1:
+        Defer(actions, self.RedeployUAV, uavnode)
+
+  #---------------
+  # One auction round (protocol "auction")
+  # Replaces the pairwise resolver: an outbid UAV re-bids in the same
+  # round instead of redeploying and restarting its search
+  #---------------
+  def DecideAuction(self, potential_targets, track_range, nodeinfo, actions=None):
+    uavs = self.uavs
+    uavnode = uavs.mine
+
+    log.Debug("UAV nodes: %s", uavs)
+    log.Debug("Potential Targets: %s", potential_targets)
+
+    decisions.Seen(uavnode.nodeid, potential_targets)
+    curnode = nodeinfo(uavnode.nodeid)
+    target_xy = [(trgnode.position.x, trgnode.position.y)
+                 for trgnode in map(nodeinfo, potential_targets)]
+    windist, winid = Winners(uavs, uavnode.nodeid, potential_targets)
+    trgtnode_id, dist = Bid((curnode.position.x, curnode.position.y), target_xy, potential_targets,
+                            track_range, uavnode.nodeid, windist, winid, uavnode.oldtrackid)
+    uavnode.trackid = trgtnode_id
+    uavnode.trackdist = dist
+    if trgtnode_id != -1 and trgtnode_id == uavnode.oldtrackid:
+      decisions.Emit(uavnode.nodeid, KEEP, trgtnode_id, -1, dist)
+    else:
+      if uavnode.oldtrackid in potential_targets:
+        # outbid on a target still in range
+        i = potential_targets.index(uavnode.oldtrackid)
+        decisions.Emit(uavnode.nodeid, YIELD, uavnode.oldtrackid, int(winid[i]), float(windist[i]))
+      if trgtnode_id != -1:
+        decisions.Emit(uavnode.nodeid, CLAIM, trgtnode_id, -1, dist)
+
+    if self.auctionrounds.Round(potential_targets, trgtnode_id, tuple(winid.tolist())):
+      rounds, secs = self.auctionrounds.Convergence()
+      metrics.Observe('convergence', secs)
+      log.Info("Auction converged in %d rounds (%0.4f seconds)", rounds, secs)
+
+    if trgtnode_id != -1:
+      # Update waypoint to the target's current (or intercept) position
+      self.SetWaypoint(trgtnode_id, nodeinfo, actions)
+
+    Defer(actions, self.AdvertiseUDP, uavnode.nodeid, uavnode.trackid, uavnode.trackdist)
+
+    # Peers not heard from next round keep their last bid
+    uavs.Age(self.claimage)
+
+    # Record a lost target and re-deploy while there is nothing to win
+    if uavnode.trackid != uavnode.oldtrackid:
+      uavnode.oldtrackid = uavnode.trackid
+      if uavnode.trackid == -1:
+        Defer(actions, self.RecordTarget, uavnode.trackid)
+        Defer(actions, self.RedeployUAV, uavnode)
+
+  #---------------
+  # One tick of the asyncio engine
+  # Inputs are fetched and outputs sent from executor threads so the
+  # event loop keeps applying advertisements while RPCs are in flight
+  #---------------
+  async def TrackTargetsAsync(self, loop, covered_zone, track_range):
+    # Refresh the position snapshot and prefetch any node it is missing
+    start = clock()
+    await loop.run_in_executor(None, self.positions.BeginTick)
+    mark = clock()
+    grpc = mark - start
+    potential_targets = await loop.run_in_executor(None, self.PotentialTargets, covered_zone, track_range)
+    now = clock()
+    metrics.Observe('xmlrpc', now - mark)
+    mark = now
+    self.DetectFailures()
+    nodeids = [self.uavs.mine.nodeid] + list(potential_targets)
+    nodes = await loop.run_in_executor(None, lambda: [self.NodeInfo(nodeid) for nodeid in nodeids])
+    now = clock()
+    metrics.Observe('grpc', grpc + now - mark)
+    mark = now
+    if self.recorder is not None:
+      self.recorder.Tick(potential_targets, nodes)
+    if self.cells is not None:
+      self.MoveCell(nodes[0])
+    actions = []
+    if self.protocol == "auction":
+      self.DecideAuction(potential_targets, track_range, dict(zip(nodeids, nodes)).get, actions)
+    else:
+      self.DecideTargets(potential_targets, track_range, dict(zip(nodeids, nodes)).get, actions)
+    now = clock()
+    metrics.Observe('decision', now - mark)
+    mark = now
+    actions.append((self.xmlproxy.Flush, ()))
+    actions.append((decisions.Flush, ()))
+    await loop.run_in_executor(None, RunActions, actions)
+    now = clock()
+    metrics.Observe('actions', now - mark)
+    metrics.Observe('tick', now - start)
+
+  #---------------
+  # Tick loop of the asyncio engine
+  #---------------
+  async def RunTicks(self, loop, covered_zone, track_range):
+    scheduler = self.scheduler
+    while 1:
+      # Sleep until the next deadline unless a contended claim arrives first
+      try:
+        await asyncio.wait_for(self.wakeup.wait(), scheduler.Delay())
+        scheduler.Poke()
+      except asyncio.TimeoutError:
+        pass
+      self.wakeup.clear()
+      scheduler.Start()
+      lastclaim = self.uavs.mine.trackid
+      await self.TrackTargetsAsync(loop, covered_zone, track_range)
+      scheduler.Done(self.Unsettled(lastclaim))
+
+  #---------------
+  # Tick loop of the thread engine, claims are applied by a receive thread
+  #---------------
+  def RunThread(self, covered_zone, track_range):
+    scheduler = self.scheduler
+    while 1:
+      scheduler.Wait()
+
+      if self.protocol in commsprotocols:
+        self.AcquireLock()
+
+      lastclaim = self.uavs.mine.trackid
+      self.TrackTargets(covered_zone, track_range)
+      unsettled = self.Unsettled(lastclaim)
+
+      if self.protocol in commsprotocols:
+        self.thrdlock.release()
+
+      scheduler.Done(unsettled)
 
-    # If this UAV was not tracking any target and finds one in range
-    if uavnode.oldtrackid == -1 and (not trgtnode_id in seentargets):
-      print("Node %d found potential target %d" % (uavnode.nodeid, trgtnode_id))
-      trackflag = 0
-      if commsflag == 1: # udp
-        for uavnodetmp in uavs:
-          # if target node is being tracked by other node
-          if uavnodetmp.trackid == trgtnode_id or \
-              (uavnodetmp.trackid == 0 and uavnodetmp.oldtrackid == trgtnode_id):
-            print("Target ", trgtnode_id, " is being tracked already")
-            trackflag = 1 # track flag = 1 -> target already being tracked
-            break
-
-      # target is not being tracked, this UAV should track the node
-      if commsflag == 0 or trackflag == 0:
-        # shoudl find the shortest target
-        print("UAV node should track this target ", trgtnode_id)
-
-        curnode = core.get_node(session_id, uavnode.nodeid).node
-        trgnode = core.get_node(session_id, trgtnode_id).node
-        dist = Distance(curnode, trgnode)
-
-        # finding the shortest target
-        if dist < closedistfromtrg:
-          closedistfromtrg = dist
-          uavnode.trackid = trgtnode_id
-          uavnode.trackdist = dist
-          updatewypt = 1 # update way point
-
-  # END FOR LOOP
-
-  if updatewypt == 1:
-    # Update waypoint for UAV node
-    print("Update waypoint")
-    updatewypt = 0
-    # get target node's info
-    response = core.get_node(session_id, uavnode.trackid)
-    node = response.node
-    # get x, y coord
-    trgtnode_x, trgtnode_y = node.position.x, node.position.y
-    # update waypoint
-    xmlproxy.setWypt(int(trgtnode_x), int(trgtnode_y))
-    # RecordTarget(uavnode)
-
-  # Advertise target being tracked if using comms
-  if protocol == "udp":
-    AdvertiseUDP(uavnode.nodeid, uavnode.trackid, uavnode.trackdist)
-
-  # Reset current tracking info (0) for other UAVs if we're using comms
-  # which means allow commons (udp)
-  if commsflag == 1:
-    for uavnodetmp in uavs:
-      if uavnodetmp.nodeid != uavnode.nodeid:
-        # Reset current tracking info
-        uavnodetmp.oldtrackid = uavnodetmp.trackid
-        uavnodetmp.trackid = 0
-    
-  # Record the target tracked for displaying proper colors
-  # Re-deploy UAV if it's not track anything
-  if uavnode.trackid != uavnode.oldtrackid:
-    uavnode.oldtrackid = uavnode.trackid
-    # record new target if changed
-    # RecordTarget(uavnode)
-    if uavnode.trackid == -1:
-      RedeployUAV(uavnode)
+#---------------
+# asyncio engine: the ticks of every agent scheduled on one loop,
+# adverts via one datagram endpoint
+#---------------
+async def RunAsyncio(agents, protocol, interface, covered_zone, track_range):
+  loop = asyncio.get_running_loop()
+  for agent in agents:
+    agent.wakeup = asyncio.Event()
+  transport = None
+  if protocol in commsprotocols:
+    sk = OpenReceiveSocket(None if agents[0].cells is not None else mcastaddr, port, interface)
+    if agents[0].cells is not None:
+      memberships = Memberships(sk, interface)
+      for agent in agents:
+        agent.memberships = memberships
+    transport, _ = await loop.create_datagram_endpoint(lambda: AdvertProtocol(agents), sock=sk)
+
+  try:
+    await asyncio.gather(*[agent.RunTicks(loop, covered_zone, track_range) for agent in agents])
+  finally:
+    if transport is not None:
+      transport.close()
 
 #---------------
-# main
+# Command line of the agent
 #---------------
-def main():
-  global uavs
-  global protocol
-  global nodepath
-  global mynodeseq
-  global nodecnt
-  global core
-  global session_id
-  global seentargets
-  global notfoundsametrgnode
-
-  # Get command line inputs 
+def ArgParser():
   parser = argparse.ArgumentParser()
-  parser.add_argument('-my','--my-id', dest = 'uav_id', metavar='my id',
-                      type=int, default = '1', help='My Node ID')
+  parser.add_argument('-my','--my-id', dest = 'uav_ids', metavar='my id', nargs='+',
+                      type=int, default = [1], help='My Node ID; several IDs host one agent each in this process')
   parser.add_argument('-c','--covered-zone', dest = 'covered_zone', metavar='covered zone',
                        type=int, default = '1200', help='UAV covered zone limit on X axis')
   parser.add_argument('-r','--track_range', dest = 'track_range', metavar='track range',
@@ -310,16 +819,107 @@ def main():
   parser.add_argument('-i','--update_interval', dest = 'interval', metavar='update interval',
                       type=int, default = '1', help='Update Inteval')
   parser.add_argument('-p','--protocol', dest = 'protocol', metavar='comms protocol',
-                      type=str, default = 'none', help='Comms Protocol')
+                      type=str, default = 'none', help='Comms Protocol: none, udp or auction')
+  parser.add_argument('-g','--gossip', dest = 'gossip', metavar='gossip claims',
+                      type=int, default = '8', help='Max claims of other UAVs piggybacked on each advertisement')
+  parser.add_argument('-a','--advertise', dest = 'advertise', metavar='advertise policy',
+                      type=str, default = 'every', choices=['every', 'trickle'],
+                      help='Advertise every tick, or trickle: on change, then heartbeats backing off to --trickle-max')
+  parser.add_argument('--trickle-max', dest = 'trickle_max', metavar='trickle max',
+                      type=int, default = '1000', help='Longest heartbeat interval (msec)')
+  parser.add_argument('--trickle-k', dest = 'trickle_k', metavar='trickle k',
+                      type=int, default = '2', help='Heartbeat suppressed after k peers relayed our claim in an interval')
+  parser.add_argument('--phi', dest = 'phi', metavar='phi threshold',
+                      type=float, default = '8', help='Failure detector phi threshold, 0 = timeout only')
+  parser.add_argument('--fd-bound', dest = 'fd_bound', metavar='detection bound',
+                      type=int, default = '0', help='Evict a UAV silent this long (msec), 0 = from the advert interval, -1 = no failure detector')
+  parser.add_argument('-e','--engine', dest = 'engine', metavar='engine',
+                      type=str, default = 'thread', choices=['thread', 'asyncio'],
+                      help='Agent engine: receive thread + sleep loop, or asyncio event loop (always with several IDs)')
+  parser.add_argument('--positions', dest = 'positions', metavar='position source',
+                      type=str, default = 'poll', choices=['poll', 'events', 'shm'],
+                      help='Keep node positions fresh by polling the session, from the CORE event stream, or read them from the host table of position_daemon.py')
+  parser.add_argument('--position-table', dest = 'position_table', metavar='position table',
+                      type=str, default = '/dev/shm/core_positions', help='Shared memory file of the position table (--positions shm)')
+  parser.add_argument('--position-ttl', dest = 'position_ttl', metavar='position ttl',
+                      type=int, default = '0', help='Position snapshot time to live (msec), 0 = refresh every tick')
+  parser.add_argument('--targets', dest = 'targets', metavar='target source',
+                      type=str, default = 'proxy', choices=['proxy', 'local'],
+                      help='Potential targets from the proxy every tick, or from a local spatial index')
+  parser.add_argument('--target-ttl', dest = 'target_ttl', metavar='target ttl',
+                      type=int, default = '1000', help='How long the local index trusts the proxy list of targets (msec)')
+  parser.add_argument('--schedule', dest = 'schedule', metavar='tick schedule',
+                      type=str, default = 'fixed', choices=['fixed', 'adaptive'],
+                      help='Fixed tick interval, or adaptive: -i while claims change, backing off when stable')
+  parser.add_argument('--max-interval', dest = 'max_interval', metavar='max interval',
+                      type=int, default = '1000', help='Longest adaptive tick interval (msec)')
+  parser.add_argument('--intercept', dest = 'intercept', metavar='waypoint policy',
+                      type=str, default = 'chase', choices=['chase', 'predict'],
+                      help='Waypoint at the target every tick, or predict: lead it to an intercept, sent when it moves past --wypt-tolerance')
+  parser.add_argument('--uav-speed', dest = 'uav_speed', metavar='uav speed',
+                      type=float, default = '50', help='UAV speed (units per second) the intercept is planned for')
+  parser.add_argument('--wypt-tolerance', dest = 'wypt_tolerance', metavar='waypoint tolerance',
+                      type=float, default = '10', help='Distance the intercept moves before a new waypoint is sent')
+  parser.add_argument('--alpha', dest = 'alpha', metavar='alpha',
+                      type=float, default = '0.5', help='Position gain of the target motion filter')
+  parser.add_argument('--beta', dest = 'beta', metavar='beta',
+                      type=float, default = '0.2', help='Velocity gain of the target motion filter')
+  parser.add_argument('--log-level', dest = 'log_level', metavar='log level',
+                      type=str, default = 'info', choices=['debug', 'info', 'warn', 'error', 'off'],
+                      help='Log level; debug prints the per tick tables')
+  parser.add_argument('--metrics', dest = 'metrics', metavar='metrics destination',
+                      type=str, default = None, help='Export metrics to a file or udp://host:port')
+  parser.add_argument('--metrics-format', dest = 'metrics_format', metavar='metrics format',
+                      type=str, default = 'jsonl', choices=['jsonl', 'prometheus'],
+                      help='Metrics as JSON lines or Prometheus text')
+  parser.add_argument('--metrics-interval', dest = 'metrics_interval', metavar='metrics interval',
+                      type=int, default = '1000', help='Metrics export interval (msec)')
+  parser.add_argument('--trace-to', dest = 'trace_to', metavar='collector address',
+                      type=str, default = None, help='Send decision events to the collector at host:port (decision_collector.py)')
+  parser.add_argument('--core', dest = 'core', metavar='core address',
+                      type=str, default = '172.16.0.254:50051', help='CORE gRPC address')
+  parser.add_argument('--proxy', dest = 'proxy', metavar='proxy url',
+                      type=str, default = 'http://localhost:8000', help='Waypoint proxy URL, {id} is replaced by the node ID')
+  parser.add_argument('--mcast-group', dest = 'mcast_group', metavar='multicast group',
+                      type=str, default = mcastaddr, help='Advertisement multicast group')
+  parser.add_argument('--mcast-port', dest = 'mcast_port', metavar='multicast port',
+                      type=int, default = port, help='Advertisement port')
+  parser.add_argument('--groups', dest = 'groups', metavar='multicast groups',
+                      type=str, default = 'single', choices=['single', 'cells'],
+                      help='One group for the swarm, or cells: a group per grid cell, listening to the cells around the UAV')
+  parser.add_argument('--cell-size', dest = 'cell_size', metavar='cell size',
+                      type=int, default = '0', help='Grid cell size (--groups cells), 0 = from the tracking range')
+  parser.add_argument('--cell-base', dest = 'cell_base', metavar='cell base group',
+                      type=str, default = '235.1.2.0', help='Multicast group of the first cell; cell n uses this group + n')
+  parser.add_argument('--mcast-if', dest = 'mcast_if', metavar='multicast interface',
+                      type=str, default = None, help='Address of the interface to advertise on (e.g. 127.0.0.1)')
+  parser.add_argument('--record', dest = 'record', metavar='input log',
+                      type=str, default = None, help='Record the inputs of every decision to this file ({id} is replaced by the node ID) for replay_agent.py')
+  return parser
+
+#---------------
+# main
+#---------------
+def main():
+  global nodepath
+  global mcastaddr
+  global port
 
-  
   # Parse command line options
-  args = parser.parse_args()
+  args = ArgParser().parse_args()
 
   protocol = args.protocol
-
-  # Create grpc client
-  core = client.CoreGrpcClient("172.16.0.254:50051")
+  mcastaddr = args.mcast_group
+  port = args.mcast_port
+  log.SetLevel(args.log_level)
+  if args.metrics is not None:
+    metrics.labels['node'] = ','.join(str(uav_id) for uav_id in args.uav_ids)
+    metrics.Enable(args.metrics, args.metrics_format, float(args.metrics_interval)/1000)
+  if args.trace_to is not None:
+    decisions.Enable(args.trace_to)
+
+  # Create grpc client, one channel for every agent of the process
+  core = client.CoreGrpcClient(args.core)
   core.connect()
   response = core.get_sessions()
   if not response.sessions:
@@ -327,41 +927,56 @@ def main():
   session_summary = response.sessions[0]
   session_id = int(session_summary.id)
   session = core.get_session(session_id).session
+  if args.positions == "shm":
+    positions = SharedPositions(args.position_table, core, session_id)
+  else:
+    positions = PositionSnapshot(core, session_id, float(args.position_ttl)/1000, args.positions)
+
+  # Hosted agents send from one socket
+  sendsk = None
+  if len(args.uav_ids) > 1 and protocol in commsprotocols:
+    sendsk = OpenSendSocket(mcastaddr, ttl, args.mcast_if)
+
+  # Populate the uavs table with current UAV node information
+  agents = []
+  targetindex = None
+  for uav_id in args.uav_ids:
+    xmlproxy = ProxyClient(args.proxy.format(id=uav_id))
+    if args.targets == "local" and targetindex is None:
+      # Grid cells as large as the tracking range: a range query looks
+      # at no more than 3x3 cells. The index asks the proxy from any
+      # agent's tick, so it has its own client: a ServerProxy is not
+      # safe to share between threads
+      targetindex = TargetIndex(positions, ProxyClient(args.proxy.format(id=uav_id)), args.track_range,
+                                float(args.target_ttl)/1000)
+    agent = UAVAgent(uav_id, protocol, xmlproxy, positions, targetindex)
+    if args.record is not None:
+      agent.recorder = InputRecorder(args.record.format(id=uav_id), uav_id, sys.argv[1:])
+    agent.Start()
+    agent.Setup(args, sendsk)
+    agents.append(agent)
 
-  # Populate the uavs list with current UAV node information
-  mynodeseq = 0
-  node = CORENode(args.uav_id, -1, 0)
-  uavs.append(node)
-  RedeployUAV(node)
-  RecordTarget(node)
-  nodecnt += 1
-  
-  if mynodeseq == -1:
-    print("Error: my id needs to be in the list of UAV IDs")
-    sys.exit()
-    
   # Initialize values
   corepath = "/tmp/pycore.*/"
-  nodepath = glob.glob(corepath)[0]
-  msecinterval = float(args.interval)
-  secinterval = msecinterval/1000
+  corepaths = glob.glob(corepath)
+  if len(corepaths) > 0:
+    nodepath = corepaths[0]
 
-  if protocol == "udp":
+  if args.engine == "asyncio" or len(agents) > 1:
+    asyncio.run(RunAsyncio(agents, protocol, args.mcast_if, args.covered_zone, args.track_range))
+    return
+
+  agent = agents[0]
+  if protocol in commsprotocols:
     # Create UDP receiving thread
-    recvthrd = ReceiveUDPThread()
+    sk = OpenReceiveSocket(None if agent.cells is not None else mcastaddr, port, args.mcast_if)
+    if agent.cells is not None:
+      agent.memberships = Memberships(sk, args.mcast_if)
+    recvthrd = ReceiveUDPThread(agent, sk)
     recvthrd.start()
-        
-  # Start tracking targets
-  while 1:
-    time.sleep(secinterval)
 
-    if protocol == "udp":    
-      thrdlock.acquire()
-    
-    TrackTargets(args.covered_zone, args.track_range)
-
-    if protocol == "udp":
-      thrdlock.release()
+  # Start tracking targets
+  agent.RunThread(args.covered_zone, args.track_range)
 
 
 if __name__ == '__main__':
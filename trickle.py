@@ -0,0 +1,89 @@
+#!/usr/bin/python
+
+# Trickle-style advertisement timer (RFC 6206)
+
+import random
+import threading
+import time
+
+
+#---------------
+# Decides when a UAV advertises its claim
+# A changed claim is sent right away and the interval drops to imin.
+# While the claim stays the same one heartbeat is sent per interval,
+# at a random time in its second half, and the interval doubles up to
+# imax. The heartbeat is suppressed when k consistent advertisements
+# (peers relaying this UAV's current claim) were heard in the interval.
+# Inconsistent() (a conflict or a new peer) drops back to imin.
+# maxsuppressed bounds the heartbeats suppressed in a row, so peers
+# keep hearing from this UAV directly (failure detection).
+# Heard() and Inconsistent() run on the receive thread and Due() on
+# the tick loop; a lock keeps the interval state consistent.
+#---------------
+class TrickleTimer():
+  def __init__(self, imin, imax, k=2, rng=random, maxsuppressed=None):
+    self.imin = imin
+    self.imax = max(imax, imin)
+    self.k = k
+    self.maxsuppressed = maxsuppressed
+    self.insuppressed = 0
+    self.rng = rng
+    self.state = None
+    self.interval = imin
+    self.sent = 0
+    self.suppressed = 0
+    self.lock = threading.Lock()
+    self.Begin(time.monotonic())
+
+  # Start a new interval (lock held)
+  def Begin(self, now):
+    self.start = now
+    self.fire = now + self.rng.uniform(self.interval/2, self.interval)
+    self.count = 0
+    self.fired = False
+
+  # Back to the shortest interval (no-op if already there, as in Trickle)
+  def Reset(self):
+    with self.lock:
+      if self.interval != self.imin:
+        self.interval = self.imin
+        self.Begin(time.monotonic())
+
+  # A peer advertised state consistent with ours
+  def Heard(self):
+    with self.lock:
+      self.count += 1
+
+  def Inconsistent(self):
+    self.Reset()
+
+  # Should the current state be advertised now?
+  def Due(self, state):
+    now = time.monotonic()
+    with self.lock:
+      if state != self.state:
+        self.state = state
+        self.interval = self.imin
+        self.Begin(now)
+        self.fired = True
+        self.insuppressed = 0
+        self.sent += 1
+        return True
+
+      if now >= self.start + self.interval:
+        self.interval = min(self.interval*2, self.imax)
+        self.Begin(now)
+      if self.fired or now < self.fire:
+        return False
+      self.fired = True
+      if self.count >= self.k and (self.maxsuppressed is None or self.insuppressed < self.maxsuppressed):
+        self.insuppressed += 1
+        self.suppressed += 1
+        return False
+      self.insuppressed = 0
+      self.sent += 1
+      return True
+
+  def Stats(self):
+    with self.lock:
+      return {'interval': self.interval, 'sent': self.sent, 'suppressed': self.suppressed}
@@ -0,0 +1,82 @@
+#!/usr/bin/python
+
+# Client for the waypoint/target XML-RPC proxy
+
+import xmlrpc.client
+
+
+#---------------
+# Coalescing XML-RPC proxy client
+# - the original waypoint never changes, so it is fetched once
+# - setWypt/setTarget writes equal to the last value sent are dropped
+# - the remaining writes of a tick are queued (last write per method
+#   wins) and sent by Flush() as one system.multicall
+# ServerProxy's transport keeps its HTTP/1.1 connection open between
+# calls, so every call of the agent reuses one keep-alive connection.
+#---------------
+class ProxyClient():
+  def __init__(self, url="http://localhost:8000"):
+    self.proxy = xmlrpc.client.ServerProxy(url, allow_none=True)
+    self.originalwypt = None
+    self.wypt = None
+    self.target = None
+    self.pending = {}
+    self.multicall = True
+
+  def getPotentialTargets(self, covered_zone, track_range):
+    return self.proxy.getPotentialTargets(covered_zone, track_range)
+
+  def getOriginalWypt(self):
+    if self.originalwypt is None:
+      self.originalwypt = self.proxy.getOriginalWypt()
+    return self.originalwypt
+
+  def setWypt(self, x, y):
+    if (x, y) == self.wypt:
+      self.pending.pop('setWypt', None)
+      return
+    self.Queue('setWypt', x, y)
+
+  def setTarget(self, trgtnodeid):
+    if trgtnodeid == self.target:
+      self.pending.pop('setTarget', None)
+      return
+    self.Queue('setTarget', trgtnodeid)
+
+  def Queue(self, method, *args):
+    self.pending.pop(method, None)
+    self.pending[method] = args
+
+  # Send the writes queued this tick, one multicall if the proxy has it
+  def Flush(self):
+    if len(self.pending) == 0:
+      return
+    pending = list(self.pending.items())
+    self.pending.clear()
+
+    if self.multicall and len(pending) > 1:
+      multicall = xmlrpc.client.MultiCall(self.proxy)
+      for method, args in pending:
+        getattr(multicall, method)(*args)
+      try:
+        for result in multicall():
+          pass
+        self.Sent(pending)
+        return
+      except xmlrpc.client.Fault as fault:
+        # Proxy without system.multicall; fall back to one call per write
+        if 'multicall' not in fault.faultString:
+          raise
+        self.multicall = False
+
+    for method, args in pending:
+      getattr(self.proxy, method)(*args)
+    self.Sent(pending)
+
+  # Remember what the proxy now holds
+  def Sent(self, pending):
+    for method, args in pending:
+      if method == 'setWypt':
+        self.wypt = args
+      elif method == 'setTarget':
+        self.target = args[0]